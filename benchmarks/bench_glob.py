@@ -0,0 +1,98 @@
+"""Benchmark: glob over a tree with a large node_modules, Path.rglob vs. the scandir walker.
+
+Usage:
+    python benchmarks/bench_glob.py --src-files 2000 --node-modules-files 100000
+
+The generated tree has a small `src/` and a large `node_modules/` (and a `.venv/`).
+The baseline reproduces the previous implementation: `Path.glob`/`Path.rglob` over
+everything, then dropping excluded directories afterwards and stat'ing every hit.
+The new walker prunes excluded directories before descending and classifies entries
+from `os.scandir` without extra stats.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from tools import workspace_cache  # noqa: E402
+from tools.search_tool import _DEFAULT_EXCLUDE_DIRS, _glob_sync  # noqa: E402
+
+
+def _make_tree(root: Path, src_files: int, vendor_files: int) -> None:
+    for i in range(src_files):
+        path = root / "src" / f"pkg_{i // 100:03d}" / f"mod_{i:05d}.{'ts' if i % 3 else 'py'}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("export const x = 1;\n")
+    for i in range(vendor_files):
+        path = (
+            root
+            / "node_modules"
+            / f"dep_{i // 500:04d}"
+            / ("lib" if i % 2 else "dist")
+            / f"file_{i:06d}.{'js' if i % 4 else 'ts'}"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"module.exports = {};\n")
+    for i in range(vendor_files // 10):
+        path = root / ".venv" / "lib" / f"pkg_{i // 200:03d}" / f"m_{i:05d}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x = 1\n")
+
+
+def _baseline(root: Path, pattern: str, max_results: int) -> int:
+    """The previous glob: walk everything, filter excluded dirs afterwards."""
+    pattern_norm = pattern.strip().replace("\\", "/")
+    iterator = root.glob(pattern_norm) if "/" in pattern_norm else root.rglob(pattern_norm)
+    results = 0
+    for file_path in iterator:
+        if not (file_path.is_dir() or file_path.is_file()):
+            continue
+        rel_parts = file_path.relative_to(root).parts
+        if any(part in _DEFAULT_EXCLUDE_DIRS for part in rel_parts[:-1]):
+            continue
+        results += 1
+        if results >= max_results:
+            break
+    return results
+
+
+def _time(fn, *args) -> tuple[float, object]:
+    begin = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - begin, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--src-files", type=int, default=2000)
+    parser.add_argument("--node-modules-files", type=int, default=100_000)
+    parser.add_argument("--max-results", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="glob-bench-") as tmp:
+        root = Path(tmp).resolve()
+        print(f"Generating {args.src_files} src files + {args.node_modules_files} node_modules files ...")
+        _make_tree(root, args.src_files, args.node_modules_files)
+        os.chdir(root)
+
+        patterns = ["*.ts", "src/**/*.py", "**/mod_0001?.*"]
+        print(f"{'pattern':<18} {'rglob':>10} {'walker':>10} {'walker mtime':>14} {'hits':>7}")
+        for pattern in patterns:
+            baseline, hits = _time(_baseline, root, pattern, args.max_results)
+            workspace_cache.invalidate_all()
+            walker, _ = _time(_glob_sync, pattern, root, args.max_results, False)
+            workspace_cache.invalidate_all()
+            by_mtime, _ = _time(_glob_sync, pattern, root, args.max_results, False, "mtime")
+            print(
+                f"{pattern:<18} {baseline * 1000:8.1f}ms {walker * 1000:8.1f}ms "
+                f"{by_mtime * 1000:12.1f}ms {hits:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark: grep with the trigram index vs. a full scan on a synthetic tree.
+
+Usage:
+    python benchmarks/bench_grep_index.py --files 20000 --lines 120
+
+The tree is generated in a temporary directory which also becomes the process
+working directory (the tools treat the cwd as the workspace root).
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from tools.search_tool import _search_sync  # noqa: E402
+
+
+_WORDS = [
+    "request", "response", "handler", "config", "session", "context", "buffer",
+    "render", "parse", "token", "stream", "client", "server", "agent", "result",
+]
+
+
+def _make_tree(root: Path, files: int, lines: int, seed: int) -> None:
+    rng = random.Random(seed)
+    for i in range(files):
+        pkg = root / f"pkg_{i % 200:03d}" / f"mod_{i % 7}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        body = []
+        for j in range(lines):
+            name = "_".join(rng.choice(_WORDS) for _ in range(2))
+            salt = "".join(rng.choice(string.ascii_lowercase) for _ in range(6))
+            body.append(f"def {name}_{j}(x):  # {salt}\n    return x + {j}\n")
+        # A handful of files carry the needle we search for.
+        if i % 997 == 0:
+            body.append("NEEDLE_MARKER = 'find me'\n")
+        (pkg / f"file_{i}.py").write_text("".join(body), encoding="utf-8")
+
+
+def _timed(label: str, **kwargs) -> float:
+    start = time.perf_counter()
+    output = _search_sync(**kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms   {output.splitlines()[0]}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=80)
+    parser.add_argument("--pattern", default="NEEDLE_MARKER")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="grep-bench-") as tmp:
+        root = Path(tmp).resolve()
+        os.chdir(root)
+        print(f"Generating {args.files} files x {args.lines} functions under {root} ...")
+        _make_tree(root, args.files, args.lines, args.seed)
+
+        common = dict(
+            patterns=[args.pattern],
+            root_dir=str(root),
+            include_globs=None,
+            exclude_dirs=None,
+            exclude_globs=None,
+            case_sensitive=True,
+            max_results=200,
+            max_file_size_kb=2048,
+        )
+        full = _timed("full scan", use_index=False, **common)
+        _timed("indexed (cold build)", use_index=True, **common)
+        warm = _timed("indexed (warm)", use_index=True, **common)
+
+        # Touch a few files so the incremental refresh has work to do.
+        for path in list(root.rglob("file_1*.py"))[:20]:
+            path.write_text(path.read_text(encoding="utf-8") + "# touched\n", encoding="utf-8")
+        _timed("indexed (20 files changed)", use_index=True, **common)
+
+        print(f"\nwarm speedup vs full scan: {full / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
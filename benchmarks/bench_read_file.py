@@ -0,0 +1,74 @@
+"""Benchmark: read_file slices deep into a huge file, sequential vs. mmap line index.
+
+Usage:
+    python benchmarks/bench_read_file.py --size-mb 2048
+
+A log-like file of roughly `--size-mb` megabytes is generated in a temporary
+directory, then slices near the start, middle and end are read with the
+sequential reader (readline per skipped line) and with the indexed reader
+(cold: builds the line index; warm: reuses it).
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import tools.read_file_tool as read_file_tool  # noqa: E402
+
+
+def _make_file(path: Path, size_mb: int) -> int:
+    line = "2026-01-01 12:00:00,000 INFO worker-%05d request id=%010d handled in 12ms\n"
+    block = "".join(line % (i % 64, i) for i in range(10_000)).encode("utf-8")
+    lines_per_block = 10_000
+    blocks = max(1, (size_mb * 1024 * 1024) // len(block))
+    with path.open("wb") as fh:
+        for _ in range(blocks):
+            fh.write(block)
+    return blocks * lines_per_block
+
+
+def _read(path: Path, start_line: int, *, indexed: bool) -> float:
+    threshold = read_file_tool._MMAP_MIN_BYTES
+    if not indexed:
+        read_file_tool._MMAP_MIN_BYTES = 1 << 62
+    try:
+        begin = time.perf_counter()
+        read_file_tool._read_from_file(str(path), start_line, 50)
+        return time.perf_counter() - begin
+    finally:
+        read_file_tool._MMAP_MIN_BYTES = threshold
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="read-bench-") as tmp:
+        path = Path(tmp) / "huge.log"
+        print(f"Generating ~{args.size_mb} MB at {path} ...")
+        total_lines = _make_file(path, args.size_mb)
+        targets = {
+            "start": 1,
+            "middle": total_lines // 2,
+            "end": total_lines - 100,
+        }
+
+        print(f"{'slice':<8} {'sequential':>12} {'indexed cold':>14} {'indexed warm':>14}")
+        cold_done = False
+        for label, start_line in targets.items():
+            sequential = _read(path, start_line, indexed=False)
+            cold = _read(path, start_line, indexed=True) if not cold_done else float("nan")
+            cold_done = True
+            warm = _read(path, start_line, indexed=True)
+            print(
+                f"{label:<8} {sequential * 1000:10.1f}ms {cold * 1000:12.1f}ms {warm * 1000:12.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
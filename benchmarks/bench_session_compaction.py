@@ -0,0 +1,99 @@
+"""Benchmark: prompt tokens per turn over a long session, plain vs. compacting session.
+
+Usage:
+    python benchmarks/bench_session_compaction.py --turns 200 --window-tokens 48000
+
+A synthetic coding session is replayed into an in-memory `SQLiteSession`: every turn
+has a user request, a few tool calls with outputs of varying size (some large, like a
+`read_file` of a whole module or a long `bash` log) and an assistant reply. Before each
+turn the history the runner would send is measured (estimated tokens, as in
+`tools.output_budget`) for the plain session and for `CompactingSession`, together with
+the time `get_items` takes.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from agents import SQLiteSession  # noqa: E402
+
+from compacting_session import CompactingSession, _item_tokens  # noqa: E402
+
+
+_TOOLS = ["read_file", "grep", "bash", "edit_file", "glob"]
+
+
+def _turn_items(rng: random.Random, turn: int) -> list[dict]:
+    items: list[dict] = [
+        {"role": "user", "content": f"Turn {turn}: please look at module_{turn % 17}.py and fix the bug."}
+    ]
+    for call in range(rng.randint(1, 5)):
+        name = rng.choice(_TOOLS)
+        call_id = f"call_{turn}_{call}"
+        lines = rng.choice([5, 20, 80, 400, 1500])
+        output = "\n".join(f"{i + 1:>6}\tsome source line number {i} of the file" for i in range(lines))
+        items.append(
+            {
+                "type": "function_call",
+                "call_id": call_id,
+                "name": name,
+                "arguments": json.dumps({"file_path": f"/ws/module_{turn % 17}.py"}),
+            }
+        )
+        items.append({"type": "function_call_output", "call_id": call_id, "output": output})
+    items.append(
+        {
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": f"Fixed the bug in module_{turn % 17}.py. " * 8}],
+        }
+    )
+    return items
+
+
+async def _run(turns: int, window_tokens: int, every: int) -> None:
+    rng = random.Random(0)
+    plain = SQLiteSession("bench")
+    compacting = CompactingSession(SQLiteSession("bench-compact"), window_tokens=window_tokens)
+
+    print(f"{'turn':>5} {'plain tokens':>13} {'compacted':>10} {'summarized':>11} {'plain ms':>9} {'compact ms':>11}")
+    peak = 0
+    for turn in range(1, turns + 1):
+        begin = time.perf_counter()
+        plain_items = await plain.get_items()
+        plain_ms = (time.perf_counter() - begin) * 1000
+        begin = time.perf_counter()
+        await compacting.get_items()
+        compact_ms = (time.perf_counter() - begin) * 1000
+        peak = max(peak, compacting.stats["prompt_tokens"])
+
+        if turn == 1 or turn % every == 0 or turn == turns:
+            plain_tokens = sum(map(_item_tokens, plain_items))
+            print(
+                f"{turn:>5} {plain_tokens:>13} {compacting.stats['prompt_tokens']:>10} "
+                f"{compacting.stats['compacted_turns']:>11} {plain_ms:>9.1f} {compact_ms:>11.1f}"
+            )
+
+        items = _turn_items(rng, turn)
+        await plain.add_items(items)
+        await compacting.add_items(items)
+    print(f"peak compacted prompt: {peak} tokens (window {window_tokens})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--window-tokens", type=int, default=48_000)
+    parser.add_argument("--every", type=int, default=20, help="print every N turns")
+    args = parser.parse_args()
+    asyncio.run(_run(args.turns, args.window_tokens, args.every))
+
+
+if __name__ == "__main__":
+    main()
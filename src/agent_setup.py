@@ -0,0 +1,104 @@
+"""Agent construction shared by the interactive CLI and the batch runner."""
+
+import os
+from pathlib import Path
+
+from agents import (
+    Agent,
+    ModelSettings,
+    Tool,
+    set_default_openai_api,
+    set_default_openai_client,
+    set_default_openai_key,
+    set_tracing_disabled,
+)
+from openai import AsyncOpenAI
+
+from prompt_assembly import assemble_instructions, prepare_tools
+from tools import (
+    bash,
+    edit_file,
+    explore_agent,
+    fetch_more,
+    glob,
+    grep,
+    multi_edit,
+    read_file,
+    read_files,
+    think,
+    todo_list,
+    undo,
+    write_file,
+)
+
+
+DEFAULT_MODEL = "mimo-v2-flash"
+SYSTEM_PROMPT_PATH = Path(__file__).resolve().parent / "system_prompt.md"
+
+_client: AsyncOpenAI | None = None
+
+
+def configure_openai() -> AsyncOpenAI:
+    """Create the process-wide client from the KK_* environment variables (once)."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            base_url=os.environ["KK_OPENAI_BASE_URL"],
+            api_key=os.environ["KK_OPENAI_API_KEY"],
+        )
+        set_default_openai_client(_client)
+        set_default_openai_api("chat_completions")
+        # Remote tracing needs KK_OPENAI_TRACE_KEY (optional); without it tracing is off.
+        trace_key = os.environ.get("KK_OPENAI_TRACE_KEY")
+        if trace_key:
+            set_default_openai_key(trace_key)
+        else:
+            set_tracing_disabled(True)
+    return _client
+
+
+def load_prompt_template(path: Path | None = None) -> str:
+    """The system prompt template (`src/system_prompt.md`); raises FileNotFoundError."""
+    with (path or SYSTEM_PROMPT_PATH).open("r", encoding="utf-8") as fh:
+        return fh.read()
+
+
+def default_tools() -> list[Tool]:
+    # Sorted by name with precomputed schemas, so every request's tool block is identical.
+    return prepare_tools([
+        bash,
+        read_file,
+        read_files,
+        write_file,
+        edit_file,
+        multi_edit,
+        undo,
+        grep, glob,
+        think,
+        todo_list,
+        fetch_more,
+        explore_agent
+    ])
+
+
+def build_agent(
+    work_dir: str | os.PathLike,
+    prompt_template: str,
+    *,
+    tools: list[Tool] | None = None,
+    model: str = DEFAULT_MODEL,
+) -> Agent:
+    """The coding agent for `work_dir` (static prompt content first, see prompt_assembly)."""
+    return Agent(
+        name="OAI-Based CodeAgent",
+        model=model,
+        instructions=assemble_instructions(prompt_template, {"work_dir": work_dir}),
+        model_settings=ModelSettings(
+            parallel_tool_calls=True,
+            temperature=0.3,
+            top_p=0.95,
+            # Streamed responses do not always carry usage; it is needed for token stats.
+            include_usage=True,
+        ),
+        tools=tools if tools is not None else default_tools(),
+    )
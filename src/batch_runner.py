@@ -0,0 +1,253 @@
+"""Headless batch mode: run many prompts from a JSONL file.
+
+Usage:
+    python src/batch_runner.py --input tasks.jsonl --output results.jsonl --concurrency 4
+
+Each input line is a task: `{"id": "...", "prompt": "...", "work_dir": "...",
+"max_turns": 80}` (only `prompt` is required; `id` defaults to the line number,
+`work_dir` to `--work-dir`). Every finished task appends one line to the output file:
+`{"id", "ok", "final_output", "error", "seconds", "usage", "work_dir"}`.
+
+- tasks run concurrently up to `--concurrency`, all over one `AsyncOpenAI` client
+  (one connection pool) and one agent per work directory;
+- results are appended (and flushed) as tasks finish, so an interrupted batch loses
+  only the tasks in flight; re-running with the same `--output` skips tasks whose id is
+  already there (`--retry-failed` re-runs the failed ones);
+- the tools resolve paths against the process working directory, so tasks are grouped
+  by `work_dir`: groups run one after another, the tasks of a group concurrently;
+- concurrent tasks share the files of their work directory: each task has its own tool
+  lock table (one task's `bash` does not hold up the others' tool calls), its own shell
+  sessions (a `cd` stays in its task) and its own todo list;
+- the undo journal (`.agent_snapshots`) is per directory, so one task's `undo` would
+  revert the others' latest writes: batch tasks get every tool except `undo` (their
+  writes are still journaled, and can be reverted later from the CLI).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, TextIO
+
+from agents import Runner
+
+from agent_setup import (
+    DEFAULT_MODEL,
+    build_agent,
+    configure_openai,
+    default_tools,
+    load_prompt_template,
+)
+from tools.shell_pool import configure_shell_pool, private_shell_pool, shutdown_shell_pool
+from tools.todo_list import private_todo_store
+from tools.tool_scheduler import private_lock_table
+
+
+def load_tasks(path: Path, default_work_dir: Path) -> tuple[list[dict[str, Any]], list[str]]:
+    """Parse the task file; returns (tasks, errors) — bad lines are reported, not fatal."""
+    tasks: list[dict[str, Any]] = []
+    errors: list[str] = []
+    seen: set[str] = set()
+    with path.open("r", encoding="utf-8") as fh:
+        for number, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as exc:
+                errors.append(f"line {number}: invalid JSON: {exc}")
+                continue
+            if not isinstance(task, dict) or not isinstance(task.get("prompt"), str):
+                errors.append(f"line {number}: a task needs a string `prompt`")
+                continue
+            task_id = str(task.get("id", number))
+            if task_id in seen:
+                errors.append(f"line {number}: duplicate id {task_id!r}")
+                continue
+            seen.add(task_id)
+            work_dir = Path(task.get("work_dir") or default_work_dir).expanduser().resolve()
+            tasks.append({**task, "id": task_id, "work_dir": str(work_dir)})
+    return tasks, errors
+
+
+def finished_ids(path: Path, retry_failed: bool) -> set[str]:
+    """Ids already in the output file (only successful ones with `retry_failed`)."""
+    done: set[str] = set()
+    try:
+        fh = path.open("r", encoding="utf-8")
+    except FileNotFoundError:
+        return done
+    with fh:
+        for line in fh:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line of an interrupted run
+            if isinstance(result, dict) and (result.get("ok") or not retry_failed):
+                done.add(str(result.get("id")))
+    return done
+
+
+async def _run_isolated(agent, task: dict[str, Any], max_turns: int, todo_dir: Path):
+    """`Runner.run` with the task's own lock table, shell sessions and todo list.
+
+    The tools keep these per event loop, and all tasks share one loop; the private
+    copies are set in this task's context, which the runner's tool calls inherit.
+    """
+    todo_name = hashlib.sha1(task["id"].encode("utf-8")).hexdigest()[:16] + ".jsonl"
+    with private_lock_table(), private_todo_store(todo_dir / todo_name):
+        async with private_shell_pool():
+            return await Runner.run(
+                agent, task["prompt"], max_turns=int(task.get("max_turns", max_turns))
+            )
+
+
+async def run_task(
+    agent, task: dict[str, Any], max_turns: int, timeout: float | None, todo_dir: Path
+) -> dict[str, Any]:
+    begin = time.perf_counter()
+    result: dict[str, Any] = {"id": task["id"], "work_dir": task["work_dir"]}
+    try:
+        run = await asyncio.wait_for(_run_isolated(agent, task, max_turns, todo_dir), timeout)
+    except asyncio.TimeoutError:
+        result.update(ok=False, final_output=None, error=f"timed out after {timeout}s")
+        usage = None
+    except Exception as exc:  # one failing task must not stop the batch
+        result.update(ok=False, final_output=None, error=f"{type(exc).__name__}: {exc}")
+        usage = None
+    else:
+        result.update(ok=True, final_output=str(run.final_output), error=None)
+        usage = run.context_wrapper.usage
+    result["seconds"] = round(time.perf_counter() - begin, 3)
+    result["usage"] = (
+        {
+            "requests": usage.requests,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_tokens": usage.input_tokens_details.cached_tokens or 0,
+        }
+        if usage is not None
+        else None
+    )
+    return result
+
+
+def _write_result(out: TextIO, result: dict[str, Any]) -> None:
+    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+async def run_batch(
+    tasks: list[dict[str, Any]],
+    output: Path,
+    *,
+    concurrency: int,
+    max_turns: int,
+    timeout: float | None,
+    model: str,
+) -> tuple[int, int]:
+    """Run `tasks`, appending results to `output`; returns (succeeded, failed)."""
+    configure_openai()
+    prompt_template = load_prompt_template()
+    tools = [tool for tool in default_tools() if tool.name != "undo"]
+    configure_shell_pool(enabled=True)
+
+    groups: dict[str, list[dict[str, Any]]] = {}
+    for task in tasks:
+        groups.setdefault(task["work_dir"], []).append(task)
+
+    succeeded = failed = 0
+    total = len(tasks)
+    semaphore = asyncio.Semaphore(concurrency)
+    original_cwd = os.getcwd()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with output.open("a", encoding="utf-8") as out, tempfile.TemporaryDirectory(
+            prefix="kk-batch-todo-"
+        ) as todo_dir:
+            for work_dir, group in groups.items():
+                os.chdir(work_dir)
+                agent = build_agent(work_dir, prompt_template, tools=tools, model=model)
+
+                async def run_one(task: dict[str, Any]) -> None:
+                    nonlocal succeeded, failed
+                    async with semaphore:
+                        result = await run_task(agent, task, max_turns, timeout, Path(todo_dir))
+                    _write_result(out, result)
+                    if result["ok"]:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    status = "ok" if result["ok"] else f"failed: {result['error']}"
+                    print(
+                        f"[{succeeded + failed}/{total}] {task['id']} {status} ({result['seconds']:.1f}s)",
+                        flush=True,
+                    )
+
+                await asyncio.gather(*(run_one(task) for task in group))
+    finally:
+        os.chdir(original_cwd)
+        await shutdown_shell_pool()
+    return succeeded, failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the agent over prompts from a JSONL file")
+    parser.add_argument("--input", required=True, type=Path, help="Task file (JSONL)")
+    parser.add_argument("--output", required=True, type=Path, help="Result file (JSONL, appended)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Tasks run at once (default: 4)")
+    parser.add_argument(
+        "--work-dir",
+        dest="work_dir",
+        default=None,
+        help="Work directory of tasks without `work_dir` (default: current directory)",
+    )
+    parser.add_argument("--max-turns", dest="max_turns", type=int, default=80)
+    parser.add_argument(
+        "--task-timeout",
+        dest="timeout",
+        type=float,
+        default=None,
+        help="Seconds after which a task is abandoned (default: no limit)",
+    )
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument(
+        "--retry-failed",
+        dest="retry_failed",
+        action="store_true",
+        help="Also re-run tasks whose previous result failed",
+    )
+    args = parser.parse_args()
+
+    default_work_dir = Path(args.work_dir).expanduser().resolve() if args.work_dir else Path.cwd()
+    tasks, errors = load_tasks(args.input, default_work_dir)
+    for error in errors:
+        print(f"skipped {args.input} {error}", file=sys.stderr)
+    done = finished_ids(args.output, args.retry_failed)
+    pending = [task for task in tasks if task["id"] not in done]
+    print(f"{len(tasks)} tasks, {len(tasks) - len(pending)} already done, {len(pending)} to run")
+    if not pending:
+        return
+
+    succeeded, failed = asyncio.run(
+        run_batch(
+            pending,
+            args.output,
+            concurrency=max(1, args.concurrency),
+            max_turns=args.max_turns,
+            timeout=args.timeout,
+            model=args.model,
+        )
+    )
+    print(f"done: {succeeded} succeeded, {failed} failed; results in {args.output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
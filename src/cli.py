@@ -2,19 +2,39 @@ import argparse
 import asyncio
 import json
 import re
+import time
 from agents import (
-    Agent,
     Runner,
-    set_default_openai_client,
-    set_default_openai_key,
-    set_default_openai_api,
     RawResponsesStreamEvent,
     RunItemStreamEvent,
-    SQLiteSession
 )
-from openai import AsyncOpenAI
-from agents import set_tracing_disabled, ModelSettings
-from tools import *
+from agents import set_tracing_disabled
+from tools.atomic_io import set_durability
+from tools.search_parallel import set_workers as set_grep_workers
+from tools.fs_watcher import start_watcher, stop_watcher
+from tools.result_cache import cache_stats as tool_cache_stats
+from tools.bash_tool import add_bash_output_listener
+from tools.search_tool import add_search_progress_listener
+from tools.shell_pool import configure_shell_pool, shutdown_shell_pool
+from tools.snapshot_journal import begin_turn
+from tools.tool_scheduler import scheduler_stats
+from tools.undo_tool import run_undo_action
+from agent_setup import (
+    SYSTEM_PROMPT_PATH,
+    build_agent,
+    configure_openai,
+    default_tools,
+    load_prompt_template,
+)
+from compacting_session import CompactingSession
+from instrumentation import TurnRecorder, default_metrics_path
+from session_store import SessionStore, list_sessions, new_session_id
+from prompt_assembly import (
+    PrefixCacheStats,
+    fingerprint_changed,
+    prefix_fingerprint,
+    static_instructions,
+)
 from pathlib import Path
 
 # === CLI 样式相关 ===
@@ -33,70 +53,136 @@ TOOL_PREFIX = f"{Fore.YELLOW}🛠 Tool{Style.RESET_ALL}"
 # 输入提示符（放在同一行，方便用户输入）
 INPUT_PROMPT = f"{USER_PREFIX}{Fore.CYAN} ➤ {Style.RESET_ALL}"
 
-import os
-
-openaiClient = AsyncOpenAI(
-    base_url=os.environ["KK_OPENAI_BASE_URL"],
-    api_key=os.environ["KK_OPENAI_API_KEY"],
-)
-set_default_openai_client(openaiClient)
-set_default_openai_api("chat_completions")
-# set_tracing_disabled(True)
-set_default_openai_key(os.environ["KK_OPENAI_TRACE_KEY"])
-
 def visible_len(s):
     ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
     return len(ansi_escape.sub('', s))
 
-async def cli(work_dir=None):
+def render_search_progress(batch):
+    """grep 流式扫描时在同一行刷新进度，扫描结束后换行。"""
+    line = (
+        f"   {Fore.YELLOW}🔍 grep{Style.RESET_ALL} 已扫描 {batch.files_scanned} 个文件，"
+        f"{batch.total_matches} 处匹配"
+    )
+    if batch.limit_reached:
+        line += "（已达上限）"
+    print(f"\r{line}\x1b[K", end="\n" if batch.done else "", flush=True)
+
+def render_bash_output(stream, line):
+    """bash 运行期间实时显示输出行（过长的行截断，stderr 用红色）。"""
+    color = Fore.RED if stream == "stderr" else Style.DIM
+    max_len = 76
+    if visible_len(line) > max_len:
+        line = line[: max_len - 3] + "..."
+    print(f"   {color}┆ {line}{Style.RESET_ALL}", flush=True)
+
+def render_turn_metrics(summary):
+    """每轮结束后打印耗时/token 汇总表（--metrics 开启时）。"""
+    first_token = (
+        f"{summary.first_token_seconds:.2f}s" if summary.first_token_seconds is not None else "-"
+    )
+    print(
+        f"{Style.DIM}   本轮 {summary.seconds:.1f}s｜首 token {first_token}｜"
+        f"模型 {summary.llm_calls} 次 {summary.llm_seconds:.1f}s｜"
+        f"token 输入 {summary.input_tokens}（缓存 {summary.cached_tokens}）输出 {summary.output_tokens}"
+    )
+    if summary.tools:
+        print(f"   {'工具':<16}{'次数':>6}{'总耗时':>10}{'最长':>10}")
+        for name, totals in summary.tools.items():
+            print(
+                f"   {name:<16}{totals.calls:>8}{totals.seconds:>12.2f}s{totals.max_seconds:>10.2f}s"
+            )
+    print(Style.RESET_ALL)
+
+def handle_command(user_input):
+    """处理以 `/` 开头的本地命令（不发送给模型）；不是已知命令时返回 False。
+
+    - /history：列出可撤销的文件改动及其轮次
+    - /undo [N]：撤销最近 N 次文件改动（默认 1）
+    - /restore <轮次>：把该轮及之后的所有文件改动撤销
+    """
+    parts = user_input.split()
+    command, args = parts[0], parts[1:]
+    try:
+        if command == "/history" and not args:
+            output = run_undo_action("history")
+        elif command == "/undo" and len(args) <= 1:
+            output = run_undo_action("undo", steps=int(args[0]) if args else 1)
+        elif command == "/restore" and len(args) == 1:
+            output = run_undo_action("restore_to_turn", turn=int(args[0]))
+        else:
+            return False
+    except ValueError:
+        output = "Error: 参数必须是整数"
+    except OSError as exc:
+        output = f"Error: undo failed: {exc}"
+    print(f"\n{SYSTEM_PREFIX}  {output}\n")
+    return True
+
+async def cli(
+    work_dir=None,
+    watch="auto",
+    shell_pool=True,
+    history_tokens=48_000,
+    session_id=None,
+    resume=False,
+    metrics_path=None,
+):
     if work_dir is None:
         work_dir = Path.cwd()
 
+    # 每次运行一个独立会话；--resume 接着本工作目录最近的会话，--session 指定会话 id
+    if session_id is None and resume:
+        recent = list_sessions(work_dir, limit=1)
+        session_id = recent[0].session_id if recent else None
+    store = SessionStore(session_id or new_session_id(), work_dir)
+    session_note = f"（已恢复，共 {store.turn} 轮）" if store.exists else ""
+
     # 入口欢迎信息
     print(
         f"{SYSTEM_PREFIX}  已进入交互模式\n"
         f"   工作目录: {Fore.YELLOW}{work_dir}{Style.RESET_ALL}\n"
+        f"   会话: {Fore.YELLOW}{store.session_id}{Style.RESET_ALL}{session_note}\n"
         f"   提示：输入问题后回车，与 {ASSISTANT_PREFIX} 对话；按 Ctrl+C 退出。\n"
+        f"   本地命令：/history 查看文件改动，/undo [N] 撤销最近 N 次改动，/restore <轮次> 回到该轮开始前\n"
     )
 
-    system_prompt = ""
-    # 使用当前文件的绝对路径来定位 system_prompt.md，避免受执行目录影响
-    base_dir = Path(__file__).resolve().parent
-    system_prompt_path = base_dir / "system_prompt.md"
+    # system_prompt.md 按 cli.py 所在目录定位，避免受执行目录影响
     try:
-        with system_prompt_path.open('r', encoding='utf-8') as f:
-            system_prompt = f.read()
+        prompt_template = load_prompt_template()
     except FileNotFoundError:
         print(
-            f"{ERROR_PREFIX} missing file: {system_prompt_path}\n"
+            f"{ERROR_PREFIX} missing file: {SYSTEM_PROMPT_PATH}\n"
             "Create it based on README instructions, then rerun."
         )
         return
+    # 远程 tracing 需要 KK_OPENAI_TRACE_KEY（可选）；未设置时关闭，本地统计见 --metrics
+    configure_openai()
+
+    # 文件监听：让 grep/glob/read_file 的缓存随文件变化失效，而不是每次重新 stat
+    watch_backend = start_watcher(work_dir, backend=watch)
+    if watch_backend:
+        print(f"{SYSTEM_PREFIX}  文件监听: {Fore.YELLOW}{watch_backend}{Style.RESET_ALL}\n")
+
+    add_search_progress_listener(render_search_progress)
+    add_bash_output_listener(render_bash_output)
+    configure_shell_pool(enabled=shell_pool)
+
+    # 完整历史仍保存在 SQLite 中；发给模型的只是按 token 预算裁剪、旧轮次摘要后的窗口
+    session = store
+    if history_tokens > 0:
+        session = CompactingSession(store, window_tokens=history_tokens)
+
+    # 工具按名称排序并预先序列化；静态内容在前、工作目录等动态内容放到系统提示词末尾，
+    # 让服务端能复用前缀 KV 缓存
+    tools = default_tools()
+    agent = build_agent(work_dir, prompt_template, tools=tools)
+    fingerprint = prefix_fingerprint(tools, static_instructions(prompt_template, {"work_dir": work_dir}))
+    changed = fingerprint_changed(fingerprint)
+    if changed:
+        print(f"{SYSTEM_PREFIX}  工具定义或系统提示词与上次运行不同（前缀 {fingerprint}），首轮无法命中前缀缓存\n")
+    cache_stats = PrefixCacheStats()
+    recorder = TurnRecorder(metrics_path, store.session_id) if metrics_path is not None else None
 
-    system_prompt = system_prompt.replace('{work_dir}', str(work_dir))
-
-    session = SQLiteSession("kk")
-
-    agent = Agent(
-        name="OAI-Based CodeAgent",
-        model="mimo-v2-flash",
-        instructions=system_prompt,
-        model_settings=ModelSettings(
-            parallel_tool_calls=True,
-            temperature=0.3,
-            top_p=0.95
-        ),
-        tools=[
-            bash,
-            read_file,
-            write_file,
-            edit_file,
-            grep, glob,
-            think,
-            todo_list,
-            explore_agent
-        ]
-    )
     import sys
 
     messages = []
@@ -114,6 +200,13 @@ async def cli(work_dir=None):
 
             user_input = user_input.rstrip("\n")
 
+            if user_input.startswith("/") and handle_command(user_input):
+                continue
+            # 文件改动按轮次记录，供 /undo、/restore 使用
+            turn = begin_turn()
+            if recorder is not None:
+                recorder.begin_turn(turn)
+
             # messages.append({
             #     "role": "user",
             #     "content": user_input
@@ -125,9 +218,13 @@ async def cli(work_dir=None):
             # ③ 美化后的模型输出
             print(f"{ASSISTANT_PREFIX}:\n{Fore.GREEN}{'-' * 60}{Style.RESET_ALL}")
 
-            result = Runner.run_streamed(agent, user_input, session=session, max_turns=80)
+            result = Runner.run_streamed(
+                agent, user_input, session=session, max_turns=80, hooks=recorder
+            )
 
             async for event in result.stream_events():
+                if recorder is not None:
+                    recorder.observe(event)
                 if isinstance(event, RawResponsesStreamEvent):
                     if event.data.type == "response.output_text.delta":
                         print(event.data.delta, end="", flush=True)
@@ -186,6 +283,16 @@ async def cli(work_dir=None):
 
             print(f"\n{Fore.GREEN}{'-' * 60}{Style.RESET_ALL}\n")
 
+            cache_stats.add(result.context_wrapper.usage)
+            requests, input_tokens, cached = cache_stats.last
+            if recorder is not None:
+                render_turn_metrics(recorder.end_turn())
+            elif requests:
+                print(
+                    f"{Style.DIM}   {requests} 次模型请求，输入 {input_tokens} token，"
+                    f"前缀缓存命中 {cached}（{cache_stats.rate(cached, input_tokens):.0%}）{Style.RESET_ALL}\n"
+                )
+
             # last_messages = result.to_input_list()
             # messages = last_messages
 
@@ -194,6 +301,43 @@ async def cli(work_dir=None):
             break
         except Exception as e:
             print(f"\n{ERROR_PREFIX} {e}\n")
+        finally:
+            # 本轮新增的历史一次性写入（runner 每个模型步骤都会 add_items）
+            await store.flush()
+
+    store.close()
+    stop_watcher()
+    await shutdown_shell_pool()
+
+    stats = tool_cache_stats()
+    print(
+        f"{SYSTEM_PREFIX}  工具结果缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次"
+        f"（命中率 {stats['hit_rate']:.0%}，失效 {stats['bumps']} 次）"
+    )
+    if cache_stats.requests:
+        print(
+            f"{SYSTEM_PREFIX}  前缀缓存: {cache_stats.requests} 次请求，输入 {cache_stats.input_tokens} token，"
+            f"命中 {cache_stats.cached_tokens}（{cache_stats.hit_rate:.0%}）"
+        )
+    sched = scheduler_stats()
+    print(
+        f"{SYSTEM_PREFIX}  工具调度: {sched['calls']} 次调用，{sched['waited']} 次因读写冲突等待"
+        f"（共 {sched['wait_seconds']:.1f} 秒，最多 {sched['max_running']} 个并发）"
+    )
+
+
+def print_sessions(work_dir, limit=20):
+    sessions = list_sessions(work_dir, limit=limit)
+    if not sessions:
+        print(f"{SYSTEM_PREFIX}  {work_dir} 下还没有保存的会话")
+        return
+    print(f"{SYSTEM_PREFIX}  {work_dir} 最近的会话（用 --session <id> 继续）:")
+    for info in sessions:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.updated_at))
+        print(
+            f"   {Fore.YELLOW}{info.session_id}{Style.RESET_ALL}  {updated}  "
+            f"{info.turns:>3} 轮  {info.title}"
+        )
 
 
 def main():
@@ -204,10 +348,98 @@ def main():
         default=None,
         help="Absolute or relative path to the target project directory",
     )
+    parser.add_argument(
+        "--watch",
+        dest="watch",
+        choices=["auto", "inotify", "poll", "off"],
+        default="auto",
+        help="Filesystem watcher used to keep tool caches fresh (default: auto)",
+    )
+    parser.add_argument(
+        "--no-shell-pool",
+        dest="shell_pool",
+        action="store_false",
+        help="Run every bash command in a fresh shell instead of persistent shell sessions",
+    )
+    parser.add_argument(
+        "--durability",
+        dest="durability",
+        choices=["none", "file", "full"],
+        default="file",
+        help="fsync policy of write_file/edit_file: none, file data (default), or data + directory",
+    )
+    parser.add_argument(
+        "--grep-workers",
+        dest="grep_workers",
+        type=int,
+        default=None,
+        help="Processes grep uses to scan large trees (default: CPU count, 1 = no parallelism)",
+    )
+    parser.add_argument(
+        "--history-tokens",
+        dest="history_tokens",
+        type=int,
+        default=48_000,
+        help="Token budget of the conversation history replayed to the model; older turns "
+        "are summarized (0 = replay the full history)",
+    )
+    parser.add_argument(
+        "--session",
+        dest="session_id",
+        default=None,
+        help="Session id to continue (see --list-sessions); default: start a new session",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the most recent session of the work directory",
+    )
+    parser.add_argument(
+        "--list-sessions",
+        dest="list_sessions",
+        action="store_true",
+        help="List the recent sessions of the work directory and exit",
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics",
+        nargs="?",
+        const=str(default_metrics_path()),
+        default=None,
+        metavar="PATH",
+        help="Record per-turn/per-tool latency and tokens to a local JSONL file "
+        f"(default: {default_metrics_path()}) and print a summary after each request",
+    )
+    parser.add_argument(
+        "--no-tracing",
+        dest="tracing",
+        action="store_false",
+        help="Do not send traces to the remote tracing endpoint",
+    )
     args = parser.parse_args()
+    set_durability(args.durability)
+    if args.grep_workers is not None:
+        if args.grep_workers <= 0:
+            parser.error("--grep-workers must be greater than 0")
+        set_grep_workers(args.grep_workers)
+    if not args.tracing:
+        set_tracing_disabled(True)
 
     work_dir = Path(args.work_dir).expanduser().resolve() if args.work_dir else None
-    asyncio.run(cli(work_dir=work_dir))
+    if args.list_sessions:
+        print_sessions(work_dir or Path.cwd())
+        return
+    asyncio.run(
+        cli(
+            work_dir=work_dir,
+            watch=args.watch,
+            shell_pool=args.shell_pool,
+            history_tokens=args.history_tokens,
+            session_id=args.session_id,
+            resume=args.resume,
+            metrics_path=args.metrics,
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""Token-bounded view of a session's history.
+
+`Runner.run_streamed(..., session=...)` prepends *everything* `session.get_items()`
+returns to every run, so with a plain `SQLiteSession` each user turn replays all earlier
+turns — including every large tool output — and the prompt grows without bound.
+`CompactingSession` wraps the store and keeps the full history there untouched, but
+shapes what the model sees:
+
+- the history is split into turns (a turn starts at a user message); the newest turns
+  are replayed verbatim as long as they fit `window_tokens`;
+- tool outputs larger than `stub_min_tokens` in turns older than the last
+  `keep_output_turns` are replaced by a short stub (head of the output plus a note to
+  re-run the tool), keeping their `call_id` so call/output pairs stay valid;
+- turns that no longer fit are folded into a summary message placed first. The
+  boundary only moves forward and jumps to `low_water` of the window when it moves, so
+  the replayed prefix stays identical for many turns (which keeps provider prompt
+  caching effective) instead of shifting by one turn every time;
+- summaries are extractive by default (request, tools used, reply — clipped); pass an
+  async `summarize(items) -> str` (e.g. a model call) to replace that.
+
+Only `get_items` is shaped; `add_items` / `pop_item` / `clear_session` go to the store.
+"""
+
+import json
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+from agents.memory import Session
+
+from tools.output_budget import clip_line, estimate_tokens
+
+
+Item = dict[str, Any]
+_SUMMARY_HEADER = "[Summary of earlier conversation turns; their full tool outputs are no longer available]"
+
+
+def _item_tokens(item: Any) -> int:
+    if isinstance(item, dict):
+        return estimate_tokens(json.dumps(item, ensure_ascii=False))
+    return estimate_tokens(str(item))
+
+
+def _is_user_message(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and item.get("role") == "user"
+        and item.get("type", "message") == "message"
+    )
+
+
+def _text_of(content: Any) -> str:
+    """Plain text of a message `content` (a string or a list of content parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict) and isinstance(part.get("text"), str):
+                parts.append(part["text"])
+        return "\n".join(parts)
+    return ""
+
+
+def _split_turns(items: list[Any]) -> list[list[Any]]:
+    turns: list[list[Any]] = []
+    for item in items:
+        if _is_user_message(item) or not turns:
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+
+def _stub_output(item: Item, tokens: int, tool_names: dict[str, str]) -> Item:
+    output = item.get("output")
+    text = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False)
+    head = "\n".join(clip_line(line, 200) for line in text.splitlines()[:5])
+    name = tool_names.get(item.get("call_id", ""), "tool")
+    stub = (
+        f"{head}\n... [{name} output of ~{tokens} tokens elided from history; "
+        "call the tool again if you need it]"
+    )
+    return {**item, "output": stub}
+
+
+def summarize_turn(number: int, turn: list[Any]) -> str:
+    """One extractive summary line: the request, the tools used and the final reply."""
+    request = ""
+    reply = ""
+    tools: Counter[str] = Counter()
+    for item in turn:
+        if not isinstance(item, dict):
+            continue
+        if _is_user_message(item) and not request:
+            request = _text_of(item.get("content"))
+        elif item.get("type") == "function_call":
+            tools[item.get("name", "tool")] += 1
+        elif item.get("role") == "assistant":
+            text = _text_of(item.get("content"))
+            if text.strip():
+                reply = text
+    line = f"- turn {number}: user: {clip_line(' '.join(request.split()), 300)}"
+    if tools:
+        used = ", ".join(f"{name} x{count}" if count > 1 else name for name, count in tools.items())
+        line += f" | tools: {used}"
+    if reply:
+        line += f" | assistant: {clip_line(' '.join(reply.split()), 400)}"
+    return line
+
+
+class CompactingSession:
+    """A `Session` that replays a token-budgeted window of the wrapped session."""
+
+    def __init__(
+        self,
+        store: Session,
+        *,
+        window_tokens: int = 48_000,
+        low_water: float = 0.6,
+        summary_tokens: int = 4_000,
+        stub_min_tokens: int = 500,
+        keep_output_turns: int = 2,
+        summarize: Callable[[list[Any]], Awaitable[str]] | None = None,
+    ):
+        self.store = store
+        self.session_id = store.session_id
+        self.window_tokens = window_tokens
+        self.low_water = low_water
+        self.summary_tokens = summary_tokens
+        self.stub_min_tokens = stub_min_tokens
+        self.keep_output_turns = keep_output_turns
+        self.summarize = summarize
+        # Turns folded into the summary so far, their summary lines, and how many of
+        # those lines were dropped to bound the summary.
+        self._compacted = 0
+        self._summary_lines: list[str] = []
+        self._omitted = 0
+        self.stats = {"prompt_tokens": 0, "compacted_turns": 0}
+
+    async def get_items(self, limit: int | None = None) -> list[Any]:
+        items = await self.store.get_items()
+        turns = _split_turns(items)
+        if self._compacted > len(turns):  # history was shortened (pop_item / clear)
+            self._reset()
+
+        # Turns already folded into the summary are not looked at again.
+        base = self._compacted
+        shaped = [
+            self._shape_turn(turn, len(turns) - i)
+            for i, turn in enumerate(turns)
+            if i >= base
+        ]
+        costs = [sum(_item_tokens(item) for item in turn) for turn in shaped]
+
+        window = sum(costs)
+        if window > self.window_tokens:
+            target = self.window_tokens * self.low_water
+            # Always keep the newest turn, however large.
+            while window > target and self._compacted < len(turns) - 1:
+                window -= costs[self._compacted - base]
+                self._compacted += 1
+            await self._add_summaries(turns, base, self._compacted)
+
+        summary = []
+        if self._summary_lines:
+            summary.append({"role": "system", "content": self._summary_text()})
+        kept = self._compacted - base
+        view = summary + [item for turn in shaped[kept:] for item in turn]
+
+        self.stats = {
+            "prompt_tokens": sum(map(_item_tokens, summary)) + sum(costs[kept:]),
+            "compacted_turns": self._compacted,
+        }
+        if limit is not None:
+            view = view[-limit:] if limit > 0 else []
+        return view
+
+    def _shape_turn(self, turn: list[Any], age: int) -> list[Any]:
+        """`turn` with bulky tool outputs stubbed if it is older than `keep_output_turns`."""
+        if age <= self.keep_output_turns:
+            return turn
+        tool_names = {
+            item.get("call_id", ""): item.get("name", "tool")
+            for item in turn
+            if isinstance(item, dict) and item.get("type") == "function_call"
+        }
+        shaped = []
+        for item in turn:
+            if isinstance(item, dict) and item.get("type") == "function_call_output":
+                tokens = _item_tokens(item)
+                if tokens > self.stub_min_tokens:
+                    item = _stub_output(item, tokens, tool_names)
+            shaped.append(item)
+        return shaped
+
+    async def _add_summaries(self, turns: list[list[Any]], start: int, end: int) -> None:
+        if end <= start:
+            return
+        if self.summarize is not None:
+            folded = [item for turn in turns[start:end] for item in turn]
+            text = await self.summarize(folded)
+            self._summary_lines.append(f"- turns {start + 1}-{end}: {text.strip()}")
+        else:
+            self._summary_lines.extend(
+                summarize_turn(number, turn)
+                for number, turn in enumerate(turns[start:end], start=start + 1)
+            )
+        # Bound the summary itself: drop the oldest lines.
+        while (
+            len(self._summary_lines) > 1
+            and estimate_tokens("\n".join(self._summary_lines)) > self.summary_tokens
+        ):
+            self._summary_lines.pop(0)
+            self._omitted += 1
+
+    def _summary_text(self) -> str:
+        lines = [_SUMMARY_HEADER]
+        if self._omitted:
+            lines.append(f"- ({self._omitted} earlier summary entries omitted)")
+        return "\n".join(lines + self._summary_lines)
+
+    def _reset(self) -> None:
+        self._compacted = 0
+        self._summary_lines = []
+        self._omitted = 0
+
+    async def add_items(self, items: list[Any]) -> None:
+        await self.store.add_items(items)
+
+    async def pop_item(self) -> Any | None:
+        return await self.store.pop_item()
+
+    async def clear_session(self) -> None:
+        await self.store.clear_session()
+        self._reset()
@@ -0,0 +1,188 @@
+"""Local per-turn latency and token instrumentation.
+
+`TurnRecorder` is a `RunHooks` implementation (pass it as `hooks=` to the runner) that
+also looks at the stream events of the run (`observe`), and records per user turn:
+
+- one `llm` span per model call: duration, time to first token (first streamed delta
+  after the call started), input / output / cached input tokens;
+- one `tool` span per tool call: tool name, call id, duration, result size;
+- a `turn` record: wall time, time to first token of the first model call, and the
+  totals of the spans.
+
+`end_turn` appends all records of the turn to a JSONL sink in one write (nothing leaves
+the machine) and returns a `TurnSummary` for display.
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from agents import RawResponsesStreamEvent, RunHooks
+from agents.items import ModelResponse
+
+
+def default_metrics_path() -> Path:
+    return Path.home() / ".kk_agent" / "metrics.jsonl"
+
+
+class ToolTotals(NamedTuple):
+    calls: int
+    seconds: float
+    max_seconds: float
+
+
+class TurnSummary(NamedTuple):
+    turn: int
+    seconds: float
+    first_token_seconds: float | None
+    llm_calls: int
+    llm_seconds: float
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    tools: dict[str, ToolTotals]
+
+
+class TurnRecorder(RunHooks):
+    """Collects spans of one user turn at a time (`begin_turn` ... `end_turn`)."""
+
+    def __init__(self, sink: str | os.PathLike | None = None, session_id: str = ""):
+        self.sink = Path(sink) if sink is not None else None
+        self.session_id = session_id
+        self._turn = 0
+        self._turn_start = 0.0
+        self._llm_start: float | None = None
+        self._llm_first_token: float | None = None
+        self._tool_starts: dict[str, float] = {}
+        self._records: list[dict[str, Any]] = []
+
+    def begin_turn(self, turn: int) -> None:
+        self._turn = turn
+        self._turn_start = time.perf_counter()
+        self._llm_start = None
+        self._llm_first_token = None
+        self._tool_starts.clear()
+        self._records = []
+
+    def _span(self, kind: str, start: float, **fields: Any) -> None:
+        self._records.append(
+            {
+                "kind": kind,
+                "session": self.session_id,
+                "turn": self._turn,
+                "offset": round(start - self._turn_start, 4),
+                "seconds": round(time.perf_counter() - start, 4),
+                **fields,
+            }
+        )
+
+    # --- stream events ----------------------------------------------------------------
+
+    def observe(self, event: Any) -> None:
+        """Feed every event of `stream_events()` (used for time to first token)."""
+        if (
+            self._llm_start is not None
+            and self._llm_first_token is None
+            and isinstance(event, RawResponsesStreamEvent)
+            and event.data.type.endswith(".delta")
+        ):
+            self._llm_first_token = time.perf_counter()
+
+    # --- RunHooks ---------------------------------------------------------------------
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self._llm_start = time.perf_counter()
+        self._llm_first_token = None
+
+    async def on_llm_end(self, context, agent, response: ModelResponse) -> None:
+        if self._llm_start is None:
+            return
+        usage = response.usage
+        first_token = (
+            round(self._llm_first_token - self._llm_start, 4)
+            if self._llm_first_token is not None
+            else None
+        )
+        self._span(
+            "llm",
+            self._llm_start,
+            agent=agent.name,
+            first_token_seconds=first_token,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=usage.input_tokens_details.cached_tokens or 0,
+        )
+        self._llm_start = None
+
+    @staticmethod
+    def _call_key(context, tool) -> str:
+        return getattr(context, "tool_call_id", None) or f"{tool.name}:{id(context)}"
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._tool_starts[self._call_key(context, tool)] = time.perf_counter()
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        key = self._call_key(context, tool)
+        start = self._tool_starts.pop(key, None)
+        if start is None:
+            return
+        self._span(
+            "tool",
+            start,
+            tool=tool.name,
+            call_id=key,
+            result_chars=len(str(result)),
+        )
+
+    # --- per turn ---------------------------------------------------------------------
+
+    def end_turn(self) -> TurnSummary:
+        """Write the turn's records to the sink and summarize them."""
+        llm = [record for record in self._records if record["kind"] == "llm"]
+        tools: dict[str, list[float]] = defaultdict(list)
+        for record in self._records:
+            if record["kind"] == "tool":
+                tools[record["tool"]].append(record["seconds"])
+        summary = TurnSummary(
+            turn=self._turn,
+            seconds=time.perf_counter() - self._turn_start,
+            first_token_seconds=llm[0]["first_token_seconds"] if llm else None,
+            llm_calls=len(llm),
+            llm_seconds=sum(record["seconds"] for record in llm),
+            input_tokens=sum(record["input_tokens"] for record in llm),
+            output_tokens=sum(record["output_tokens"] for record in llm),
+            cached_tokens=sum(record["cached_tokens"] for record in llm),
+            tools={
+                name: ToolTotals(len(durations), sum(durations), max(durations))
+                for name, durations in sorted(tools.items())
+            },
+        )
+        if self.sink is not None:
+            turn_record = {
+                "kind": "turn",
+                "session": self.session_id,
+                "turn": self._turn,
+                "time": round(time.time(), 3),
+                "seconds": round(summary.seconds, 4),
+                "first_token_seconds": summary.first_token_seconds,
+                "llm_calls": summary.llm_calls,
+                "llm_seconds": round(summary.llm_seconds, 4),
+                "tool_calls": sum(totals.calls for totals in summary.tools.values()),
+                "tool_seconds": round(sum(t.seconds for t in summary.tools.values()), 4),
+                "input_tokens": summary.input_tokens,
+                "output_tokens": summary.output_tokens,
+                "cached_tokens": summary.cached_tokens,
+            }
+            lines = [json.dumps(record, ensure_ascii=False) for record in self._records]
+            lines.append(json.dumps(turn_record, ensure_ascii=False))
+            try:
+                self.sink.parent.mkdir(parents=True, exist_ok=True)
+                with self.sink.open("a", encoding="utf-8") as fh:
+                    fh.write("\n".join(lines) + "\n")
+            except OSError:
+                pass  # metrics must never break the conversation
+        self._records = []
+        return summary
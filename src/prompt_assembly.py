@@ -0,0 +1,131 @@
+"""Prompt assembly that keeps the request prefix stable for provider KV caching.
+
+OpenAI-compatible backends reuse the KV cache of the longest *byte-identical* prefix of
+a request (tool definitions, then the system prompt, then the history). A value that
+changes between runs near the start — e.g. the work directory substituted into the
+first lines of `system_prompt.md` — invalidates everything after it. So:
+
+- `assemble_instructions` keeps the template lines without dynamic placeholders, in
+  order, as the static body, and moves the lines that mention a placeholder (with the
+  value substituted) into an environment section at the *end* of the system prompt;
+- `prepare_tools` orders tools by name, so the tool block is identical however the tool
+  list is built, and serializes each tool's definition once per process (`tool_schema`);
+- `prefix_fingerprint` hashes tools + static instructions and remembers the last value
+  (`~/.kk_agent/prefix_fingerprint`), so the CLI can tell when the cacheable prefix
+  changed since the previous run;
+- `PrefixCacheStats` accumulates `usage.input_tokens_details.cached_tokens` (the
+  provider's prefix-cache hits) against input tokens, per turn and in total.
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterable
+
+from agents import FunctionTool, Tool
+from agents.usage import Usage
+
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_ENVIRONMENT_HEADER = "# 运行环境"
+
+_schema_cache: dict[tuple[int, str], str] = {}
+
+
+def assemble_instructions(template: str, values: dict[str, Any]) -> str:
+    """Static template lines first, lines mentioning `{key}` of `values` last (filled in)."""
+    static: list[str] = []
+    dynamic: list[str] = []
+    for line in template.splitlines():
+        keys = [key for key in _PLACEHOLDER.findall(line) if key in values]
+        if not keys:
+            static.append(line)
+            continue
+        for key in keys:
+            line = line.replace("{" + key + "}", str(values[key]))
+        dynamic.append(line.strip())
+    # Removing a line can leave two blank lines in a row.
+    body = re.sub(r"\n{3,}", "\n\n", "\n".join(static)).strip()
+    if not dynamic:
+        return body
+    return f"{body}\n\n{_ENVIRONMENT_HEADER}\n" + "\n".join(dynamic)
+
+
+def static_instructions(template: str, values: dict[str, Any]) -> str:
+    """The part of `assemble_instructions` that does not depend on `values`."""
+    return assemble_instructions(template, values).split(f"\n\n{_ENVIRONMENT_HEADER}\n")[0]
+
+
+def tool_schema(tool: Tool) -> str:
+    """Canonical serialized definition of `tool` (computed once per tool object)."""
+    key = (id(tool), tool.name)
+    cached = _schema_cache.get(key)
+    if cached is None:
+        definition: dict[str, Any] = {"name": tool.name}
+        if isinstance(tool, FunctionTool):
+            definition.update(
+                description=tool.description,
+                parameters=tool.params_json_schema,
+                strict=tool.strict_json_schema,
+            )
+        cached = _schema_cache[key] = json.dumps(definition, ensure_ascii=False)
+    return cached
+
+
+def prepare_tools(tools: Iterable[Tool]) -> list[Tool]:
+    """`tools` sorted by name, with their serialized definitions precomputed."""
+    ordered = sorted(tools, key=lambda tool: tool.name)
+    for tool in ordered:
+        tool_schema(tool)
+    return ordered
+
+
+def prefix_fingerprint(tools: list[Tool], static_prompt: str) -> str:
+    digest = hashlib.sha256()
+    for tool in tools:
+        digest.update(tool_schema(tool).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(static_prompt.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def fingerprint_changed(fingerprint: str, state_path: Path | None = None) -> bool | None:
+    """Compare with (and record) the previous run's fingerprint; `None` on the first run."""
+    path = state_path or Path.home() / ".kk_agent" / "prefix_fingerprint"
+    try:
+        previous = path.read_text(encoding="utf-8").strip()
+    except OSError:
+        previous = None
+    if previous != fingerprint:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(fingerprint, encoding="utf-8")
+        except OSError:
+            pass
+    return None if previous is None else previous != fingerprint
+
+
+class PrefixCacheStats:
+    """Provider prefix-cache hits (cached input tokens) per turn and in total."""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.last: tuple[int, int, int] = (0, 0, 0)
+
+    def add(self, usage: Usage) -> None:
+        cached = usage.input_tokens_details.cached_tokens or 0
+        self.last = (usage.requests, usage.input_tokens, cached)
+        self.requests += usage.requests
+        self.input_tokens += usage.input_tokens
+        self.cached_tokens += cached
+
+    @staticmethod
+    def rate(cached: int, total: int) -> float:
+        return cached / total if total else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.rate(self.cached_tokens, self.input_tokens)
@@ -0,0 +1,359 @@
+"""File-backed conversation store for the CLI sessions.
+
+One SQLite database (`~/.kk_agent/sessions.sqlite`, or `$KK_SESSION_DB`) holds every
+run of every workspace:
+
+- each CLI run gets its own session id (`new_session_id`), recorded with its workspace,
+  so runs no longer share one history and a run can be resumed later (`--resume`,
+  `--session ID`); `list_sessions` is an index scan on (workspace, updated_at), fast
+  with thousands of runs;
+- WAL journaling with `synchronous=NORMAL`: readers do not block the writer, and a
+  commit costs an append to the WAL instead of a rewrite of the database pages;
+- the runner calls `add_items` several times per user turn (input, then every model
+  step); items are buffered and written in one transaction by `flush()` (called by the
+  CLI at the end of each turn, and when the buffer grows large);
+- every item carries its turn number, and tool calls/outputs their tool name and the
+  file paths in their arguments, so `items_for_turn`, `find_tool_items` and
+  `find_path_items` are indexed lookups instead of scans over the JSON history.
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+
+_SCHEMA_VERSION = 1
+_FLUSH_THRESHOLD = 256  # buffered items that force a flush before the turn ends
+_TITLE_CHARS = 80
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    " session_id TEXT PRIMARY KEY,"
+    " workspace TEXT NOT NULL,"
+    " title TEXT NOT NULL DEFAULT '',"
+    " created_at REAL NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " turns INTEGER NOT NULL DEFAULT 0,"
+    " items INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS sessions_by_workspace ON sessions (workspace, updated_at)",
+    "CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions (updated_at)",
+    "CREATE TABLE IF NOT EXISTS items ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " session_id TEXT NOT NULL,"
+    " turn INTEGER NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " tool_name TEXT,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS items_by_turn ON items (session_id, turn)",
+    "CREATE INDEX IF NOT EXISTS items_by_tool ON items (tool_name, session_id)"
+    " WHERE tool_name IS NOT NULL",
+    "CREATE TABLE IF NOT EXISTS item_paths ("
+    " item_id INTEGER NOT NULL,"
+    " session_id TEXT NOT NULL,"
+    " path TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS item_paths_by_path ON item_paths (path, session_id)",
+    "CREATE INDEX IF NOT EXISTS item_paths_by_item ON item_paths (item_id)",
+)
+
+
+class SessionInfo(NamedTuple):
+    session_id: str
+    workspace: str
+    title: str
+    created_at: float
+    updated_at: float
+    turns: int
+    items: int
+
+
+def default_db_path() -> Path:
+    configured = os.environ.get("KK_SESSION_DB")
+    if configured:
+        return Path(configured).expanduser()
+    return Path.home() / ".kk_agent" / "sessions.sqlite"
+
+
+def new_session_id() -> str:
+    """A fresh, sortable id: start time plus a random suffix."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(3)
+
+
+def _is_user_message(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and item.get("role") == "user"
+        and item.get("type", "message") == "message"
+    )
+
+
+def _argument_paths(arguments: Any) -> list[str]:
+    """File paths mentioned in a tool call's JSON arguments (`*path`, `*paths`, edit lists)."""
+    try:
+        parsed = json.loads(arguments) if isinstance(arguments, str) else arguments
+    except ValueError:
+        return []
+    if not isinstance(parsed, dict):
+        return []
+    paths: list[str] = []
+    for key, value in parsed.items():
+        if key.endswith("path") and isinstance(value, str) and value:
+            paths.append(value)
+        elif key.endswith("paths") and isinstance(value, list):
+            paths.extend(v for v in value if isinstance(v, str) and v)
+        elif key == "edits_json":  # multi_edit
+            try:
+                edits = json.loads(value)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(edits, list):
+                paths.extend(
+                    edit["file_path"]
+                    for edit in edits
+                    if isinstance(edit, dict) and isinstance(edit.get("file_path"), str)
+                )
+    return list(dict.fromkeys(paths))
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', ?)", (str(_SCHEMA_VERSION),)
+        )
+    conn.commit()
+    return conn
+
+
+def list_sessions(
+    workspace: str | os.PathLike | None = None,
+    limit: int = 20,
+    db_path: Path | None = None,
+) -> list[SessionInfo]:
+    """Most recently updated sessions first (of `workspace`, or of all workspaces)."""
+    path = db_path or default_db_path()
+    if not path.exists():
+        return []
+    conn = _connect(path)
+    try:
+        columns = "session_id, workspace, title, created_at, updated_at, turns, items"
+        if workspace is None:
+            rows = conn.execute(
+                f"SELECT {columns} FROM sessions ORDER BY updated_at DESC LIMIT ?", (limit,)
+            )
+        else:
+            rows = conn.execute(
+                f"SELECT {columns} FROM sessions WHERE workspace = ?"
+                " ORDER BY updated_at DESC LIMIT ?",
+                (str(workspace), limit),
+            )
+        return [SessionInfo(*row) for row in rows]
+    finally:
+        conn.close()
+
+
+class SessionStore:
+    """`Session` backed by the shared database; items are buffered until `flush()`."""
+
+    def __init__(
+        self,
+        session_id: str,
+        workspace: str | os.PathLike,
+        db_path: Path | None = None,
+    ):
+        self.session_id = session_id
+        self.workspace = str(workspace)
+        self.db_path = db_path or default_db_path()
+        self._conn = _connect(self.db_path)
+        self._lock = threading.Lock()
+        self._pending: list[tuple[int, str, str | None, list[str], str]] = []
+        self._call_names: dict[str, str] = {}
+        row = self._conn.execute(
+            "SELECT turns FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        self.turn = row[0] if row else 0
+        self.exists = row is not None
+
+    def _describe(self, item: Any) -> tuple[str, str | None, list[str]]:
+        """(kind, tool name, file paths) of one item."""
+        if not isinstance(item, dict):
+            return "unknown", None, []
+        kind = item.get("type") or ("message" if "role" in item else "unknown")
+        if kind == "function_call":
+            name = item.get("name")
+            self._call_names[item.get("call_id", "")] = name
+            return kind, name, _argument_paths(item.get("arguments"))
+        if kind == "function_call_output":
+            return kind, self._call_names.get(item.get("call_id", "")), []
+        return kind, None, []
+
+    # --- Session protocol -------------------------------------------------------------
+
+    async def get_items(self, limit: int | None = None) -> list[Any]:
+        return await asyncio.to_thread(self._get_items, limit)
+
+    def _get_items(self, limit: int | None) -> list[Any]:
+        with self._lock:
+            pending = [data for _turn, _kind, _tool, _paths, data in self._pending]
+            if limit is None:
+                rows = self._conn.execute(
+                    "SELECT data FROM items WHERE session_id = ? ORDER BY id", (self.session_id,)
+                ).fetchall()
+            else:
+                wanted = max(limit - len(pending), 0)
+                rows = self._conn.execute(
+                    "SELECT data FROM (SELECT id, data FROM items WHERE session_id = ?"
+                    " ORDER BY id DESC LIMIT ?) ORDER BY id",
+                    (self.session_id, wanted),
+                ).fetchall()
+        items = [json.loads(data) for (data,) in rows] + [json.loads(data) for data in pending]
+        if limit is not None:
+            items = items[-limit:] if limit > 0 else []
+        return items
+
+    async def add_items(self, items: list[Any]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for item in items:
+                if _is_user_message(item):
+                    self.turn += 1
+                kind, tool_name, paths = self._describe(item)
+                self._pending.append(
+                    (self.turn, kind, tool_name, paths, json.dumps(item, ensure_ascii=False))
+                )
+            full = len(self._pending) >= _FLUSH_THRESHOLD
+        if full:
+            await self.flush()
+
+    async def pop_item(self) -> Any | None:
+        return await asyncio.to_thread(self._pop_item)
+
+    def _pop_item(self) -> Any | None:
+        with self._lock:
+            if self._pending:
+                return json.loads(self._pending.pop()[4])
+            row = self._conn.execute(
+                "SELECT id, data FROM items WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (self.session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("DELETE FROM items WHERE id = ?", (row[0],))
+                self._conn.execute("DELETE FROM item_paths WHERE item_id = ?", (row[0],))
+                self._conn.execute(
+                    "UPDATE sessions SET items = items - 1, updated_at = ? WHERE session_id = ?",
+                    (time.time(), self.session_id),
+                )
+            return json.loads(row[1])
+
+    async def clear_session(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.turn = 0
+            with self._conn:
+                self._conn.execute("DELETE FROM items WHERE session_id = ?", (self.session_id,))
+                self._conn.execute(
+                    "DELETE FROM item_paths WHERE session_id = ?", (self.session_id,)
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET turns = 0, items = 0, updated_at = ?"
+                    " WHERE session_id = ?",
+                    (time.time(), self.session_id),
+                )
+
+    # --- batching -------------------------------------------------------------------
+
+    async def flush(self) -> None:
+        """Write the buffered items in one transaction."""
+        await asyncio.to_thread(self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            now = time.time()
+            title = ""
+            if not self.exists:
+                for _turn, _kind, _tool, _paths, data in pending:
+                    item = json.loads(data)
+                    if _is_user_message(item) and isinstance(item.get("content"), str):
+                        title = " ".join(item["content"].split())[:_TITLE_CHARS]
+                        break
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, workspace, title, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id) DO NOTHING",
+                    (self.session_id, self.workspace, title, now, now),
+                )
+                for turn, kind, tool_name, paths, data in pending:
+                    cursor = self._conn.execute(
+                        "INSERT INTO items (session_id, turn, kind, tool_name, data)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (self.session_id, turn, kind, tool_name, data),
+                    )
+                    if paths:
+                        self._conn.executemany(
+                            "INSERT INTO item_paths (item_id, session_id, path) VALUES (?, ?, ?)",
+                            [(cursor.lastrowid, self.session_id, path) for path in paths],
+                        )
+                self._conn.execute(
+                    "UPDATE sessions SET updated_at = ?, turns = ?, items = items + ?"
+                    " WHERE session_id = ?",
+                    (now, self.turn, len(pending), self.session_id),
+                )
+            self.exists = True
+
+    def close(self) -> None:
+        self._flush()
+        with self._lock:
+            self._conn.close()
+
+    # --- indexed queries --------------------------------------------------------------
+
+    def _query(self, sql: str, params: tuple) -> list[Any]:
+        self._flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def items_for_turn(self, turn: int) -> list[Any]:
+        return self._query(
+            "SELECT data FROM items WHERE session_id = ? AND turn = ? ORDER BY id",
+            (self.session_id, turn),
+        )
+
+    def find_tool_items(self, tool_name: str, limit: int = 50) -> list[Any]:
+        """The latest calls and outputs of `tool_name` in this session, oldest first."""
+        return self._query(
+            "SELECT data FROM (SELECT id, data FROM items WHERE tool_name = ? AND session_id = ?"
+            " ORDER BY id DESC LIMIT ?) ORDER BY id",
+            (tool_name, self.session_id, limit),
+        )
+
+    def find_path_items(self, path: str, limit: int = 50) -> list[Any]:
+        """The latest tool calls of this session whose arguments name `path`, oldest first."""
+        return self._query(
+            "SELECT data FROM (SELECT items.id, items.data FROM item_paths"
+            " JOIN items ON items.id = item_paths.item_id"
+            " WHERE item_paths.path = ? AND item_paths.session_id = ?"
+            " ORDER BY items.id DESC LIMIT ?) ORDER BY id",
+            (path, self.session_id, limit),
+        )
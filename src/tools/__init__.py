@@ -1,19 +1,26 @@
 from .bash_tool import bash
-from .read_file_tool import read_file
+from .read_file_tool import read_file, read_files
 from .write_file_tool import write_file
 from .edit_file_tool import edit_file
+from .multi_edit_tool import multi_edit
+from .undo_tool import undo
 from .search_tool import grep, glob
 from .think import think
+from .output_budget import fetch_more
 from .todo_list import todo_list
 from .sub_agents import explore_agent
 
 __all__ = [
     "bash", 
     "read_file",
+    "read_files",
     "write_file",
     "edit_file",
+    "multi_edit",
+    "undo",
     "grep", "glob",
     "think",
+    "fetch_more",
     "todo_list",
     "explore_agent"
 ]
@@ -0,0 +1,109 @@
+"""Atomic file replacement for the file-writing tools.
+
+`write_file` / `edit_file` used to open the target with `"w"` and write in place, so a
+crash, a full disk or a concurrent reader (the user's editor, a test runner started via
+`bash`) could observe a truncated file. Here the new content goes to a temporary file in
+the same directory which then replaces the target with `os.replace` (atomic on POSIX and
+on Windows for same-volume renames):
+
+- the target's permission bits are carried over (new files get the usual umask-derived
+  mode instead of `mkstemp`'s 0600); symlinks are followed, so the link stays a link;
+- durability is configurable (`set_durability`):
+  - `"none"`: no fsync; fastest, relies on the filesystem's rename ordering;
+  - `"file"` (default): fsync the data before the rename, so the target is always either
+    the old or the complete new content, even after a power loss;
+  - `"full"`: additionally fsync the directory so the rename itself is durable.
+"""
+
+import os
+import tempfile
+
+
+_DURABILITY_LEVELS = ("none", "file", "full")
+_durability = "file"
+
+
+def set_durability(level: str) -> None:
+    global _durability
+    if level not in _DURABILITY_LEVELS:
+        raise ValueError(f"durability must be one of {', '.join(_DURABILITY_LEVELS)}")
+    _durability = level
+
+
+def get_durability() -> str:
+    return _durability
+
+
+def _read_umask() -> int:
+    """The process umask, read once at import.
+
+    `os.umask` can only read the mask by setting it, which is process-wide: a file
+    created or a process spawned by another thread in between would get the temporary
+    mask. Linux exposes it in /proc instead; elsewhere it is read by setting a
+    restrictive mask, once, before any tool runs.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii", errors="replace") as fh:
+            for line in fh:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _read_umask()
+
+
+def _default_mode() -> int:
+    # The mode `open(path, "w")` would have produced: 0o666 minus the umask.
+    return 0o666 & ~_UMASK
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows: directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: str | os.PathLike, data: bytes) -> None:
+    """Replace `path` with `data` atomically (see module docstring). Raises OSError."""
+    target = os.path.realpath(path)
+    directory = os.path.dirname(target)
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = _default_mode()
+
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(target)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            if _durability != "none":
+                os.fsync(fh.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if _durability == "full":
+        _fsync_dir(directory)
+
+
+def atomic_write_text(path: str | os.PathLike, text: str, encoding: str = "utf-8") -> None:
+    atomic_write_bytes(path, text.encode(encoding))
@@ -1,49 +1,268 @@
 from agents import function_tool
 import asyncio
+import os
+import signal
+import time
+from typing import Callable
+
+from .output_budget import estimate_tokens, fit_text, get_budget
+from .result_cache import bump_generation
+from .shell_pool import get_shell_pool
+from .tool_scheduler import scheduled
+from .workspace_cache import invalidate_all
+
+
+# Bytes kept from the start and from the end of each stream; anything in between is
+# counted but dropped, so a multi-hundred-MB build log never sits in memory.
+_HEAD_BYTES = 256 * 1024
+_TAIL_BYTES = 256 * 1024
+_READ_CHUNK = 64 * 1024
+# A partial line longer than this is forwarded to listeners without waiting for "\n".
+_MAX_LIVE_LINE_BYTES = 4096
+# Live lines are rate limited per stream; skipped lines are reported as a count.
+_LIVE_WINDOW_SECONDS = 0.1
+_LIVE_LINES_PER_WINDOW = 20
+# How long to wait for the pipes to drain after the process group has been killed.
+_KILL_GRACE_SECONDS = 2.0
+
+
+_output_listeners: list[Callable[[str, str], None]] = []
+
+
+def add_bash_output_listener(listener: Callable[[str, str], None]) -> None:
+    """Register a callback receiving `(stream, line)` for each output line while `bash` runs.
+
+    `stream` is `"stdout"` or `"stderr"`; `line` has no trailing newline. Callbacks run on
+    the event loop thread and should be quick.
+    """
+    if listener not in _output_listeners:
+        _output_listeners.append(listener)
+
+
+def remove_bash_output_listener(listener: Callable[[str, str], None]) -> None:
+    if listener in _output_listeners:
+        _output_listeners.remove(listener)
+
+
+class _CapturedStream:
+    """Bounded capture of one pipe: the first and last bytes are kept, the middle is counted."""
+
+    def __init__(self, name: str, head_bytes: int = _HEAD_BYTES, tail_bytes: int = _TAIL_BYTES):
+        self.name = name
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._head_bytes = head_bytes
+        # Bytes after the head; trimmed to the last `tail_bytes` once it grows past twice that.
+        self._tail = bytearray()
+        self._tail_bytes = tail_bytes
+        self._partial = bytearray()
+        self._window_start = 0.0
+        self._window_lines = 0
+        self._skipped_lines = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.total_bytes += len(chunk)
+        self._emit_lines(chunk)
+        room = self._head_bytes - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self._tail += chunk
+            if len(self._tail) > 2 * self._tail_bytes:
+                del self._tail[: len(self._tail) - self._tail_bytes]
+
+    def _emit_lines(self, chunk: bytes) -> None:
+        if not _output_listeners:
+            return
+        now = time.monotonic()
+        if now - self._window_start >= _LIVE_WINDOW_SECONDS:
+            self._window_start = now
+            self._window_lines = 0
+            self._flush_skipped()
+        if self._window_lines >= _LIVE_LINES_PER_WINDOW:
+            # Over the rate limit: only count lines, without splitting the chunk.
+            self._skipped_lines += chunk.count(b"\n")
+            last_newline = chunk.rfind(b"\n")
+            if last_newline >= 0:
+                self._partial = bytearray(chunk[last_newline + 1:])
+            elif len(self._partial) <= _MAX_LIVE_LINE_BYTES:
+                self._partial += chunk
+            return
+        self._partial += chunk
+        *lines, rest = self._partial.split(b"\n")
+        if len(rest) > _MAX_LIVE_LINE_BYTES:
+            lines.append(rest)
+            rest = b""
+        self._partial = bytearray(rest)
+        shown = lines[: _LIVE_LINES_PER_WINDOW - self._window_lines]
+        self._window_lines += len(shown)
+        self._skipped_lines += len(lines) - len(shown)
+        for line in shown:
+            self._notify(line)
+
+    def _flush_skipped(self) -> None:
+        if self._skipped_lines:
+            skipped, self._skipped_lines = self._skipped_lines, 0
+            for listener in list(_output_listeners):
+                listener(self.name, f"... ({skipped} lines not shown)")
+
+    def _notify(self, line: bytes) -> None:
+        text = line.rstrip(b"\r").decode("utf-8", errors="replace")
+        for listener in list(_output_listeners):
+            listener(self.name, text)
+
+    def close(self) -> None:
+        if self._partial and _output_listeners:
+            self._notify(bytes(self._partial))
+        self._partial.clear()
+        self._flush_skipped()
+
+    def text(self) -> str:
+        tail = bytes(self._tail[-self._tail_bytes:])
+        dropped = self.total_bytes - len(self._head) - len(tail)
+        if dropped <= 0:
+            return (bytes(self._head) + tail).decode("utf-8", errors="replace")
+        # Start the tail on a line boundary so no half line is shown.
+        newline = tail.find(b"\n")
+        if 0 <= newline < len(tail) - 1:
+            dropped += newline + 1
+            tail = tail[newline + 1:]
+        head = bytes(self._head).decode("utf-8", errors="replace")
+        marker = f"\n... [{dropped} bytes of {self.name} omitted] ...\n"
+        return head + marker + tail.decode("utf-8", errors="replace")
+
+
+async def _pump(reader: asyncio.StreamReader, capture: _CapturedStream) -> None:
+    while True:
+        chunk = await reader.read(_READ_CHUNK)
+        if not chunk:
+            break
+        capture.feed(chunk)
+    capture.close()
+
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """Kill the shell and everything it started (pipelines, test runners, servers)."""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _run_once(
+    shell_command: str, timeout: int, stdout: _CapturedStream, stderr: _CapturedStream
+) -> tuple[int | None, bool]:
+    """Run the command in a fresh shell; returns (exit code, timed out)."""
+    # Own session / process group, so a timeout can kill the whole tree.
+    process = await asyncio.create_subprocess_shell(
+            shell_command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=hasattr(os, "killpg"),
+        )
+    pumps = asyncio.gather(_pump(process.stdout, stdout), _pump(process.stderr, stderr))
+    try:
+        await asyncio.wait_for(asyncio.shield(pumps), timeout=timeout)
+        return await process.wait(), False
+    except asyncio.TimeoutError:
+        _kill_process_group(process)
+        # Background children may still hold the pipes; don't wait on them forever.
+        try:
+            await asyncio.wait_for(pumps, timeout=_KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        await process.wait()
+        return None, True
+    except asyncio.CancelledError:
+        _kill_process_group(process)
+        pumps.cancel()
+        raise
+
+
+def _fit_streams(stdout_text: str, stderr_text: str) -> tuple[str, str]:
+    """Keep stdout + stderr within the bash output budget (stderr gets at most a third).
+
+    Long outputs keep their head and (mostly) their tail, where errors and summaries
+    usually are; the elided middle can be read back with `fetch_more`.
+    """
+    max_tokens = get_budget("bash").max_tokens
+    stderr_text = fit_text(stderr_text, "bash", reserve_tokens=max_tokens - max_tokens // 3)
+    stdout_text = fit_text(stdout_text, "bash", reserve_tokens=estimate_tokens(stderr_text))
+    return stdout_text, stderr_text
+
 
 @function_tool
+# A shell command may read or write anything: it runs alone.
+@scheduled(exclusive=True)
 async def bash(shell_command: str, timeout: int) -> str:
     """Run a shell command and return stdout/stderr.
 
     Use this tool for command-line operations (e.g. `git`, `python`, `pytest`).
     For reading/writing/editing files, prefer dedicated file tools.
     For searching content or finding files, prefer dedicated `grep` or `glob` tools.
+    Commands run in persistent shell sessions: `cd` carries over to the next command, and
+    exported variables usually do (consecutive calls reuse the same shell). Stdin is
+    `/dev/null`, so interactive commands must be given their input explicitly.
 
     Args:
         shell_command: Command string to execute in a shell.
         timeout: Timeout in seconds for the command execution.
 
     Returns:
-        A success message including stdout/stderr, or an error string.
+        A success message including stdout/stderr, or an error string. Very long output
+        keeps its beginning and end; the omitted middle can be read with `fetch_more`.
+        On timeout the command and all processes it started are killed and the output
+        captured so far is included.
 
     Examples:
         - `git status`
         - `python -m py_compile src/main.py`
     """
-    process = await asyncio.create_subprocess_shell(
-            shell_command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-    
+    stdout = _CapturedStream("stdout")
+    stderr = _CapturedStream("stderr")
+    pool = get_shell_pool()
+    cwd_before = pool.cwd if pool is not None else None
     try:
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
-    except asyncio.TimeoutError:
-        process.kill()
-        error_msg = f"The Command `{shell_command}` timed out after {timeout} seconds"
-        return error_msg
+        if pool is not None:
+            result = await pool.run(shell_command, timeout, stdout.feed, stderr.feed)
+            stdout.close()
+            stderr.close()
+            returncode, timed_out = result.returncode, result.timed_out
+        else:
+            returncode, timed_out = await _run_once(shell_command, timeout, stdout, stderr)
+    finally:
+        # A shell command may touch any file, so cached metadata can no longer be trusted.
+        # Even with inotify, its events may not have been processed before the next tool
+        # call, and dropping the cache is cheap.
+        invalidate_all()
+        # Watcher events may lag behind the command: drop cached tool results right away.
+        bump_generation()
 
     # Decode output
-    stdout_text = stdout.decode("utf-8", errors="replace")
-    stderr_text = stderr.decode("utf-8", errors="replace")
+    stdout_text, stderr_text = _fit_streams(stdout.text(), stderr.text())
+
+    if timed_out:
+        error_msg = f"The Command `{shell_command}` timed out after {timeout} seconds"
+        if stdout_text.strip():
+            error_msg += f"\nThe StdOut so far:\n{stdout_text}"
+        if stderr_text.strip():
+            error_msg += f"\nThe StdErr so far:\n{stderr_text}"
+        return error_msg
 
     # Create result (content auto-formatted by model_validator)
-    is_success = process.returncode == 0
+    is_success = returncode == 0
     error_msg = None
     if not is_success:
-        error_msg = f"The Command `{shell_command}` failed with exit code {process.returncode}"
+        error_msg = f"The Command `{shell_command}` failed with exit code {returncode}"
         if stderr_text:
             error_msg += f"\n{stderr_text.strip()}"
         return error_msg
 
-    return f"The Command `{shell_command}` exectued successfully.\nThe StdOut:\n{stdout_text}\n\nThe StdErr:\n{stderr_text}\n"
+    result_msg = f"The Command `{shell_command}` exectued successfully.\nThe StdOut:\n{stdout_text}\n\nThe StdErr:\n{stderr_text}\n"
+    if pool is not None and pool.cwd != cwd_before:
+        result_msg += f"\nThe working directory is now: {pool.cwd}\n"
+    return result_msg
@@ -0,0 +1,178 @@
+"""Exact-substring replacement engine shared by the file-editing tools.
+
+All replacements of one call are located in the *original* content (each `old` must
+occur exactly once, and no two may overlap), then the new content is assembled in a
+single pass over the sorted spans, so a caller reads and writes each file once
+(atomically, via `atomic_io`) however many edits the call carries.
+
+Files with CRLF line endings keep them: if the file uses `\\r\\n` and an edit's text
+contains bare `\\n`, the edit is matched and written with `\\r\\n`.
+"""
+
+import difflib
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+
+class Replacement(NamedTuple):
+    old: str
+    new: str
+
+
+class PlannedEdit(NamedTuple):
+    """A located replacement: `content[start:end]` becomes `new`."""
+
+    start: int
+    end: int
+    new: str
+    index: int
+
+
+class EditError(Exception):
+    """A replacement cannot be applied; the message is the tool-facing error string."""
+
+
+def _match_newlines(content: str, replacement: Replacement) -> Replacement:
+    if "\r\n" not in content or "\r" in replacement.old or "\n" not in replacement.old:
+        return replacement
+    return Replacement(
+        replacement.old.replace("\n", "\r\n"), replacement.new.replace("\n", "\r\n")
+    )
+
+
+def plan_edits(
+    content: str, replacements: list[Replacement], numbers: list[int] | None = None
+) -> list[PlannedEdit]:
+    """Locate every replacement in `content`; raises EditError naming the failing one.
+
+    Error messages refer to edits as `edit #N`, N being the entry of `numbers` (default:
+    the 1-based position) — only when there are several or `numbers` is given.
+    """
+    labelled = numbers is not None or len(replacements) > 1
+    if numbers is None:
+        numbers = list(range(1, len(replacements) + 1))
+    planned: list[PlannedEdit] = []
+    for i, replacement in enumerate(replacements):
+        label = f"edit #{numbers[i]}: " if labelled else ""
+        if not replacement.old:
+            raise EditError(f"Error: {label}old_content must be a non-empty string")
+        old, new = _match_newlines(content, replacement)
+        start = content.find(old)
+        if start < 0:
+            raise EditError(
+                f"Error: {label}old_content not found in file. Please read the file first."
+            )
+        if content.find(old, start + 1) >= 0:
+            raise EditError(
+                f"Error: {label}old_content is not unique in file, please change "
+                "`old_content` input argument to Guaranteed to be unique."
+            )
+        planned.append(PlannedEdit(start, start + len(old), new, numbers[i]))
+
+    planned.sort()
+    for previous, current in zip(planned, planned[1:]):
+        if current.start < previous.end:
+            raise EditError(
+                f"Error: edit #{previous.index} and edit #{current.index} overlap; "
+                "merge them into one edit"
+            )
+    return planned
+
+
+def apply_edits(content: str, planned: list[PlannedEdit]) -> str:
+    """Assemble the edited content in one pass (`planned` sorted by position)."""
+    parts: list[str] = []
+    position = 0
+    for edit in planned:
+        parts.append(content[position:edit.start])
+        parts.append(edit.new)
+        position = edit.end
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@")
+
+
+def _back_lines(content: str, position: int, count: int) -> int:
+    """Start of the line `count` lines above the one containing `position`."""
+    start = content.rfind("\n", 0, position) + 1
+    for _ in range(count):
+        if start == 0:
+            break
+        start = content.rfind("\n", 0, start - 1) + 1
+    return start
+
+
+def _forward_lines(content: str, position: int, count: int) -> int:
+    """End (after the newline) of the line `count` lines below the one containing `position`."""
+    end = position
+    for _ in range(count + 1):
+        newline = content.find("\n", end)
+        if newline < 0:
+            return len(content)
+        end = newline + 1
+    return end
+
+
+def _split_lines(text: str) -> list[str]:
+    # Only "\n" separates lines (unlike `str.splitlines`), so numbers match the editor's.
+    lines = [line.rstrip("\r") for line in text.split("\n")]
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def unified_diff(
+    path: str, content: str, planned: list[PlannedEdit], context: int = 2
+) -> list[str]:
+    """Unified diff lines of applying `planned` to `content` (sorted by position).
+
+    Only windows around the edits are diffed, so the cost depends on the size of the
+    edits, not of the file.
+    """
+    windows: list[list] = []  # [start, end, edits]
+    for edit in planned:
+        start = _back_lines(content, edit.start, context)
+        end = _forward_lines(content, max(edit.end - 1, edit.start), context)
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+            windows[-1][2].append(edit)
+        else:
+            windows.append([start, end, [edit]])
+
+    lines = [f"--- a{path}", f"+++ b{path}"]
+    old_line = 0  # 0-based line number of `position`
+    position = 0
+    delta = 0
+    for start, end, edits in windows:
+        old_line += content.count("\n", position, start)
+        position = start
+        old_window = content[start:end]
+        new_window = apply_edits(
+            old_window, [edit._replace(start=edit.start - start, end=edit.end - start) for edit in edits]
+        )
+        old_lines = _split_lines(old_window)
+        new_lines = _split_lines(new_window)
+        for line in difflib.unified_diff(old_lines, new_lines, n=context, lineterm=""):
+            if line.startswith(("---", "+++")):
+                continue
+            header = _HUNK_HEADER.match(line)
+            if header:
+                old_start = int(header.group(1)) + old_line
+                new_start = int(header.group(3)) + old_line + delta
+                line = (
+                    f"@@ -{old_start}{header.group(2) or ''} "
+                    f"+{new_start}{header.group(4) or ''} @@"
+                )
+            lines.append(line)
+        delta += len(new_lines) - len(old_lines)
+    return lines
+
+
+def read_text(path: Path) -> str:
+    # `newline=""`: keep line endings as they are (no CRLF -> LF conversion on rewrite).
+    with path.open("r", encoding="utf-8", newline="") as fh:
+        return fh.read()
+
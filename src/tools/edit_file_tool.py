@@ -3,12 +3,19 @@ import asyncio
 import os
 from pathlib import Path
 
+from .atomic_io import atomic_write_text
+from .edit_engine import EditError, Replacement, apply_edits, plan_edits, read_text
+from .result_cache import bump_generation
+from .snapshot_journal import record_write
+from .tool_scheduler import scheduled
+from .workspace_cache import invalidate, invalidate_listing
+
 
 def _edit_file(file_path: str, old_content: str, new_content: str) -> str:
     """Replace a unique substring in a file (synchronous helper).
 
     This helper performs a single, exact string replacement. It requires `old_content`
-    to appear exactly once to avoid unintended edits.
+    to appear exactly once to avoid unintended edits. The file is replaced atomically.
 
     Args:
         file_path: Absolute path to the target file.
@@ -25,32 +32,37 @@ def _edit_file(file_path: str, old_content: str, new_content: str) -> str:
         return f"Error: path is not a file: {file_path}"
 
     try:
-        content = path.read_text(encoding="utf-8")
+        content = read_text(path)
     except OSError as exc:
         return f"Error reading file {file_path}: {exc}"
 
-    count = content.count(old_content)
-    if count == 0:
-        return "Error: old_content not found in file. Please read the file first."
-    if count > 1:
-        return "Error: old_content is not unique in file, please change `old_content` input argument to Guaranteed to be unique."
-
-    updated_content = content.replace(old_content, new_content, 1)
+    try:
+        planned = plan_edits(content, [Replacement(old_content, new_content)])
+    except EditError as exc:
+        return str(exc)
+    updated_content = apply_edits(content, planned)
 
     try:
-        path.write_text(updated_content, encoding="utf-8")
+        record_write(path, "edit_file", content.encode("utf-8"))
+        atomic_write_text(path, updated_content)
     except OSError as exc:
         return f"Error writing file {file_path}: {exc}"
+    finally:
+        invalidate(path)
+        invalidate_listing(path.parent)
+        bump_generation()
 
     return f"edit `{file_path}` successfully."
 
 
 
 @function_tool
+@scheduled(writes=["file_path"])
 async def edit_file(file_path: str, old_content: str, new_content: str) -> str:
     """Update an existing file by replacing a unique substring.
 
     Use this tool to modify an existing file without overwriting the whole file.
+    For several changes (in one or more files), use `multi_edit` once instead.
     `old_content` must match exactly and must be unique in the file, otherwise the
     tool will refuse to apply the change.
 
@@ -0,0 +1,325 @@
+"""Filesystem watcher that keeps the tools' caches fresh without re-stat'ing the tree.
+
+`start_watcher(root)` runs a background thread next to the CLI event loop:
+
+- On Linux it uses inotify (through ctypes, no extra dependency), adding a watch per
+  directory and skipping the same generated/vendor directories that `grep` skips.
+- Elsewhere, or when inotify is unavailable / out of watches, it falls back to a
+  polling thread that periodically diffs `(mtime, size)` snapshots of the tree.
+
+Every change is fed into `workspace_cache` (file metadata + directory listings) and
+to any extra listeners registered with `add_listener`. While the watcher is running,
+`workspace_cache` trusts entries under `root` instead of revalidating them, so
+`grep`/`glob` can answer from warm state.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Callable
+
+from . import workspace_cache
+
+
+# Same directory names that grep/glob skip by default; nothing inside them is watched.
+_IGNORED_DIR_NAMES = frozenset({
+    ".git",
+    ".hg",
+    ".svn",
+    ".venv",
+    "venv",
+    "__pycache__",
+    "node_modules",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".agent_snapshots",
+})
+
+_POLL_INTERVAL_SECONDS = 2.0
+
+# inotify constants (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+    | _IN_EXCL_UNLINK
+)
+# Events that add/remove a directory entry, i.e. change the parent's listing.
+_ENTRY_EVENTS = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Listener signature: (path, is_structural). `path` is None when everything may have changed.
+Listener = Callable[[str | None, bool], None]
+
+_listeners: list[Listener] = []
+_active: "_BaseWatcher | None" = None
+_active_lock = threading.Lock()
+
+
+def add_listener(listener: Listener) -> None:
+    """Register an extra change callback (e.g. for caches outside `workspace_cache`)."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _notify(path: str | None, structural: bool) -> None:
+    if path is None:
+        workspace_cache.invalidate_all()
+    else:
+        workspace_cache.invalidate(path)
+        if structural:
+            workspace_cache.invalidate_listing(os.path.dirname(path))
+    for listener in list(_listeners):
+        try:
+            listener(path, structural)
+        except Exception:
+            # A broken listener must not kill the watcher thread.
+            pass
+
+
+class _BaseWatcher:
+    backend = "base"
+
+    def __init__(self, root: str):
+        self.root = root
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"fs-watcher-{self.backend}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+
+class _InotifyWatcher(_BaseWatcher):
+    backend = "inotify"
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        self._paths: dict[int, str] = {}
+        try:
+            self._add_tree(root, strict=True)
+        except OSError:
+            self._close()
+            raise
+
+    def _add_watch(self, path: str, *, strict: bool) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # Running out of watches means we cannot promise freshness: let the caller
+            # fall back to polling. Directories that vanished meanwhile are fine.
+            if strict or err == errno.ENOSPC:
+                raise OSError(err, f"inotify_add_watch failed for {path}")
+            return
+        self._paths[wd] = path
+
+    def _add_tree(self, top: str, *, strict: bool) -> None:
+        self._add_watch(top, strict=strict)
+        for dirpath, dirnames, _filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if d not in _IGNORED_DIR_NAMES]
+            for name in dirnames:
+                self._add_watch(os.path.join(dirpath, name), strict=False)
+
+    def _close(self) -> None:
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            os.write(self._wake_w, b"x")
+        except OSError:
+            pass
+        self._thread.join(timeout=5)
+        self._close()
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & _IN_Q_OVERFLOW:
+            _notify(None, True)
+            return
+        base = self._paths.get(wd)
+        if base is None:
+            return
+        if mask & _IN_IGNORED:
+            self._paths.pop(wd, None)
+            return
+        if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            _notify(base, True)
+            return
+        path = os.path.join(base, name) if name else base
+        structural = bool(mask & _ENTRY_EVENTS)
+        if mask & _IN_ISDIR and mask & (_IN_DELETE | _IN_MOVED_FROM):
+            workspace_cache.invalidate_tree(path)
+        if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and name not in _IGNORED_DIR_NAMES:
+            try:
+                self._add_tree(path, strict=False)
+            except OSError:
+                # Out of watches: the new subtree is unobserved, so stop trusting the cache.
+                workspace_cache.set_trusted_root(None)
+                _notify(None, True)
+                return
+        _notify(path, structural)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+            except OSError:
+                return
+            if self._wake_r in readable:
+                return
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                self._handle(wd, mask, os.fsdecode(raw_name))
+
+
+class _PollingWatcher(_BaseWatcher):
+    backend = "poll"
+
+    def __init__(self, root: str, interval: float = _POLL_INTERVAL_SECONDS):
+        super().__init__(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot: dict[str, tuple[int, int]] = {}
+        stack = [self.root]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                with os.scandir(dirpath) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in _IGNORED_DIR_NAMES:
+                                    # Directories only matter for structural changes.
+                                    snapshot[entry.path] = (-1, -1)
+                                    stack.append(entry.path)
+                                continue
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            current = self._scan()
+            previous = self._snapshot
+            for path in previous.keys() - current.keys():
+                _notify(path, True)
+            for path in current.keys() - previous.keys():
+                _notify(path, True)
+            for path, version in current.items():
+                old = previous.get(path)
+                if old is not None and old != version:
+                    _notify(path, False)
+            self._snapshot = current
+
+
+def start_watcher(root: str | Path, backend: str = "auto") -> str | None:
+    """Start watching `root`; returns the backend in use ("inotify"/"poll") or None if off.
+
+    `backend` is one of "auto", "inotify", "poll", "off". "auto" prefers inotify and
+    silently falls back to polling.
+    """
+    global _active
+    if backend == "off":
+        return None
+    root_str = os.path.abspath(root)
+    with _active_lock:
+        if _active is not None:
+            _active.stop()
+            _active = None
+        watcher: _BaseWatcher | None = None
+        if backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                watcher = _InotifyWatcher(root_str)
+            except (OSError, AttributeError):
+                if backend == "inotify":
+                    raise
+        if watcher is None:
+            watcher = _PollingWatcher(root_str)
+        watcher.start()
+        _active = watcher
+        workspace_cache.set_trusted_root(root_str, skip_dir_names=_IGNORED_DIR_NAMES)
+        return watcher.backend
+
+
+def stop_watcher() -> None:
+    global _active
+    with _active_lock:
+        if _active is None:
+            return
+        workspace_cache.set_trusted_root(None)
+        _active.stop()
+        _active = None
+        workspace_cache.invalidate_all()
+
+
+def watcher_active() -> bool:
+    return _active is not None
+
+
+def watcher_backend() -> str | None:
+    """Backend of the running watcher ("inotify"/"poll"), or None when not watching."""
+    active = _active
+    return active.backend if active is not None else None
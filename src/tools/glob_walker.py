@@ -0,0 +1,150 @@
+"""glob 工具的目录遍历引擎。
+
+与 `Path.glob` / `Path.rglob` 相比：
+- 在进入目录之前就剪枝：默认排除目录（`.git`、`node_modules`…）与 `.gitignore`/`.ignore`
+  忽略的目录根本不会被遍历；
+- pattern 开头的字面量目录（如 `src/**/*.jsx` 中的 `src`）直接作为遍历起点，
+  `**` 之前的各层目录按对应的 pattern 段过滤，没有 `**` 时不会深入超过 pattern 的层数；
+- 目录/文件的区分来自 `os.scandir` 的 DirEntry 类型信息（经 `workspace_cache.list_dir` 缓存），
+  命中结果不需要再逐个 stat；
+- 结果可以按路径（遍历顺序，确定性的）或修改时间（最新的在前）排序。
+
+pattern 语义与 `Path.glob` 一致：`*` / `?` / `[...]` 不跨越 `/`，`**` 作为独立的一段时匹配
+零个或多个目录，以 `**` 结尾时只匹配目录；不含 `/` 的 pattern 等价于 `**/<pattern>`。
+"""
+
+import os
+import re
+from typing import Iterator
+
+from . import workspace_cache
+from .ignore_rules import IgnoreMatcher, glob_to_regex, walk_filtered
+
+
+_MAGIC_CHARS = frozenset("*?[")
+
+
+class GlobPattern:
+    """编译后的 glob：整条相对路径的正则 + 用于剪枝的逐段信息。"""
+
+    __slots__ = (
+        "prefix",
+        "segments",
+        "regex",
+        "dirs_only",
+        "includes_start",
+        "max_depth",
+        "_segment_regexes",
+    )
+
+    def __init__(self, pattern: str):
+        pattern = pattern.strip().replace("\\", "/")
+        # 以 `/` 结尾的 pattern 只匹配目录（同 `Path.glob`）
+        trailing_slash = pattern.endswith("/")
+        if "/" not in pattern:
+            pattern = "**/" + pattern
+        segments: list[str] = []
+        for seg in pattern.split("/"):
+            # 连续的 `**` 与单个 `**` 等价
+            if seg and seg != "." and not (seg == "**" and segments[-1:] == ["**"]):
+                segments.append(seg)
+        # 开头不含通配符的段作为遍历起点
+        prefix: list[str] = []
+        while len(segments) > 1 and not _MAGIC_CHARS.intersection(segments[0]):
+            prefix.append(segments.pop(0))
+        self.prefix = prefix
+        self.segments = segments
+        self.dirs_only = trailing_slash or (bool(segments) and segments[-1] == "**")
+
+        parts: list[str] = []
+        for i, seg in enumerate(segments):
+            last = i == len(segments) - 1
+            if seg == "**" and last:
+                # 结尾的 `**`：前一段匹配到的目录本身及其下的任意目录（由 dirs_only 限定只匹配目录）
+                if parts:
+                    parts[-1] = parts[-1][:-1]
+                    parts.append("(?:/.+)?")
+                else:
+                    parts.append(".+")
+            elif seg == "**":
+                parts.append("(?:[^/]+/)*")
+            else:
+                parts.append(glob_to_regex(seg) + ("" if last else "/"))
+        self.regex = re.compile("".join(parts), re.DOTALL)
+        # 整个 pattern（去掉前缀后）只剩 `**` 时，遍历起点本身也算命中
+        self.includes_start = segments == ["**"]
+
+        # `**` 之前的段可以在进入目录前过滤；没有 `**` 时最多深入 len(segments) - 1 层
+        self._segment_regexes: list[re.Pattern[str]] = []
+        for seg in segments[:-1]:
+            if seg == "**":
+                break
+            self._segment_regexes.append(re.compile(glob_to_regex(seg), re.DOTALL))
+        self.max_depth = None if "**" in segments else len(segments) - 1
+
+    def may_descend(self, depth: int, name: str) -> bool:
+        """depth 层（起点下一层为 1）的目录 name 是否可能包含匹配项。"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if depth <= len(self._segment_regexes):
+            return self._segment_regexes[depth - 1].fullmatch(name) is not None
+        return True
+
+
+def _start_dir(
+    root: str,
+    pattern: GlobPattern,
+    *,
+    exclude_dir_names: set[str] | frozenset[str],
+    respect_ignore_files: bool,
+) -> str | None:
+    """沿 pattern 的字面量前缀找到遍历起点；前缀目录不存在或被排除/忽略时返回 None。"""
+    current = root
+    for name in pattern.prefix:
+        if name in exclude_dir_names:
+            return None
+        child = os.path.join(current, name)
+        meta = workspace_cache.get_meta(child)
+        if meta is None or not meta.is_dir:
+            return None
+        if respect_ignore_files and IgnoreMatcher(current).ignored(child, True):
+            return None
+        current = child
+    return current
+
+
+def iter_glob(
+    root: str,
+    pattern: GlobPattern,
+    *,
+    exclude_dir_names: set[str] | frozenset[str],
+    respect_ignore_files: bool = True,
+) -> Iterator[tuple[str, bool]]:
+    """按确定的遍历顺序（目录内按名称排序，先文件后子目录）产出 (绝对路径, 是否目录)。"""
+    root = os.path.abspath(root)
+    start = _start_dir(
+        root, pattern, exclude_dir_names=exclude_dir_names, respect_ignore_files=respect_ignore_files
+    )
+    if start is None:
+        return
+    if pattern.includes_start:
+        yield start, True
+    start_prefix_len = len(start.rstrip(os.sep)) + 1
+    for dirpath, dirnames, filenames in walk_filtered(
+        start, exclude_dir_names=exclude_dir_names, respect_ignore_files=respect_ignore_files
+    ):
+        rel_dir = dirpath[start_prefix_len:] if dirpath != start else ""
+        if os.sep != "/":
+            rel_dir = rel_dir.replace(os.sep, "/")
+        depth = rel_dir.count("/") + 1 if rel_dir else 0
+        rel_base = rel_dir + "/" if rel_dir else ""
+
+        if not pattern.dirs_only:
+            for name in sorted(filenames):
+                if pattern.regex.fullmatch(rel_base + name):
+                    yield os.path.join(dirpath, name), False
+        dirnames.sort()
+        for name in dirnames:
+            if pattern.regex.fullmatch(rel_base + name):
+                yield os.path.join(dirpath, name), True
+        dirnames[:] = [name for name in dirnames if pattern.may_descend(depth + 1, name)]
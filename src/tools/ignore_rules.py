@@ -0,0 +1,294 @@
+"""grep / glob 共用的文件过滤规则。
+
+- `GlobSet`：把一组 fnmatch glob 预编译成一个正则，每个文件只匹配一次；
+- `IgnoreMatcher`：`.gitignore` / `.ignore` 规则（支持嵌套文件、`!` 取反、`/` 锚定、
+  `**`、只匹配目录的 `dir/`），遍历时逐层加载，被忽略的目录直接剪枝不再进入；
+- `walk_filtered`：在 `workspace_cache.walk` 之上叠加默认排除目录与忽略规则。
+
+规则文件按 (mtime_ns, size) 缓存编译结果，未修改时不会重复解析。
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from fnmatch import translate
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from . import workspace_cache
+
+
+IGNORE_FILE_NAMES = (".gitignore", ".ignore")
+
+_MAX_CACHED_RULE_FILES = 4096
+
+
+class GlobSet:
+    """一组 glob 的合并正则：任一 glob 命中相对路径或文件名即视为命中（语义同 fnmatch）。"""
+
+    __slots__ = ("globs", "_regex")
+
+    def __init__(self, globs: Iterable[str]):
+        self.globs = tuple(dict.fromkeys(globs))
+        self._regex = (
+            re.compile("|".join(f"(?:{translate(glob)})" for glob in self.globs))
+            if self.globs
+            else None
+        )
+
+    def __bool__(self) -> bool:
+        return self._regex is not None
+
+    def matches(self, rel_path: str, name: str) -> bool:
+        regex = self._regex
+        if regex is None:
+            return False
+        return regex.match(rel_path) is not None or regex.match(name) is not None
+
+
+def glob_to_regex(pattern: str) -> str:
+    """把 gitignore 风格的 glob 转成正则（匹配 posix 相对路径；`*`、`?`、字符类都不跨越 `/`）。"""
+    parts: list[str] = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        # 末尾的 `**`（如 `a/**`）：匹配其下的一切
+                        parts.append(".*")
+                    else:
+                        # `**/`：零个或多个目录
+                        parts.append("(?:.*/)?")
+                        i += 1
+                    i += 2
+                    continue
+                # 其它位置的连续星号按普通 `*` 处理
+                while i < n and pattern[i] == "*":
+                    i += 1
+                parts.append("[^/]*")
+                continue
+            parts.append("[^/]*")
+        elif ch == "?":
+            parts.append("[^/]")
+        elif ch == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                parts.append(re.escape(ch))
+            else:
+                body = pattern[i + 1 : j]
+                negate = body[:1] in ("!", "^")
+                if negate:
+                    body = body[1:]
+                body = body.replace("\\", "\\\\").replace("[", "\\[").replace("]", "\\]")
+                # 字符类永远不匹配路径分隔符
+                parts.append(f"[^/{body}]" if negate else f"(?!/)[{body}]")
+                i = j
+        elif ch == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(ch))
+        i += 1
+    return "".join(parts)
+
+
+def _parse_ignore_line(line: str) -> tuple[str, bool, bool] | None:
+    """解析一行规则，返回 (正则, 是否取反, 是否只匹配目录)；空行/注释返回 None。"""
+    line = line.rstrip("\n\r")
+    if not line or line.startswith("#"):
+        return None
+    # 行尾空格会被忽略，除非用反斜杠转义
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    negate = False
+    if line.startswith("!"):
+        negate = True
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    dir_only = line.endswith("/") and not line.endswith("\\/")
+    if dir_only:
+        line = line[:-1]
+    if not line:
+        return None
+    # 开头或中间含 `/` 的规则相对规则文件所在目录锚定，否则在任意层级按名称匹配
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+    body = glob_to_regex(line)
+    if not anchored:
+        body = "(?:.*/)?" + body
+    return body, negate, dir_only
+
+
+class _RuleFile:
+    """一个目录下的全部忽略规则（.gitignore 与 .ignore 按顺序合并）。
+
+    规则「后者优先」：把规则倒序拼成一个带捕获组的交替正则，
+    fullmatch 命中的第一个分支就是最后一条匹配的规则，`lastindex` 指出是哪一条。
+    """
+
+    __slots__ = ("base", "prefix", "_file_regex", "_file_negate", "_dir_regex", "_dir_negate")
+
+    def __init__(self, base: str, rules: list[tuple[str, bool, bool]]):
+        self.base = base
+        self.prefix = base.rstrip(os.sep) + os.sep
+        self._file_regex, self._file_negate = self._compile(
+            [rule for rule in rules if not rule[2]]
+        )
+        self._dir_regex, self._dir_negate = self._compile(rules)
+
+    @staticmethod
+    def _compile(rules: list[tuple[str, bool, bool]]) -> tuple[re.Pattern[str] | None, list[bool]]:
+        if not rules:
+            return None, []
+        ordered = list(reversed(rules))
+        regex = re.compile("|".join(f"({body})" for body, _negate, _dir_only in ordered), re.DOTALL)
+        return regex, [negate for _body, negate, _dir_only in ordered]
+
+    def match(self, rel_path: str, is_dir: bool) -> bool | None:
+        """True=忽略，False=被 `!` 规则重新包含，None=本文件没有相关规则。"""
+        regex, negate = (
+            (self._dir_regex, self._dir_negate) if is_dir else (self._file_regex, self._file_negate)
+        )
+        if regex is None:
+            return None
+        found = regex.fullmatch(rel_path)
+        if found is None:
+            return None
+        return not negate[found.lastindex - 1]
+
+
+_cache_lock = threading.Lock()
+# 规则文件路径 -> ((mtime_ns, size), 解析结果)
+_rule_cache: "OrderedDict[str, tuple[tuple[int, int], list[tuple[str, bool, bool]]]]" = OrderedDict()
+
+
+def _load_rules(path: str) -> list[tuple[str, bool, bool]]:
+    meta = workspace_cache.get_meta(path)
+    if meta is None or not meta.is_file:
+        return []
+    version = (meta.mtime_ns, meta.size)
+    with _cache_lock:
+        cached = _rule_cache.get(path)
+        if cached is not None and cached[0] == version:
+            _rule_cache.move_to_end(path)
+            return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as fh:
+            lines = fh.readlines()
+    except OSError:
+        return []
+    rules = [rule for rule in map(_parse_ignore_line, lines) if rule is not None]
+    with _cache_lock:
+        _rule_cache[path] = (version, rules)
+        _rule_cache.move_to_end(path)
+        while len(_rule_cache) > _MAX_CACHED_RULE_FILES:
+            _rule_cache.popitem(last=False)
+    return rules
+
+
+def _rule_file_for(
+    dirpath: str, names: Iterable[str], *, extra: Iterable[str] = ()
+) -> _RuleFile | None:
+    rules: list[tuple[str, bool, bool]] = []
+    for path in extra:
+        rules.extend(_load_rules(path))
+    for name in names:
+        rules.extend(_load_rules(os.path.join(dirpath, name)))
+    return _RuleFile(dirpath, rules) if rules else None
+
+
+class IgnoreMatcher:
+    """一次遍历使用的忽略规则。
+
+    构造时加载遍历根目录及其祖先目录（向上到 git 仓库根或 workspace 根）的规则文件；
+    遍历过程中每进入一个目录调用 `enter_dir`，加载该目录自己的规则文件。
+    越深的规则文件优先级越高；被忽略的目录应直接剪枝（git 同样不允许重新包含其中的文件）。
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = os.path.abspath(root)
+        self._chains: dict[str, tuple[_RuleFile, ...]] = {}
+        chain: list[_RuleFile] = []
+        for ancestor in self._ancestors(self.root):
+            extra = []
+            if os.path.isdir(os.path.join(ancestor, ".git")):
+                extra.append(os.path.join(ancestor, ".git", "info", "exclude"))
+            names = [name for name in IGNORE_FILE_NAMES if os.path.isfile(os.path.join(ancestor, name))]
+            rule_file = _rule_file_for(ancestor, names, extra=extra)
+            if rule_file is not None:
+                chain.append(rule_file)
+        self._chains[self.root] = tuple(chain)
+
+    @staticmethod
+    def _ancestors(root: str) -> list[str]:
+        """从上到下返回需要加载规则的目录（含 root 本身）。"""
+        workspace = os.path.abspath(os.getcwd())
+        dirs = [root]
+        current = root
+        while not os.path.isdir(os.path.join(current, ".git")) and current != workspace:
+            parent = os.path.dirname(current)
+            if parent == current:
+                # 既不在 git 仓库里也不在 workspace 下：只使用 root 自己的规则
+                return [root]
+            current = parent
+            dirs.append(current)
+        return list(reversed(dirs))
+
+    def enter_dir(self, dirpath: str, filenames: Iterable[str]) -> None:
+        """遍历进入 dirpath 时调用（filenames 为该目录下的文件名，用于发现规则文件）。"""
+        if dirpath in self._chains:
+            return
+        parent = self._chains.get(os.path.dirname(dirpath), ())
+        names = [name for name in IGNORE_FILE_NAMES if name in filenames]
+        rule_file = _rule_file_for(dirpath, names) if names else None
+        self._chains[dirpath] = parent + (rule_file,) if rule_file is not None else parent
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        """判断 path 是否被忽略；其所在目录必须已经通过 `enter_dir` 进入过。"""
+        chain = self._chains.get(os.path.dirname(path), ())
+        for rule_file in reversed(chain):
+            rel_path = path[len(rule_file.prefix) :]
+            if os.sep != "/":
+                rel_path = rel_path.replace(os.sep, "/")
+            decision = rule_file.match(rel_path, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+def walk_filtered(
+    root: str | Path,
+    *,
+    exclude_dir_names: set[str] | frozenset[str],
+    respect_ignore_files: bool = True,
+) -> Iterator[tuple[str, list[str], list[str]]]:
+    """`workspace_cache.walk` + 默认排除目录 + 忽略规则；被排除/忽略的目录不会进入。
+
+    产出的 dirnames / filenames 已经过滤，调用方仍可原地修改 dirnames 进一步剪枝。
+    """
+    top = os.path.abspath(root)
+    matcher = IgnoreMatcher(top) if respect_ignore_files else None
+    for dirpath, dirnames, filenames in workspace_cache.walk(top):
+        dirnames[:] = [d for d in dirnames if d not in exclude_dir_names]
+        if matcher is not None:
+            matcher.enter_dir(dirpath, filenames)
+            dirnames[:] = [d for d in dirnames if not matcher.ignored(os.path.join(dirpath, d), True)]
+            filenames = [f for f in filenames if not matcher.ignored(os.path.join(dirpath, f), False)]
+        yield dirpath, dirnames, filenames
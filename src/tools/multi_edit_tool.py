@@ -0,0 +1,154 @@
+from agents import function_tool
+import asyncio
+import json
+import os
+from pathlib import Path
+
+from .atomic_io import atomic_write_text
+from .edit_engine import EditError, Replacement, apply_edits, plan_edits, read_text, unified_diff
+from .output_budget import estimate_tokens, fit_lines
+from .result_cache import bump_generation
+from .snapshot_journal import record_write
+from .tool_scheduler import scheduled
+from .workspace_cache import invalidate, invalidate_listing
+
+
+_MAX_BATCH_EDITS = 100
+
+
+def _parse_edits(edits_json: str) -> tuple[list[tuple[str, str, str]], str | None]:
+    """Parse and validate the `multi_edit` edit list; returns (edits, error)."""
+    try:
+        parsed = json.loads(edits_json)
+    except (TypeError, json.JSONDecodeError) as exc:
+        return [], f"Error: edits_json is invalid JSON: {exc}"
+    if not isinstance(parsed, list) or not parsed:
+        return [], "Error: edits_json must be a non-empty JSON array"
+    if len(parsed) > _MAX_BATCH_EDITS:
+        return [], f"Error: at most {_MAX_BATCH_EDITS} edits per call, got {len(parsed)}"
+
+    edits: list[tuple[str, str, str]] = []
+    for i, item in enumerate(parsed):
+        if not isinstance(item, dict):
+            return [], f"Error: edit #{i + 1} must be an object"
+        file_path = item.get("file_path")
+        old_content = item.get("old_content")
+        new_content = item.get("new_content")
+        if not isinstance(file_path, str) or not file_path.strip():
+            return [], f"Error: edit #{i + 1} needs a non-empty `file_path`"
+        if not isinstance(old_content, str) or not isinstance(new_content, str):
+            return [], f"Error: edit #{i + 1} needs string `old_content` and `new_content`"
+        edits.append((file_path, old_content, new_content))
+    return edits, None
+
+
+def _validate_path(file_path: str) -> str | None:
+    if not os.path.isabs(file_path):
+        return f"Error: file_path must be an absolute path, got {file_path}"
+    path = Path(file_path).resolve()
+    root = Path.cwd().resolve()
+    if root not in path.parents and path != root:
+        return (
+            "Error: file_path must be inside the workspace root directory. "
+            f"ROOT={root}, got={path}"
+        )
+    return None
+
+
+def _multi_edit(edits: list[tuple[str, str, str]]) -> str:
+    """Apply all edits or none (synchronous helper).
+
+    Every file is read once; all edits are located against those in-memory copies before
+    anything is written. If writing a later file fails, files already written are
+    restored to their original content.
+    """
+    # real path -> (path as given, edit numbers, replacements), in first-mention order;
+    # keyed by real path so two spellings of one file cannot overwrite each other.
+    by_file: dict[str, tuple[str, list[int], list[Replacement]]] = {}
+    for number, (file_path, old_content, new_content) in enumerate(edits, start=1):
+        _shown, numbers, replacements = by_file.setdefault(
+            os.path.realpath(file_path), (file_path, [], [])
+        )
+        numbers.append(number)
+        replacements.append(Replacement(old_content, new_content))
+
+    planned_files = []
+    for file_path, numbers, replacements in by_file.values():
+        path = Path(file_path)
+        if not path.is_file():
+            return f"Error: edit #{numbers[0]}: file does not exist or is not a file: {file_path}"
+        try:
+            content = read_text(path)
+        except (OSError, UnicodeDecodeError) as exc:
+            return f"Error reading file {file_path}: {exc}"
+        try:
+            planned = plan_edits(content, replacements, numbers)
+        except EditError as exc:
+            return f"{exc} (file: {file_path}; no changes were made)"
+        planned_files.append((file_path, path, content, planned))
+
+    written: list[tuple[Path, str]] = []
+    try:
+        for file_path, path, content, planned in planned_files:
+            updated = apply_edits(content, planned)
+            if updated == content:
+                continue
+            try:
+                record_write(path, "multi_edit", content.encode("utf-8"))
+                atomic_write_text(path, updated)
+            except OSError as exc:
+                for done_path, original in reversed(written):
+                    atomic_write_text(done_path, original)
+                return f"Error writing file {file_path}: {exc} (earlier files were restored)"
+            written.append((path, content))
+    finally:
+        for _file_path, path, _content, _planned in planned_files:
+            invalidate(path)
+            invalidate_listing(path.parent)
+        bump_generation()
+
+    diff: list[str] = []
+    for file_path, _path, content, planned in planned_files:
+        diff.extend(unified_diff(file_path, content, planned))
+    summary = f"Applied {len(edits)} edits to {len(planned_files)} files."
+    return summary + "\n" + fit_lines(diff, "multi_edit", reserve_tokens=estimate_tokens(summary))
+
+
+def _edit_accesses(arguments: dict) -> list[tuple[str | None, bool]]:
+    edits, _error = _parse_edits(arguments["edits_json"])
+    return [(file_path, True) for file_path, _old, _new in edits] or [(None, True)]
+
+
+@function_tool
+@scheduled(paths_from=_edit_accesses)
+async def multi_edit(edits_json: str) -> str:
+    """Apply several exact-substring edits to one or more files in a single call.
+
+    Prefer this over repeated `edit_file` calls when you have more than one change:
+    it costs a single round-trip and is all-or-nothing.
+
+    Notes:
+        - Every `old_content` is matched against the file as it is *before* this call
+          (not against the result of earlier edits in the list); each must be unique in
+          its file, and edits to the same file must not overlap.
+        - All edits are validated before anything is written; if any edit fails, no
+          file is changed and the error names the failing edit (`edit #N`, 1-based).
+        - File paths must be absolute and inside the workspace root.
+
+    Args:
+        edits_json: JSON array of edits, e.g.
+            `[{"file_path": "/abs/a.py", "old_content": "x = 1", "new_content": "x = 2"}]`.
+
+    Returns:
+        A summary line followed by a unified diff of the changes, or an error string.
+    """
+    edits, error = _parse_edits(edits_json)
+    if error:
+        return error
+    for file_path, _old, _new in edits:
+        error = _validate_path(file_path)
+        if error:
+            return error
+
+    # Offload blocking disk I/O to a thread to avoid blocking the event loop.
+    return await asyncio.to_thread(_multi_edit, edits)
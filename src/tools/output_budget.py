@@ -0,0 +1,198 @@
+"""Central output budget for tool results.
+
+Every tool result ends up in the prompt of every following model call, so tools keep
+their output within a per-tool token budget instead of returning unbounded text:
+
+- `estimate_tokens` is a cheap heuristic (~4 ASCII chars per token, 1 token per other
+  char), good enough to decide where to cut;
+- `fit_lines` keeps whole lines from the head (and optionally the tail) of an output
+  and replaces the middle with an elision marker;
+- the full text of anything elided is kept in a small in-memory store, and the marker
+  carries a handle that the `fetch_more` tool pages through.
+
+Budgets are configured per tool (`get_budget` / `set_budget`); tools that already have
+a natural continuation (e.g. `read_file`'s `start_line`) use it instead of a handle.
+"""
+
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from agents import function_tool
+
+
+class Budget(NamedTuple):
+    """Output limits of one tool.
+
+    - max_tokens: estimated tokens the whole result may take;
+    - head_fraction: share of the budget kept from the start when eliding (the rest is
+      kept from the end; 1.0 keeps only the head);
+    - max_line_chars: longer lines are clipped (minified files, long log lines).
+    """
+
+    max_tokens: int
+    head_fraction: float = 1.0
+    max_line_chars: int = 500
+
+
+_budgets: dict[str, Budget] = {
+    "grep": Budget(6_000),
+    "glob": Budget(5_000),
+    "read_file": Budget(10_000, max_line_chars=2_000),
+    "read_files": Budget(16_000, max_line_chars=2_000),
+    "bash": Budget(6_000, head_fraction=0.3),
+    "multi_edit": Budget(6_000),
+    "fetch_more": Budget(8_000, max_line_chars=2_000),
+}
+_DEFAULT_BUDGET = Budget(6_000)
+
+_MAX_STORED_OUTPUTS = 32
+# Larger outputs are stored truncated (the store must not hold hundreds of MB).
+_MAX_STORED_CHARS = 8_000_000
+
+_lock = threading.Lock()
+_store: "OrderedDict[str, list[str]]" = OrderedDict()
+_handle_ids = itertools.count(1)
+
+
+def get_budget(tool_name: str) -> Budget:
+    return _budgets.get(tool_name, _DEFAULT_BUDGET)
+
+
+def set_budget(tool_name: str, **changes) -> Budget:
+    """Override (part of) a tool's budget, e.g. `set_budget("bash", max_tokens=2000)`."""
+    budget = get_budget(tool_name)._replace(**changes)
+    if budget.max_tokens <= 0:
+        raise ValueError("max_tokens must be greater than 0")
+    if not 0.0 <= budget.head_fraction <= 1.0:
+        raise ValueError("head_fraction must be between 0 and 1")
+    _budgets[tool_name] = budget
+    return budget
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII characters per token, one token per other character."""
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def clip_line(line: str, max_chars: int) -> str:
+    if len(line) <= max_chars:
+        return line
+    return line[:max_chars] + f" …[+{len(line) - max_chars} chars]"
+
+
+def store_output(lines: list[str]) -> str:
+    """Keep a full output for `fetch_more`; returns its handle."""
+    kept: list[str] = []
+    size = 0
+    for line in lines:
+        size += len(line) + 1
+        if size > _MAX_STORED_CHARS:
+            kept.append(f"... (stored output truncated at {_MAX_STORED_CHARS} characters)")
+            break
+        kept.append(line)
+    handle = f"out-{next(_handle_ids)}"
+    with _lock:
+        _store[handle] = kept
+        while len(_store) > _MAX_STORED_OUTPUTS:
+            _store.popitem(last=False)
+    return handle
+
+
+def fetch_hint(handle: str, start_line: int) -> str:
+    return f'fetch_more(handle="{handle}", start_line={start_line})'
+
+
+def fit_lines(lines: list[str], tool_name: str, *, reserve_tokens: int = 0) -> str:
+    """Join `lines`, eliding the middle (or the end) if they exceed the tool's budget.
+
+    `reserve_tokens` is budget already used by the caller (e.g. a summary header).
+    The elision marker names the omitted line range and a `fetch_more` handle.
+    """
+    budget = get_budget(tool_name)
+    clipped = [clip_line(line, budget.max_line_chars) for line in lines]
+    costs = [estimate_tokens(line) + 1 for line in clipped]
+    available = max(budget.max_tokens - reserve_tokens, 0)
+    if sum(costs) <= available:
+        return "\n".join(clipped)
+
+    head_budget = int(available * budget.head_fraction)
+    head_end = 0
+    used = 0
+    while head_end < len(clipped) and used + costs[head_end] <= head_budget:
+        used += costs[head_end]
+        head_end += 1
+    tail_start = len(clipped)
+    if budget.head_fraction < 1.0:
+        tail_budget = available - used
+        used = 0
+        while tail_start > head_end and used + costs[tail_start - 1] <= tail_budget:
+            used += costs[tail_start - 1]
+            tail_start -= 1
+
+    handle = store_output(lines)
+    omitted = tail_start - head_end
+    marker = (
+        f"... [{omitted} lines (lines {head_end + 1}-{tail_start} of {len(lines)}) omitted "
+        f"to stay within the output budget; read them with {fetch_hint(handle, head_end + 1)}]"
+    )
+    return "\n".join(clipped[:head_end] + [marker] + clipped[tail_start:])
+
+
+def fit_text(text: str, tool_name: str, *, reserve_tokens: int = 0) -> str:
+    """`fit_lines` for a block of text."""
+    return fit_lines(text.split("\n"), tool_name, reserve_tokens=reserve_tokens)
+
+
+def _fetch(handle: str, start_line: int, limit: int) -> str:
+    with _lock:
+        lines = _store.get(handle)
+        if lines is not None:
+            _store.move_to_end(handle)
+    if lines is None:
+        return f"Error: unknown or expired handle `{handle}`; run the original tool call again"
+    if start_line > len(lines):
+        return f"Error: start_line {start_line} is beyond the end ({len(lines)} lines)"
+
+    budget = get_budget("fetch_more")
+    formatted: list[str] = []
+    used = 0
+    current = start_line
+    end = min(len(lines), start_line + limit - 1)
+    while current <= end:
+        line = f"{current:>6}|{clip_line(lines[current - 1], budget.max_line_chars)}"
+        cost = estimate_tokens(line) + 1
+        if formatted and used + cost > budget.max_tokens:
+            break
+        formatted.append(line)
+        used += cost
+        current += 1
+    if current <= len(lines):
+        formatted.append(f"{'':>6}|... (more; continue with {fetch_hint(handle, current)})")
+    return "\n".join(formatted)
+
+
+@function_tool
+async def fetch_more(handle: str, start_line: int = 1, limit: int = 200) -> str:
+    """Read more of a tool output that was shortened to fit the output budget.
+
+    Shortened outputs contain a marker like
+    `... [120 lines omitted ...; read them with fetch_more(handle="out-3", start_line=41)]`.
+    Pass that handle and line number to page through the full output.
+
+    Args:
+        handle: The handle from the elision marker (e.g. `out-3`).
+        start_line: 1-based line of the stored output to start from.
+        limit: Max number of lines to return.
+
+    Returns:
+        The requested lines prefixed with their line numbers, or an error string.
+    """
+    if start_line < 1:
+        return "Error: start_line must be greater than or equal to 1"
+    if limit <= 0:
+        return "Error: limit must be greater than 0"
+    return await asyncio.to_thread(_fetch, handle, start_line, limit)
@@ -1,31 +1,197 @@
 from agents import function_tool
 import asyncio
+import json
+import mmap
 import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
 from pathlib import Path
 
+from .output_budget import clip_line, estimate_tokens, get_budget
+from .result_cache import cached_tool
+from .tool_scheduler import scheduled
+from .workspace_cache import get_meta
 
-def _read_from_file(file_path: str, start_line: int, limit: int | None) -> str:
+
+# Files at least this large are read through mmap + a lazily built line index; smaller files
+# are cheap enough to read line by line.
+_MMAP_MIN_BYTES = 1 << 20
+# One checkpoint (byte offset of a line start) every N lines: memory stays small
+# (~8 bytes per N lines) and a seek never skips more than N - 1 lines.
+_LINES_PER_CHECKPOINT = 256
+_MAX_CACHED_INDEXES = 32
+
+_CHECKPOINT_RE = re.compile(rb"(?:[^\n]*\n){%d}" % _LINES_PER_CHECKPOINT)
+_LONE_CR_RE = re.compile(rb"\r(?!\n)")
+
+
+class _LineIndex:
+    """Sparse newline-offset index of one file version, built lazily.
+
+    `checkpoints[i]` is the byte offset where line `i * _LINES_PER_CHECKPOINT + 1` starts.
+    Checkpoints are only known as far as the file has been looked at: a read records the
+    ones it passes, and only a seek past the last known checkpoint scans ahead for more.
+    `verified` is the byte offset up to which the file has no lone `\r` line endings.
+    """
+
+    __slots__ = ("mtime_ns", "size", "checkpoints", "complete", "verified", "usable", "lock")
+
+    def __init__(self, mtime_ns: int, size: int):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checkpoints = array("Q", [0])
+        self.complete = False  # every checkpoint of the file is known
+        self.verified = 0
+        self.usable = True
+        self.lock = threading.Lock()
+
+    def seek(self, mm: mmap.mmap, wanted: int) -> int:
+        """Number of the last known checkpoint <= `wanted`, scanning ahead if needed."""
+        with self.lock:
+            if len(self.checkpoints) <= wanted and not self.complete:
+                for match in _CHECKPOINT_RE.finditer(mm, self.checkpoints[-1]):
+                    self.checkpoints.append(match.end())
+                    if len(self.checkpoints) > wanted:
+                        break
+                else:
+                    self.complete = True
+            return min(wanted, len(self.checkpoints) - 1)
+
+    def record(self, line_no: int, pos: int) -> None:
+        """Remember that line `line_no` starts at `pos` if it is the next checkpoint."""
+        if (line_no - 1) % _LINES_PER_CHECKPOINT == 0:
+            with self.lock:
+                if len(self.checkpoints) == (line_no - 1) // _LINES_PER_CHECKPOINT:
+                    self.checkpoints.append(pos)
+
+    def verify(self, mm: mmap.mmap, end: int) -> bool:
+        """Check `[0, end)` for lone `\r` (`end` is a line start or EOF); False if found.
+
+        Text mode treats a lone `\r` as a line break too, which a `\n` index cannot
+        reproduce; such files keep using the sequential reader.
+        """
+        with self.lock:
+            if self.usable and end > self.verified:
+                if _LONE_CR_RE.search(mm, self.verified, end):
+                    self.usable = False
+                else:
+                    self.verified = end
+            return self.usable
+
+
+def _format_line(line_no: int, line: str) -> str:
+    text = clip_line(line.rstrip(chr(13) + chr(10)), get_budget("read_file").max_line_chars)
+    return f"{line_no:>6}|{text}"
+
+
+def _budget_marker(next_line: int) -> str:
+    return f"{'':>6}|... (output budget reached; continue at line {next_line})"
+
+
+_index_lock = threading.Lock()
+_line_indexes: "OrderedDict[str, _LineIndex]" = OrderedDict()
+
+
+def _get_line_index(path: str, st: os.stat_result) -> _LineIndex:
+    with _index_lock:
+        index = _line_indexes.get(path)
+        if index is None or index.mtime_ns != st.st_mtime_ns or index.size != st.st_size:
+            index = _line_indexes[path] = _LineIndex(st.st_mtime_ns, st.st_size)
+        _line_indexes.move_to_end(path)
+        while len(_line_indexes) > _MAX_CACHED_INDEXES:
+            _line_indexes.popitem(last=False)
+        return index
+
+
+def _read_with_line_index(
+    path: Path, start_line: int, limit: int | None, max_tokens: int | None = None
+) -> str | None:
+    """Slice read for large files; None means "use the sequential reader".
+
+    A read near the start of the file only looks at the lines it returns; a deep seek
+    jumps to the nearest known checkpoint (scanning ahead once if none is known yet).
+    """
+    with path.open("rb") as fh:
+        # Key the index on the open file itself; cached metadata may lag behind the disk.
+        index = _get_line_index(str(path), os.fstat(fh.fileno()))
+        if not index.usable:
+            return None
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            checkpoint = index.seek(mm, (start_line - 1) // _LINES_PER_CHECKPOINT)
+            pos = index.checkpoints[checkpoint]
+            for _ in range(start_line - 1 - checkpoint * _LINES_PER_CHECKPOINT):
+                newline = mm.find(b"\n", pos)
+                pos = size if newline == -1 else newline + 1
+                if pos >= size:
+                    break
+            if pos >= size:
+                # Requested start is beyond EOF
+                return "" if index.verify(mm, size) else None
+
+            formatted_lines: list[str] = []
+            current_line = start_line
+            used = 0
+            while pos < size and (limit is None or current_line < start_line + limit):
+                index.record(current_line, pos)
+                newline = mm.find(b"\n", pos)
+                end = size if newline == -1 else newline + 1
+                formatted = _format_line(current_line, mm[pos:end].decode("utf-8", errors="replace"))
+                if max_tokens is not None:
+                    used += estimate_tokens(formatted) + 1
+                    if used > max_tokens and formatted_lines:
+                        if not index.verify(mm, pos):
+                            return None
+                        formatted_lines.append(_budget_marker(current_line))
+                        return "\n".join(formatted_lines)
+                formatted_lines.append(formatted)
+                current_line += 1
+                pos = end
+
+            if not index.verify(mm, pos):
+                return None
+            if limit is not None and pos < size:
+                formatted_lines.append(f"{'':>6}|... (more; continue at line {current_line})")
+            return "\n".join(formatted_lines)
+
+
+def _read_from_file(
+    file_path: str, start_line: int, limit: int | None, max_tokens: int | None = None
+) -> str:
     """Read file contents synchronously and format with line numbers.
 
     Args:
         file_path: Absolute file path.
         start_line: 1-based start line number.
         limit: Optional max number of lines to read; `None` means read to EOF.
+        max_tokens: Optional output budget; reading stops early (with a "continue at
+            line N" marker) once the formatted lines would exceed it.
 
     Returns:
         Formatted text where each line is prefixed with a right-aligned line number
         in 6 columns, followed by `|` (e.g., `     1|line`), or an error string.
     """
     path = Path(file_path)
-    if not path.exists():
+    meta = get_meta(path)
+    if meta is None:
         return f"Error: file does not exist: {file_path}"
-    if not path.is_file():
+    if not meta.is_file:
         return f"Error: path is not a file: {file_path}"
     if start_line < 1:
         return "Error: start_line must be greater than or equal to 1"
     if limit is not None and limit < 0:
         return "Error: limit must be None or a non-negative integer"
 
+    if meta.size and meta.size >= _MMAP_MIN_BYTES:
+        try:
+            indexed = _read_with_line_index(path, start_line, limit, max_tokens)
+        except (OSError, ValueError) as exc:
+            return f"Error reading file {file_path}: {exc}"
+        if indexed is not None:
+            return indexed
+
     try:
         with path.open("r", encoding="utf-8", errors="replace") as fh:
             # Skip lines before the requested starting line
@@ -36,10 +202,22 @@ def _read_from_file(file_path: str, start_line: int, limit: int | None) -> str:
 
             formatted_lines: list[str] = []
             current_line = start_line
+            used = 0
+
+            def over_budget(formatted: str) -> bool:
+                nonlocal used
+                if max_tokens is None:
+                    return False
+                used += estimate_tokens(formatted) + 1
+                return used > max_tokens and bool(formatted_lines)
 
             if limit is None:
                 for line in fh:
-                    formatted_lines.append(f"{current_line:>6}|{line.rstrip(chr(13)+chr(10))}")
+                    formatted = _format_line(current_line, line)
+                    if over_budget(formatted):
+                        formatted_lines.append(_budget_marker(current_line))
+                        return "\n".join(formatted_lines)
+                    formatted_lines.append(formatted)
                     current_line += 1
             else:
                 line = ""
@@ -47,7 +225,11 @@ def _read_from_file(file_path: str, start_line: int, limit: int | None) -> str:
                     line = fh.readline()
                     if line == "":
                         break
-                    formatted_lines.append(f"{current_line:>6}|{line.rstrip(chr(13)+chr(10))}")
+                    formatted = _format_line(current_line, line)
+                    if over_budget(formatted):
+                        formatted_lines.append(_budget_marker(current_line))
+                        return "\n".join(formatted_lines)
+                    formatted_lines.append(formatted)
                     current_line += 1
 
                 if limit == 0 or line != "":
@@ -65,14 +247,19 @@ def _read_from_file(file_path: str, start_line: int, limit: int | None) -> str:
 
 
 @function_tool
+@scheduled(reads=["file_path"])
+@cached_tool
 async def read_file(file_path: str, start_line: int, limit: int | None = None) -> str:
     """Read a slice of a text file (for code/context lookup).
-    **Important**: Must Not invoke parallelly like `{"file_path":"xx","start_line":1}{"file_path":"xxxx","start_line":1}{"file_path":"xxxx","start_line":1}`
+    Calls may run in parallel with other tool calls; a read is never interleaved with a
+    write to the same file. To read many files or slices, `read_files` is still cheaper.
 
     Notes:
         - `file_path` must be an absolute path inside the workspace root.
         - `start_line` is 1-based.
         - Output lines are prefixed as `     1|content` to make patching easier.
+        - Output is capped by an output budget; when it is reached the result ends with
+          `... (output budget reached; continue at line N)`.
 
     Args:
         file_path: Absolute path to a file inside the workspace.
@@ -94,4 +281,132 @@ async def read_file(file_path: str, start_line: int, limit: int | None = None) -
         )
 
     # Offload blocking disk I/O to a thread to avoid blocking the event loop.
-    return await asyncio.to_thread(_read_from_file, file_path, start_line, limit)
+    return await asyncio.to_thread(
+        _read_from_file, file_path, start_line, limit, get_budget("read_file").max_tokens
+    )
+
+
+_MAX_BATCH_SLICES = 50
+
+
+def _validate_read_path(file_path: str) -> str | None:
+    if not os.path.isabs(file_path):
+        return "Error: file_path must be an absolute path"
+
+    path = Path(file_path).resolve()
+    ROOT = Path.cwd().resolve()
+    if ROOT not in path.parents and path != ROOT:
+        return (
+            "Error: file_path must be inside the workspace root directory. "
+            f"ROOT={ROOT}, got={path}"
+        )
+    return None
+
+
+def _parse_slices(slices_json: str) -> tuple[list[tuple[str, int, int | None]], str | None]:
+    """Parse and validate the `read_files` slice list; returns (slices, error)."""
+    try:
+        parsed = json.loads(slices_json)
+    except (TypeError, json.JSONDecodeError) as exc:
+        return [], f"Error: slices_json is invalid JSON: {exc}"
+    if not isinstance(parsed, list) or not parsed:
+        return [], "Error: slices_json must be a non-empty JSON array"
+    if len(parsed) > _MAX_BATCH_SLICES:
+        return [], f"Error: at most {_MAX_BATCH_SLICES} slices per call, got {len(parsed)}"
+
+    slices: list[tuple[str, int, int | None]] = []
+    for i, item in enumerate(parsed):
+        if not isinstance(item, dict):
+            return [], f"Error: slice #{i} must be an object"
+        file_path = item.get("file_path")
+        start_line = item.get("start_line", 1)
+        limit = item.get("limit")
+        if not isinstance(file_path, str) or not file_path.strip():
+            return [], f"Error: slice #{i} needs a non-empty `file_path`"
+        if not isinstance(start_line, int) or isinstance(start_line, bool):
+            return [], f"Error: slice #{i} `start_line` must be an integer"
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool)):
+            return [], f"Error: slice #{i} `limit` must be an integer or null"
+        slices.append((file_path, start_line, limit))
+    return slices, None
+
+
+def _slice_accesses(arguments: dict) -> list[tuple[str | None, bool]]:
+    """Read locks for `read_files`: every sliced file, or the whole workspace if unparsable."""
+    slices, _error = _parse_slices(arguments["slices_json"])
+    return [(file_path, False) for file_path, _start, _limit in slices] or [(None, False)]
+
+
+@function_tool
+@scheduled(paths_from=_slice_accesses)
+@cached_tool
+async def read_files(slices_json: str, max_total_chars: int = 60000) -> str:
+    """Read several file slices in one call (concurrently), returning one combined result.
+
+    Prefer this over multiple `read_file` calls when you already know which files
+    (or which parts of them) you need: it costs a single round-trip.
+
+    Notes:
+        - Every `file_path` must be an absolute path inside the workspace root.
+        - Each section is headed by `===== <file_path> (from line N) =====` and uses the
+          same `     1|content` line format as `read_file`.
+        - Output beyond `max_total_chars` is cut; omitted slices are listed at the end so
+          they can be requested again.
+
+    Args:
+        slices_json: JSON array of slices, e.g.
+            `[{"file_path": "/abs/a.py", "start_line": 1, "limit": 80}, {"file_path": "/abs/b.py"}]`
+            (`start_line` defaults to 1, `limit` defaults to null = read to EOF).
+        max_total_chars: Size cap for the combined output.
+
+    Returns:
+        The combined formatted slices, or an error string.
+    """
+    if max_total_chars <= 0:
+        return "Error: max_total_chars must be greater than 0"
+    slices, error = _parse_slices(slices_json)
+    if error:
+        return error
+
+    # The output budget (~4 chars per token) caps the combined result as well.
+    max_total_chars = min(max_total_chars, get_budget("read_files").max_tokens * 4)
+    # No slice can show more than the whole cap, so each one stops reading there. A token
+    # is at least one character, so this never cuts a slice shorter than the cap would.
+    slice_tokens = max_total_chars
+
+    async def read_one(file_path: str, start_line: int, limit: int | None) -> str:
+        error = _validate_read_path(file_path)
+        if error:
+            return error
+        # Offload blocking disk I/O to a thread to avoid blocking the event loop.
+        return await asyncio.to_thread(
+            _read_from_file, file_path, start_line, limit, slice_tokens
+        )
+
+    contents = await asyncio.gather(*(read_one(*item) for item in slices))
+    sections: list[str] = []
+    used = 0
+    omitted: list[str] = []
+    for (file_path, start_line, limit), content in zip(slices, contents):
+        header = f"===== {file_path} (from line {start_line}) ====="
+        section = f"{header}\n{content}" if content else f"{header}\n(empty)"
+        remaining = max_total_chars - used
+        if omitted or remaining <= len(header) + 1:
+            omitted.append(f"{file_path} (from line {start_line})")
+            continue
+        if len(section) > remaining:
+            # Cut at a line boundary and say where to resume.
+            cut = section.rfind("\n", 0, remaining)
+            kept = section[: max(cut, len(header))]
+            shown = kept.count("\n")
+            kept += f"\n{'':>6}|... (truncated; continue at line {start_line + shown})"
+            sections.append(kept)
+            used = max_total_chars
+            continue
+        sections.append(section)
+        used += len(section) + 2
+
+    result = "\n\n".join(sections)
+    if omitted:
+        result += "\n\n(output limit reached; not shown: " + ", ".join(omitted) + ")"
+    return result
@@ -0,0 +1,145 @@
+"""Memoization of read-only tool results (`grep`, `glob`, `read_file`, `read_files`).
+
+The agent often repeats an identical call within a session (same arguments, nothing
+written in between). Results are cached under the normalized call arguments plus a
+workspace *generation* counter:
+
+- `write_file` / `edit_file` / `bash` call `bump_generation()` after they run, so any
+  result computed before a write is never served again;
+- while a filesystem watcher is running, its change events bump the generation too
+  (edits made outside the agent); without a watcher, entries also expire after
+  `_UNWATCHED_TTL_SECONDS` as a safety net;
+- tools that write files as a side effect of read-only calls (grep's trigram index,
+  the todo store) list them with `register_internal_files`, so their events are ignored.
+
+`cached_tool` goes between `@function_tool` and the coroutine; `functools.wraps` keeps
+the signature and docstring that `function_tool` turns into the tool schema.
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from . import fs_watcher
+
+
+_MAX_ENTRIES = 256
+_UNWATCHED_TTL_SECONDS = 30.0
+# Base names of files the tools write as a side effect; changes to them must not
+# invalidate results (see `register_internal_files`).
+_internal_file_names: set[str] = set()
+
+_lock = threading.Lock()
+_generation = 0
+# key -> (generation, stored_at, result)
+_entries: "OrderedDict[str, tuple[int, float, str]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bumps": 0}
+
+
+def bump_generation() -> None:
+    """Mark every cached result as stale (call after anything that may change files)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _stats["bumps"] += 1
+
+
+def current_generation() -> int:
+    return _generation
+
+
+def register_internal_files(*names: str) -> None:
+    """Ignore watcher events for files with these base names (and their temp files)."""
+    with _lock:
+        _internal_file_names.update(names)
+
+
+def _is_internal(path: str) -> bool:
+    name = os.path.basename(path)
+    if name in _internal_file_names:
+        return True
+    # `atomic_write_bytes` stages a replacement as `.<name>.<random>.tmp`.
+    if name.startswith(".") and name.endswith(".tmp"):
+        return name[1:-4].rpartition(".")[0] in _internal_file_names
+    return False
+
+
+def _on_fs_change(path: str | None, _structural: bool) -> None:
+    if path is not None and _is_internal(path):
+        return
+    bump_generation()
+
+
+fs_watcher.add_listener(_on_fs_change)
+
+
+def _make_key(name: str, signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    # The workspace root is part of the key: relative defaults (e.g. `root_dir=None`)
+    # resolve against it.
+    payload = {"tool": name, "cwd": os.getcwd(), "args": bound.arguments}
+    return json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def cached_tool(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Cache a read-only async tool's string result (error strings are not cached)."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> str:
+        key = _make_key(func.__name__, signature, args, kwargs)
+        generation = _generation
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                entry_generation, stored_at, result = entry
+                expired = (
+                    not fs_watcher.watcher_active()
+                    and now - stored_at >= _UNWATCHED_TTL_SECONDS
+                )
+                if entry_generation == generation and not expired:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return result
+                del _entries[key]
+            _stats["misses"] += 1
+
+        result = await func(*args, **kwargs)
+
+        if isinstance(result, str) and not result.startswith("Error"):
+            with _lock:
+                # Keyed by the generation seen *before* running: if something was written
+                # meanwhile, the entry is already stale and will simply never hit.
+                _entries[key] = (generation, now, result)
+                _entries.move_to_end(key)
+                _stats["stores"] += 1
+                while len(_entries) > _MAX_ENTRIES:
+                    _entries.popitem(last=False)
+                    _stats["evictions"] += 1
+        return result
+
+    return wrapper
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def cache_stats() -> dict[str, float]:
+    """Counters for tuning: hits / misses / stores / evictions / bumps, plus hit rate."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "generation": _generation,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,376 @@
+"""grep 的持久化 trigram 索引。
+
+索引保存在 workspace 根目录下的 SQLite 文件中：
+- `files` 表记录每个文件的 (mtime_ns, size, binary)，用于增量刷新；
+- `postings` 表记录 trigram -> file_id 的倒排表。
+
+搜索时先从正则中提取「必须出现的字面量」，再用倒排表把候选文件缩小到可能命中的子集，
+最后仍由正则做精确匹配，因此索引只影响速度，不影响结果。
+"""
+
+import os
+import re
+import sqlite3
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .result_cache import register_internal_files
+
+try:  # Python 3.11+
+    import re._parser as _sre_parse
+    import re._constants as _sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+
+_INDEX_FILE_NAME = ".agent_grep_index.sqlite"
+# 索引是 grep 的副作用，它（及 SQLite 的日志文件）的变化不应让缓存的结果失效。
+register_internal_files(
+    *(_INDEX_FILE_NAME + suffix for suffix in ("", "-journal", "-wal", "-shm"))
+)
+_INDEX_SCHEMA_VERSION = 1
+_BINARY_SNIFF_BYTES = 2048
+
+# 提取查询时，交叉组合的分支数上限；超过后放弃该部分约束（退化为不过滤）。
+_MAX_ALTERNATIVES = 32
+
+# 文本模式读取会做换行转换，且非法 UTF-8 会被替换为 U+FFFD，
+# 这些字符在原始字节里不一定存在，所以不能作为字面量的一部分。
+_RUN_BREAKING_CHARS = set("\r\n\ufffd")
+
+# 在 IGNORECASE 下，这些 ASCII 字符还能匹配非 ASCII 字符（如 K -> U+212A），
+# 而索引只做 ASCII 小写化，所以它们必须打断字面量。
+_CASEFOLD_UNSAFE = set("iksIKS")
+
+# 倒排表按「段」写入：每次 grep 把新读取文件的 postings 攒成一批，每个 trigram 一行 blob。
+# 段数超过该阈值时在 close 时合并，并顺带丢弃已失效的 file_id。
+_MAX_SEGMENTS = 16
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS files ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " path TEXT NOT NULL UNIQUE,"
+    " mtime_ns INTEGER NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " binary INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS postings ("
+    " trigram INTEGER NOT NULL,"
+    " segment INTEGER NOT NULL,"
+    " file_ids BLOB NOT NULL,"
+    " PRIMARY KEY (trigram, segment)) WITHOUT ROWID",
+)
+
+
+def default_index_path() -> Path:
+    """索引文件默认放在 workspace 根目录（与 `.agent_todo.jsonl` 一致）。"""
+    return Path.cwd().resolve() / _INDEX_FILE_NAME
+
+
+def _trigrams(data: bytes) -> set[int]:
+    """把内容（ASCII 小写化后）拆成 trigram，并编码成 24 位整数。"""
+    lowered = data.lower()
+    return {
+        (a << 16) | (b << 8) | c
+        for a, b, c in set(zip(lowered, lowered[1:], lowered[2:]))
+    }
+
+
+def _literal_trigrams(literal: str) -> set[int]:
+    return _trigrams(literal.encode("utf-8"))
+
+
+def _and(left: list[frozenset[str]] | None, right: list[frozenset[str]] | None):
+    """两个 DNF 查询取 AND（交叉组合）；None 表示「无约束」。"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    combined = [a | b for a in left for b in right]
+    if len(combined) > _MAX_ALTERNATIVES:
+        # 组合爆炸：保留分支数较少的一侧即可（约束变弱但仍正确）。
+        return left if len(left) <= len(right) else right
+    return combined
+
+
+def _extract_query(items, ignore_case: bool) -> list[frozenset[str]] | None:
+    """从已解析的正则序列中提取 DNF 形式的必需字面量。
+
+    返回值为若干「分支」，每个分支是一组必须同时出现的字面量（长度 >= 3）；
+    任意一个分支满足即可能命中。返回 None 表示无法约束（需要扫描全部文件）。
+    """
+    query: list[frozenset[str]] | None = None
+    run: list[str] = []
+
+    def flush():
+        nonlocal query
+        if len(run) >= 3:
+            query = _and(query, [frozenset(["".join(run)])])
+        run.clear()
+
+    for op, av in items:
+        if op is _sre_constants.LITERAL:
+            ch = chr(av)
+            if ch in _RUN_BREAKING_CHARS:
+                flush()
+                continue
+            if ignore_case and (ch in _CASEFOLD_UNSAFE or ord(ch) > 127):
+                flush()
+                continue
+            run.append(ch)
+        elif op is _sre_constants.AT:
+            # 零宽锚点不消耗字符，不打断字面量的连续性。
+            continue
+        elif op is _sre_constants.SUBPATTERN:
+            flush()
+            _group, add_flags, del_flags, sub = av
+            sub_ignore_case = ignore_case
+            if add_flags & re.IGNORECASE:
+                sub_ignore_case = True
+            if del_flags & re.IGNORECASE:
+                sub_ignore_case = False
+            query = _and(query, _extract_query(sub, sub_ignore_case))
+        elif op is _sre_constants.BRANCH:
+            flush()
+            alternatives: list[frozenset[str]] = []
+            for branch in av[1]:
+                branch_query = _extract_query(branch, ignore_case)
+                if branch_query is None:
+                    alternatives = []
+                    break
+                alternatives.extend(branch_query)
+            if alternatives and len(alternatives) <= _MAX_ALTERNATIVES:
+                query = _and(query, alternatives)
+        elif op in (_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT):
+            flush()
+            min_count, _max_count, sub = av
+            if min_count >= 1:
+                query = _and(query, _extract_query(sub, ignore_case))
+        else:
+            # 字符类、任意字符、反向引用、断言等：无法给出字面量约束。
+            flush()
+    flush()
+    return query
+
+
+def extract_required_literals(pattern: str, *, case_sensitive: bool) -> list[frozenset[str]] | None:
+    """对单个正则提取必需字面量（DNF）；解析失败或无约束时返回 None。"""
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except (re.error, OverflowError, RecursionError):
+        return None
+    ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+    return _extract_query(list(parsed), ignore_case)
+
+
+class SearchIndex:
+    """基于 SQLite 的 trigram 索引（每次 grep 打开一个实例，用完 close）。
+
+    文件内容变化时不原地修改倒排表，而是给文件分配新的 file_id：旧 id 留在历史段里，
+    查询时按「当前有效 id」过滤掉，合并段时再真正删除。
+
+    多个 grep 可能同时打开同一个索引：打开时的建表/版本检查、close 时的写入各自在一个
+    `BEGIN IMMEDIATE` 事务中完成；遍历期间只在内存里记下变化，不持有写锁，
+    写入时以数据库中的当前内容为准，而不是本实例打开时读到的快照。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+        try:
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # 建表与版本检查放在一个已提交的写事务里：并发打开新索引时，
+            # 后来者能看到先到者写入的版本号，不会把刚建好的索引再清空一次。
+            self._conn.execute("BEGIN IMMEDIATE")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != str(_INDEX_SCHEMA_VERSION):
+                # 版本不一致时直接重建，避免兼容旧格式。
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("DELETE FROM meta")
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('version', ?)",
+                    (str(_INDEX_SCHEMA_VERSION),),
+                )
+            self._conn.execute("COMMIT")
+            self._files: dict[str, tuple[int, int, int, bool]] = {
+                path: (file_id, mtime_ns, size, bool(binary))
+                for file_id, path, mtime_ns, size, binary in self._conn.execute(
+                    "SELECT id, path, mtime_ns, size, binary FROM files"
+                )
+            }
+        except BaseException:
+            self._conn.close()  # 未提交的事务随连接关闭回滚
+            raise
+        # 本次新读取的文件：path -> (mtime_ns, size, binary, 排好序的 trigram)，close 时写入。
+        self._updates: dict[str, tuple[int, int, bool, array]] = {}
+        self._seen: set[str] = set()
+        self._deleted: list[str] = []
+        self.reindexed = 0
+
+    def _store(self, key: str, mtime_ns: int, size: int, data: bytes | None) -> bool:
+        """记下单个文件的新内容；data 为 None 表示读取失败，按二进制处理。返回是否二进制。"""
+        binary = data is None or b"\x00" in data[:_BINARY_SNIFF_BYTES]
+        trigrams = array("I") if binary else array("I", sorted(_trigrams(data)))
+        self._updates[key] = (mtime_ns, size, binary, trigrams)
+        self.reindexed += 1
+        return binary
+
+    def refresh(self, file_path: Path, mtime_ns: int, size: int) -> bool:
+        """按 (mtime, size) 增量刷新单个文件；返回该文件是否为二进制。
+
+        mtime/size 必须来自刚做的 stat：缓存的元数据可能落后于磁盘，导致漏掉匹配。
+        """
+        key = str(file_path)
+        self._seen.add(key)
+        update = self._updates.get(key)
+        if update is not None and update[0] == mtime_ns and update[1] == size:
+            return update[2]
+        entry = self._files.get(key)
+        if update is None and entry is not None and entry[1] == mtime_ns and entry[2] == size:
+            return entry[3]
+        try:
+            with file_path.open("rb") as fh:
+                data = fh.read()
+        except OSError:
+            data = None
+        return self._store(key, mtime_ns, size, data)
+
+    def _flush_updates(self) -> None:
+        """把本次刷新的文件记录和 postings（作为一个新段）写入；需在写事务中调用。"""
+        if not self._updates:
+            return
+        pending: defaultdict[int, array] = defaultdict(lambda: array("I"))
+        for key, (mtime_ns, size, binary, trigrams) in self._updates.items():
+            # REPLACE 会删掉已有的同路径记录（也可能是别的 grep 刚写入的）并分配新 id。
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, binary) VALUES (?, ?, ?, ?)",
+                (key, mtime_ns, size, int(binary)),
+            )
+            file_id = cursor.lastrowid
+            for tri in trigrams:
+                pending[tri].append(file_id)
+        self._updates.clear()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'segments'").fetchone()
+        segment = 0 if row is None else int(row[0])
+        self._conn.executemany(
+            "INSERT INTO postings (trigram, segment, file_ids) VALUES (?, ?, ?)",
+            ((tri, segment, ids.tobytes()) for tri, ids in sorted(pending.items())),
+        )
+        segments = segment + 1
+        if segments > _MAX_SEGMENTS:
+            self._merge_segments()
+            segments = 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('segments', ?)", (str(segments),)
+        )
+
+    def _merge_segments(self) -> None:
+        """合并所有段为一个，并丢弃已失效（被重建或删除）的 file_id。"""
+        # 有效 id 以数据库为准：其他 grep 可能在本实例打开之后写入过新文件。
+        live_ids = {file_id for (file_id,) in self._conn.execute("SELECT id FROM files")}
+        merged: defaultdict[int, array] = defaultdict(lambda: array("I"))
+        for tri, blob in self._conn.execute("SELECT trigram, file_ids FROM postings"):
+            ids = array("I")
+            ids.frombytes(blob)
+            merged[tri].extend(i for i in ids if i in live_ids)
+        self._conn.execute("DELETE FROM postings")
+        self._conn.executemany(
+            "INSERT INTO postings (trigram, segment, file_ids) VALUES (?, 0, ?)",
+            ((tri, ids.tobytes()) for tri, ids in sorted(merged.items()) if ids),
+        )
+
+    def _postings(self, tri: int) -> set[int]:
+        ids: set[int] = set()
+        for (blob,) in self._conn.execute(
+            "SELECT file_ids FROM postings WHERE trigram = ?", (tri,)
+        ):
+            chunk = array("I")
+            chunk.frombytes(blob)
+            ids.update(chunk)
+        return ids
+
+    def _file_ids_for(self, alternatives: list[frozenset[str]]) -> set[int]:
+        postings_cache: dict[int, set[int]] = {}
+        matched: set[int] = set()
+        for literals in alternatives:
+            required: set[int] = set()
+            for literal in literals:
+                required |= _literal_trigrams(literal)
+            ids: set[int] | None = None
+            for tri in required:
+                postings = postings_cache.get(tri)
+                if postings is None:
+                    postings = postings_cache[tri] = self._postings(tri)
+                ids = set(postings) if ids is None else ids & postings
+                if not ids:
+                    break
+            if ids:
+                matched |= ids
+        return matched
+
+    def query(self, patterns: list[str], *, case_sensitive: bool) -> set[int] | None:
+        """可能命中的 file_id 集合；只要有一个 pattern 无法约束就返回 None（不过滤）。"""
+        alternatives: list[frozenset[str]] = []
+        for pattern in patterns:
+            query = extract_required_literals(pattern, case_sensitive=case_sensitive)
+            if query is None:
+                return None
+            alternatives.extend(query)
+        return self._file_ids_for(alternatives)
+
+    def narrow(self, file_paths: Iterable[Path], file_ids: set[int] | None) -> Iterator[Path]:
+        """惰性过滤候选文件（边遍历边产出）；file_ids 为 `query` 的结果。
+
+        本次刚（重新）读取过的文件不在倒排表里，总是保留。
+        """
+        for file_path in file_paths:
+            key = str(file_path)
+            if file_ids is None or key in self._updates:
+                yield file_path
+                continue
+            entry = self._files.get(key)
+            if entry is None or entry[0] in file_ids:
+                yield file_path
+
+    def prune(self, root_path: Path) -> None:
+        """清理 root_path 下本次没遍历到、且已不存在的文件记录（close 时从数据库删除）。"""
+        prefix = str(root_path).rstrip(os.sep) + os.sep
+        stale = [
+            key
+            for key in self._files
+            if key.startswith(prefix) and key not in self._seen and not os.path.lexists(key)
+        ]
+        for key in stale:
+            del self._files[key]
+            self._deleted.append(key)
+
+    def close(self) -> None:
+        """写入本次的变化（一个短的写事务）并关闭；写入失败只会让下次 grep 重新读取这些文件。"""
+        try:
+            if self._updates or self._deleted:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "DELETE FROM files WHERE path = ?", ((key,) for key in self._deleted)
+                )
+                self._flush_updates()
+                self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            pass
+        finally:
+            self._conn.close()
+
+
+def open_index(db_path: Path | None = None) -> SearchIndex | None:
+    """打开（必要时创建）索引；失败时返回 None，让调用方退回全量扫描。"""
+    path = db_path or default_index_path()
+    try:
+        return SearchIndex(path)
+    except sqlite3.Error:
+        return None
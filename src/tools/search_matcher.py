@@ -0,0 +1,344 @@
+"""grep 的匹配引擎：在整个文件缓冲区上查找，只为命中位置计算行号。
+
+- 纯字面量 pattern（如标识符）直接在原始字节上查找：先判断哪些字面量出现过
+  （少量字面量逐个 `bytes.find`，较多时合并成一个交替式字节正则一遍扫描），
+  再对出现过的字面量逐个定位，只解码命中的行；
+- 其余正则若「任何匹配都不会跨行」（不消耗换行符、不使用 \\A / \\Z、不匹配空串），
+  在整份解码后的文本上从上次命中的下一行开始反复 search；
+- 剩下的正则（极少见）保持逐行匹配。
+
+三种方式的结果与「逐行对每个 pattern 做 search」完全一致，只是不命中的文件不再走 Python 逐行循环。
+"""
+
+import io
+import re
+from functools import lru_cache
+
+try:  # Python 3.11+
+    import re._parser as _sre_parse
+    import re._constants as _sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+
+# 字面量不超过该数量时逐个 bytes.find（memchr 级别的速度）；更多时改用合并正则一遍扫描。
+_MAX_FIND_LITERALS = 4
+
+# 与 search_index 相同的约束：文本模式读取会做换行转换、非法 UTF-8 会变成 U+FFFD，
+# 含这些字符的字面量在原始字节里不一定存在，只能走正则路径。
+_RUN_BREAKING_CHARS = frozenset("\r\n\ufffd")
+
+# IGNORECASE 下这些 ASCII 字符还能匹配非 ASCII 字符（如 K -> U+212A），
+# 而字节级查找只做 ASCII 小写化。
+_CASEFOLD_UNSAFE = frozenset("iksIKS")
+
+# 字符类中会匹配 "\n" 的类别（\s、\D、\W 及其 Unicode 变体）。
+_NEWLINE_CATEGORIES = frozenset(
+    getattr(_sre_constants, name)
+    for name in (
+        "CATEGORY_SPACE",
+        "CATEGORY_NOT_DIGIT",
+        "CATEGORY_NOT_WORD",
+        "CATEGORY_LINEBREAK",
+        "CATEGORY_LOC_NOT_WORD",
+        "CATEGORY_UNI_SPACE",
+        "CATEGORY_UNI_NOT_DIGIT",
+        "CATEGORY_UNI_NOT_WORD",
+        "CATEGORY_UNI_LINEBREAK",
+    )
+    if hasattr(_sre_constants, name)
+)
+
+_REPEAT_OPS = tuple(
+    getattr(_sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(_sre_constants, name)
+)
+
+
+def _parse(pattern: str, flags: int):
+    try:
+        return _sre_parse.parse(pattern, flags)
+    except (re.error, OverflowError, RecursionError):
+        return None
+
+
+def literal_of(pattern: str, *, case_sensitive: bool) -> tuple[str, bool] | None:
+    """若 pattern 等价于一个可在原始字节上查找的字面量，返回 (literal, ignore_case)。"""
+    parsed = _parse(pattern, 0 if case_sensitive else re.IGNORECASE)
+    if parsed is None or not len(parsed):
+        return None
+    ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+    chars: list[str] = []
+    for op, av in parsed:
+        if op is not _sre_constants.LITERAL:
+            return None
+        ch = chr(av)
+        if ch in _RUN_BREAKING_CHARS:
+            return None
+        if ignore_case and (ch in _CASEFOLD_UNSAFE or ord(ch) > 127):
+            return None
+        chars.append(ch)
+    return "".join(chars), ignore_case
+
+
+def _set_matches_newline(items) -> bool:
+    negate = False
+    hit = False
+    for op, av in items:
+        if op is _sre_constants.NEGATE:
+            negate = True
+        elif op is _sre_constants.LITERAL:
+            hit = hit or av == 10
+        elif op is _sre_constants.RANGE:
+            hit = hit or av[0] <= 10 <= av[1]
+        elif op is _sre_constants.CATEGORY:
+            hit = hit or av in _NEWLINE_CATEGORIES
+        else:
+            return True  # 不认识的写法：保守地认为可能匹配换行
+    return hit != negate
+
+
+def _is_line_local(items, dotall: bool) -> bool:
+    """该序列的任何匹配都不消耗 "\\n"、也不依赖字符串首尾时返回 True。
+
+    满足时，在整份文本上 search 与在每一行上分别 search 的结论一致：
+    匹配不会跨过换行，而 ^、$、\\b 与环视在「行尾的 \\n」和「字符串边界」处的判定相同。
+    """
+    for op, av in items:
+        if op is _sre_constants.LITERAL:
+            if av == 10:
+                return False
+        elif op is _sre_constants.NOT_LITERAL:
+            if av != 10:
+                return False
+        elif op is _sre_constants.ANY:
+            if dotall:
+                return False
+        elif op is _sre_constants.IN:
+            if _set_matches_newline(av):
+                return False
+        elif op is _sre_constants.AT:
+            if av in (_sre_constants.AT_BEGINNING_STRING, _sre_constants.AT_END_STRING):
+                return False
+        elif op is _sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, sub = av
+            sub_dotall = (dotall or bool(add_flags & re.DOTALL)) and not del_flags & re.DOTALL
+            if not _is_line_local(sub, sub_dotall):
+                return False
+        elif op is _sre_constants.BRANCH:
+            if not all(_is_line_local(branch, dotall) for branch in av[1]):
+                return False
+        elif op in _REPEAT_OPS:
+            if not _is_line_local(av[2], dotall):
+                return False
+        elif op in (_sre_constants.ASSERT, _sre_constants.ASSERT_NOT):
+            if not _is_line_local(av[1], dotall):
+                return False
+        elif op is getattr(_sre_constants, "ATOMIC_GROUP", None):
+            if not _is_line_local(av, dotall):
+                return False
+        elif op is _sre_constants.GROUPREF:
+            # 被引用的分组本身已检查过，其内容同样不含换行。
+            continue
+        elif op is _sre_constants.GROUPREF_EXISTS:
+            _group, yes, no = av
+            if not _is_line_local(yes, dotall) or (no is not None and not _is_line_local(no, dotall)):
+                return False
+        else:
+            return False
+    return True
+
+
+def is_line_local(pattern: str, *, case_sensitive: bool) -> bool:
+    """能否在整份文本上 search 来代替逐行 search。
+
+    除了 `_is_line_local` 的条件，还要求匹配至少消耗一个字符：能匹配空串的正则（如 `^$`、`\\B`）
+    逐行匹配时还会在每行 "\\n" 之后的「字符串末尾」命中，整份文本上没有对应的位置。
+    """
+    parsed = _parse(pattern, 0 if case_sensitive else re.IGNORECASE)
+    if parsed is None or parsed.getwidth()[0] == 0:
+        return False
+    return _is_line_local(list(parsed), bool(parsed.state.flags & re.DOTALL))
+
+
+@lru_cache(maxsize=64)
+def _alternation(needles: tuple[bytes, ...]) -> re.Pattern[bytes]:
+    # 长的放前面：同一位置上优先报告更长的字面量。
+    ordered = sorted(needles, key=len, reverse=True)
+    return re.compile(b"|".join(re.escape(needle) for needle in ordered))
+
+
+def find_present(data: bytes, needles: tuple[bytes, ...]) -> set[bytes]:
+    """返回 needles 中在 data 里出现过的子集。"""
+    if len(needles) <= _MAX_FIND_LITERALS:
+        return {needle for needle in needles if needle in data}
+    found: set[bytes] = set()
+    remaining = tuple(needles)
+    # 交替式正则在同一位置只报告一个分支，与之重叠的字面量可能被跳过：
+    # 对尚未找到的字面量再扫一轮，直到某一轮没有新发现为止。
+    while remaining:
+        new: set[bytes] = set()
+        for match in _alternation(remaining).finditer(data):
+            new.add(match.group())
+            if len(new) == len(remaining):
+                break
+        if not new:
+            break
+        found |= new
+        remaining = tuple(needle for needle in remaining if needle not in new)
+    return found
+
+
+def decode_text(data: bytes) -> str:
+    """与 `open(..., "r", encoding="utf-8", errors="replace")` 读出的内容一致（含换行转换）。"""
+    text = data.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _literal_hits(
+    data: bytes, haystack: bytes, needle: bytes, index: int, limit: int
+) -> list[tuple[int, int, str]]:
+    """在原始字节上逐个定位字面量；行号按命中位置增量计数，只解码命中的行。
+
+    haystack 与 data 等长（区分大小写时就是 data，否则是其 ASCII 小写副本）。
+    调用方保证 data 中没有 "\r"，此时 "\n" 就是全部的换行。
+    """
+    hits: list[tuple[int, int, str]] = []
+    line_no = 1
+    counted = 0
+    pos = haystack.find(needle)
+    while pos != -1 and len(hits) < limit:
+        line_no += data.count(b"\n", counted, pos)
+        start = data.rfind(b"\n", 0, pos) + 1
+        end = data.find(b"\n", pos)
+        if end == -1:
+            end = len(data)
+        hits.append((line_no, index, data[start:end].decode("utf-8", errors="replace")))
+        # 同一行只报告一次：从下一行开头继续查找
+        counted = end
+        pos = haystack.find(needle, end + 1) if end < len(data) else -1
+    return hits
+
+
+def _regex_hits(
+    text: str, compiled: re.Pattern[str], index: int, limit: int
+) -> list[tuple[int, int, str]]:
+    """在整份文本上对「行内」正则做 search，只对命中位置计算行号。"""
+    hits: list[tuple[int, int, str]] = []
+    line_no = 1
+    counted = 0
+    pos = 0
+    while len(hits) < limit:
+        match = compiled.search(text, pos)
+        if match is None:
+            break
+        hit = match.start()
+        line_no += text.count("\n", counted, hit)
+        start = text.rfind("\n", 0, hit) + 1
+        end = text.find("\n", hit)
+        if end == -1:
+            end = len(text)
+        hits.append((line_no, index, text[start:end]))
+        if end >= len(text):
+            break
+        counted = end
+        pos = end + 1
+    return hits
+
+
+class PatternSet:
+    """一次 grep 的全部 pattern，以及按类别选定的匹配方式。
+
+    实例会被 pickle 到并行扫描的子进程中，因此只保存可序列化的数据，
+    合并后的字面量正则在各进程内按需编译并缓存。
+    """
+
+    def __init__(self, compiled_patterns: list[tuple[str, re.Pattern[str]]], *, case_sensitive: bool):
+        self.patterns = compiled_patterns
+        # needle -> 使用它的 pattern 下标（同一字面量可能重复给出）
+        self.literals: dict[bytes, list[int]] = {}
+        self.literals_ci: dict[bytes, list[int]] = {}
+        # pattern 下标 -> (needle, ignore_case)
+        self.literal_by_index: dict[int, tuple[bytes, bool]] = {}
+        # 可在整文本上直接 search 的正则 / 只能逐行判断的正则
+        self.line_local: list[int] = []
+        self.per_line: list[int] = []
+        for i, (raw, _compiled) in enumerate(compiled_patterns):
+            literal = literal_of(raw, case_sensitive=case_sensitive)
+            if literal is not None:
+                text, ignore_case = literal
+                if ignore_case:
+                    needle = text.lower().encode("utf-8")
+                    self.literals_ci.setdefault(needle, []).append(i)
+                else:
+                    needle = text.encode("utf-8")
+                    self.literals.setdefault(needle, []).append(i)
+                self.literal_by_index[i] = (needle, ignore_case)
+            elif is_line_local(raw, case_sensitive=case_sensitive):
+                self.line_local.append(i)
+            else:
+                self.per_line.append(i)
+
+    def _present_literals(self, data: bytes, lowered: bytes | None) -> set[int]:
+        present: set[int] = set()
+        for needles, haystack in ((self.literals, data), (self.literals_ci, lowered)):
+            if needles and haystack is not None:
+                for needle in find_present(haystack, tuple(needles)):
+                    present.update(needles[needle])
+        return present
+
+    def scan(self, data: bytes, limit: int) -> list[tuple[int, str, str]]:
+        """扫描一个文件的内容，返回最多 limit 条 (line_no, raw_pattern, line)，按 (行, pattern) 排序。
+
+        不命中的文件只付出几次 C 层面的整缓冲区查找；行号只在命中位置计算，
+        字面量命中时也只解码命中的那一行。
+        """
+        lowered = data.lower() if self.literals_ci else None
+        present = self._present_literals(data, lowered) if self.literal_by_index else set()
+        # 含 "\r" 的文件在文本模式下有额外的换行（单独的 "\r"），字节偏移无法直接换算行号，
+        # 此时字面量也改在解码后的文本上用正则定位。
+        bytes_path = b"\r" not in data
+        regex_indexes = list(self.line_local)
+        if not bytes_path:
+            regex_indexes.extend(present)
+        if not present and not regex_indexes and not self.per_line:
+            return []
+
+        hits: list[tuple[int, int, str]] = []
+        if bytes_path:
+            for i in present:
+                needle, ignore_case = self.literal_by_index[i]
+                hits.extend(_literal_hits(data, lowered if ignore_case else data, needle, i, limit))
+
+        text: str | None = None
+        if regex_indexes or self.per_line:
+            text = decode_text(data)
+            for i in regex_indexes:
+                hits.extend(_regex_hits(text, self.patterns[i][1], i, limit))
+            if self.per_line:
+                hits.extend(self._per_line_hits(text, limit))
+
+        if not hits:
+            return []
+        # 每个 pattern 最多取了 limit 条，合并排序后的前 limit 条即为逐行扫描的结果。
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        return [
+            (line_no, self.patterns[i][0], line.rstrip("\r\n"))
+            for line_no, i, line in hits[:limit]
+        ]
+
+    def _per_line_hits(self, text: str, limit: int) -> list[tuple[int, int, str]]:
+        """可能跨行或依赖字符串首尾的正则：保持原有的逐行语义。"""
+        active = [(i, self.patterns[i][1]) for i in self.per_line]
+        hits: list[tuple[int, int, str]] = []
+        for line_no, line in enumerate(io.StringIO(text), start=1):
+            for i, compiled in active:
+                if compiled.search(line):
+                    hits.append((line_no, i, line))
+                    if len(hits) >= limit:
+                        return hits
+        return hits
@@ -0,0 +1,143 @@
+"""grep 的多进程并行扫描。
+
+正则匹配受 GIL 限制，线程无法并行，因此把候选文件按遍历顺序切成若干分片，
+交给进程池扫描；主进程按分片顺序合并结果，凑够 max_results 后取消尚未开始的分片。
+因此并行与顺序扫描的结果顺序相同，max_results 截取的是同一批文件。
+
+候选文件是边遍历边切片的：同时在途的分片数有上限，每合并一个分片才再从遍历中取下一片，
+所以凑够 max_results 后目录树的其余部分不会再被遍历（也不会再 stat / 更新索引）。
+
+进程数是宿主机的配置（`set_workers`，CLI 的 `--grep-workers`），不由模型决定。
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
+
+
+# 候选文件少于该数量时，进程间通信的开销大于收益，直接顺序扫描。
+PARALLEL_MIN_FILES = 512
+
+# 每个 worker 同时在途的分片数：让进程池不空闲，又不会领先合并进度太多。
+_SHARDS_PER_WORKER = 2
+# 分片从小到大（每片翻倍）：前几片小，首批结果出得快；之后变大，减少调度开销。
+_MIN_SHARD_SIZE = 16
+_MAX_SHARD_SIZE = 256
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_workers: int | None = None
+
+
+def set_workers(workers: int | None) -> None:
+    """grep 使用的扫描进程数；None 表示 CPU 核数，1 表示不并行。"""
+    global _workers
+    if workers is not None and workers <= 0:
+        raise ValueError("workers must be greater than 0")
+    _workers = workers
+
+
+def default_workers() -> int:
+    return _workers or os.cpu_count() or 1
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """进程池在多次 grep 之间复用，避免每次都付出进程启动与模块导入的成本。"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # search 在 asyncio.to_thread 的线程里运行，多线程进程中 fork 不安全，
+            # 因此 Linux 上使用 forkserver，其余平台用默认的 spawn。
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(method)
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _scan_shard(
+    scan_file: Callable[..., list], paths: list[str], args: tuple, limit: int
+) -> tuple[int, list[tuple[str, list]]]:
+    """在子进程中顺序扫描一个分片；分片内命中数达到 limit 后提前结束。
+
+    返回 (实际扫描的文件数, 有命中的 [(path, hits)])。
+    """
+    shard_results: list[tuple[str, list]] = []
+    found = 0
+    scanned = 0
+    for path in paths:
+        hits = scan_file(path, *args, limit - found)
+        scanned += 1
+        if hits:
+            shard_results.append((path, hits))
+            found += len(hits)
+            if found >= limit:
+                break
+    return scanned, shard_results
+
+
+def scan_in_parallel(
+    scan_file: Callable[..., list],
+    paths: Iterable[str],
+    args: tuple[Any, ...],
+    *,
+    max_results: int,
+    workers: int,
+    on_progress: Callable[[int], None] | None = None,
+) -> Iterator[tuple[str, list]]:
+    """按 paths 的顺序产出有命中的 (path, hits)；调用方停止迭代时会取消剩余分片。
+
+    paths 按需惰性读取：在途分片最多 workers * _SHARDS_PER_WORKER 个，
+    合并的命中数达到 max_results 后不再读取。
+    scan_file 必须是模块级函数（可被 pickle），签名为 scan_file(path, *args, limit)。
+    on_progress 在每个分片合并前以该分片扫描的文件数回调（用于进度展示）。
+    """
+    pool = _get_pool(workers)
+    paths = iter(paths)
+    shard_size = _MIN_SHARD_SIZE
+    futures: deque[Future] = deque()
+
+    def submit_next() -> bool:
+        nonlocal shard_size
+        shard = list(islice(paths, shard_size))
+        if not shard:
+            return False
+        futures.append(pool.submit(_scan_shard, scan_file, shard, args, max_results))
+        shard_size = min(shard_size * 2, _MAX_SHARD_SIZE)
+        return True
+
+    found = 0
+    try:
+        while len(futures) < workers * _SHARDS_PER_WORKER and submit_next():
+            pass
+        while futures:
+            scanned, shard_results = futures.popleft().result()
+            if on_progress is not None:
+                on_progress(scanned)
+            found += sum(len(hits) for _path, hits in shard_results)
+            if found < max_results:
+                submit_next()
+            yield from shard_results
+    finally:
+        for future in futures:
+            future.cancel()
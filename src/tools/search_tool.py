@@ -2,12 +2,24 @@ from agents import function_tool
 import asyncio
 import os
 import re
-from fnmatch import fnmatch
+import sqlite3
+import stat
+import threading
+import time
+from itertools import chain, islice
 from pathlib import Path
-from pathlib import PurePath
+from typing import AsyncIterator, Callable, Iterable, Iterator, NamedTuple
 
+from .glob_walker import GlobPattern, iter_glob
+from .ignore_rules import GlobSet, walk_filtered
+from .output_budget import estimate_tokens, fit_lines
+from .result_cache import cached_tool
+from .search_index import SearchIndex, open_index
+from .search_matcher import PatternSet
+from .search_parallel import PARALLEL_MIN_FILES, default_workers, scan_in_parallel
+from .tool_scheduler import scheduled
+from . import workspace_cache
 
-_BINARY_SNIFF_BYTES = 2048
 
 _DEFAULT_EXCLUDE_DIRS = {
     ".git",
@@ -19,6 +31,7 @@ _DEFAULT_EXCLUDE_DIRS = {
     "node_modules",
     ".mypy_cache",
     ".pytest_cache",
+    ".agent_snapshots",
 }
 
 _DEFAULT_EXCLUDE_FILE_GLOBS = {
@@ -41,6 +54,8 @@ _DEFAULT_EXCLUDE_FILE_GLOBS = {
     "*.mov",
     "*.sqlite",
     "*.db",
+    # grep 自己的索引及其日志文件（`-journal` 等不会被 `*.sqlite` 排除）
+    ".agent_grep_index.sqlite*",
 }
 
 
@@ -48,13 +63,9 @@ def _is_probably_binary(path: Path) -> bool:
     """二进制文件的简单启发式判断：如果包含 NUL 字节，则认为是二进制并跳过。
 
     目的：避免扫描图片/压缩包等内容，减少无意义输出并提升速度。
+    判断结果缓存在 workspace_cache 中，文件未变化时不会重复读取。
     """
-    try:
-        with path.open("rb") as fh:
-            chunk = fh.read(_BINARY_SNIFF_BYTES)
-    except OSError:
-        return True
-    return b"\x00" in chunk
+    return workspace_cache.is_probably_binary(path)
 
 
 def _clean_str_list(values: list[str] | None) -> list[str]:
@@ -110,25 +121,30 @@ def _compile_patterns(
     return compiled, None
 
 
-def _should_match_any_glob(rel_path: str, name: str, globs: list[str] | tuple[str, ...]) -> bool:
-    """任意 glob 命中相对路径或文件名则返回 True。"""
-    return any(fnmatch(rel_path, g) or fnmatch(name, g) for g in globs)
-
-
 def _iter_candidate_files(
     root_path: Path,
     *,
-    include_globs: list[str],
+    include_globs: GlobSet,
     exclude_dir_names: set[str],
-    exclude_file_globs: tuple[str, ...],
+    exclude_file_globs: GlobSet,
     max_file_size_kb: int,
+    index: SearchIndex | None = None,
+    respect_ignore_files: bool = True,
 ):
-    """遍历并产出通过过滤条件的候选文件（include/exclude/大小/二进制判断）。"""
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        # 原地剪枝：让 os.walk 不进入这些目录递归
-        dirnames[:] = [d for d in dirnames if d not in exclude_dir_names]
+    """遍历并产出通过过滤条件的候选文件（ignore 规则/include/exclude/大小/二进制判断）。
 
-        for filename in filenames:
+    被排除或被 .gitignore/.ignore 忽略的目录在遍历时直接剪枝，不会进入。
+    遍历顺序是确定的：每个目录内先按名称产出文件，再按名称进入子目录。
+    传入 index 时，每个文件都做一次真实的 stat，二进制判断改由索引完成
+    （未变化的文件不再重复读取），同时顺带增量刷新该文件的索引记录。
+    """
+    for dirpath, dirnames, filenames in walk_filtered(
+        root_path,
+        exclude_dir_names=exclude_dir_names,
+        respect_ignore_files=respect_ignore_files,
+    ):
+        dirnames.sort()  # 原地排序，walk 按此顺序进入子目录
+        for filename in sorted(filenames):
             file_path = Path(dirpath) / filename
 
             try:
@@ -136,30 +152,87 @@ def _iter_candidate_files(
             except ValueError:
                 rel_path = str(file_path)
 
-            if include_globs and not _should_match_any_glob(rel_path, filename, include_globs):
+            if include_globs and not include_globs.matches(rel_path, filename):
                 continue
-            if _should_match_any_glob(rel_path, filename, exclude_file_globs):
+            if exclude_file_globs.matches(rel_path, filename):
                 continue
 
-            try:
-                if not file_path.is_file():
+            if index is not None:
+                # 索引凭 (mtime, size) 判断文件是否变化，必须用真实的 stat：
+                # workspace_cache 的元数据在信任窗口内可能落后于磁盘，会让索引漏掉新内容。
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode) or st.st_size > max_file_size_kb * 1024:
+                    continue
+                if index.refresh(file_path, st.st_mtime_ns, st.st_size):
+                    continue
+            else:
+                meta = workspace_cache.get_meta(file_path)
+                if meta is None or not meta.is_file:
+                    continue
+                if meta.size > max_file_size_kb * 1024:
+                    continue
+                if _is_probably_binary(file_path):
                     continue
-            except OSError:
-                continue
-
-            try:
-                size = file_path.stat().st_size
-            except OSError:
-                continue
-            if size > max_file_size_kb * 1024:
-                continue
-            if _is_probably_binary(file_path):
-                continue
 
             yield file_path
 
 
-def _search_sync(
+def _scan_file(
+    file_path: str,
+    matcher: PatternSet,
+    limit: int,
+) -> list[tuple[int, str, str]]:
+    """扫描单个文件，返回最多 limit 条 (line_no, raw_pattern, line)。
+
+    整个文件以字节形式一次读入，由 matcher 在整个缓冲区上查找，只为命中位置计算行号。
+    作为模块级函数，既用于顺序扫描，也会被 pickle 到子进程中并行执行。
+    """
+    try:
+        with open(file_path, "rb") as fh:
+            data = fh.read()
+    except OSError:
+        return []
+    return matcher.scan(data, limit)
+
+
+class GrepMatch(NamedTuple):
+    """一处匹配：文件绝对路径、行号（从 1 开始）、命中的 pattern 原文、行内容。"""
+
+    path: str
+    line_no: int
+    pattern: str
+    line: str
+
+
+class GrepBatch(NamedTuple):
+    """流式 grep 的一批结果。
+
+    - matches：本批新增的匹配（按文件、行号有序）；
+    - files_scanned / total_matches / matched_files：截至本批的累计进度；
+    - done / limit_reached：是否为最后一批、是否因 max_results 提前结束；
+    - error：参数或正则错误时只产出一批且带错误信息；
+    - pattern_counts：截至本批每个 pattern 的命中行数（按传入顺序）。
+    """
+
+    matches: list[GrepMatch]
+    files_scanned: int
+    total_matches: int
+    matched_files: int
+    done: bool = False
+    limit_reached: bool = False
+    error: str | None = None
+    pattern_counts: dict[str, int] | None = None
+
+
+# 流式输出的节流参数：凑够一批或超过间隔就产出，保证进度及时刷新。
+_STREAM_BATCH_SIZE = 20
+_STREAM_INTERVAL_SECONDS = 0.1
+
+
+def _iter_search_batches(
     patterns: list[str],
     root_dir: str,
     include_globs: list[str] | None,
@@ -168,13 +241,27 @@ def _search_sync(
     case_sensitive: bool,
     max_results: int,
     max_file_size_kb: int,
-) -> str:
-    """同步搜索实现（通过 asyncio.to_thread 在线程里跑，避免阻塞事件循环）。"""
+    use_index: bool = False,
+    workers: int = 1,
+    stop: threading.Event | None = None,
+    respect_ignore_files: bool = True,
+) -> Iterator[GrepBatch]:
+    """同步搜索的核心：边扫描边按批产出结果（最后一批 done=True）。
+
+    - respect_ignore_files=True 时跳过 .gitignore/.ignore 忽略的文件与目录；
+    - use_index=True 时边遍历边用 trigram 索引过滤候选文件，再做正则匹配；
+    - workers > 1 且候选文件足够多时，分片到进程池并行扫描；无论是否并行，
+      结果都按遍历顺序（见 `_iter_candidate_files`）和行号排列；
+    - stop 被设置后尽快结束（调用方不再需要更多结果）。
+    """
     root_path = Path(root_dir)
-    if not root_path.exists():
-        return f"Error: root_dir does not exist: {root_dir}"
-    if not root_path.is_dir():
-        return f"Error: root_dir is not a directory: {root_dir}"
+    root_meta = workspace_cache.get_meta(root_path)
+    if root_meta is None:
+        yield GrepBatch([], 0, 0, 0, done=True, error=f"Error: root_dir does not exist: {root_dir}")
+        return
+    if not root_meta.is_dir:
+        yield GrepBatch([], 0, 0, 0, done=True, error=f"Error: root_dir is not a directory: {root_dir}")
+        return
 
     include_globs_list = _clean_str_list(include_globs)
     exclude_globs_list = _clean_str_list(exclude_globs)
@@ -186,47 +273,288 @@ def _search_sync(
 
     compiled_patterns, error = _compile_patterns(patterns, case_sensitive=case_sensitive)
     if error:
-        return error
-    exclude_file_globs_tuple = tuple(exclude_file_globs)
+        yield GrepBatch([], 0, 0, 0, done=True, error=error)
+        return
+    include_glob_set = GlobSet(include_globs_list)
+    exclude_glob_set = GlobSet(sorted(exclude_file_globs))
+    matcher = PatternSet(compiled_patterns, case_sensitive=case_sensitive)
+
+    index = open_index() if use_index else None
+    walk_finished = False
+
+    def _walk() -> Iterator[Path]:
+        nonlocal walk_finished
+        yield from _iter_candidate_files(
+            root_path,
+            include_globs=include_glob_set,
+            exclude_dir_names=exclude_dir_set,
+            exclude_file_globs=exclude_glob_set,
+            max_file_size_kb=max_file_size_kb,
+            index=index,
+            respect_ignore_files=respect_ignore_files,
+        )
+        walk_finished = True
+
+    candidates: Iterable[Path] = _walk()
+    if index is not None:
+        # 倒排表只查一次；之后边遍历边过滤，第一个匹配不必等整棵树遍历完。
+        try:
+            file_ids = index.query(patterns, case_sensitive=case_sensitive)
+        except sqlite3.Error:
+            index.close()
+            index = None
+        else:
+            candidates = index.narrow(candidates, file_ids)
 
-    results: list[str] = []
+    try:
+        yield from _scan_candidates(
+            candidates, patterns, matcher, max_results, workers, stop
+        )
+    finally:
+        if index is not None:
+            if walk_finished:
+                index.prune(root_path)
+            index.close()
+
+
+def _scan_candidates(
+    candidates: Iterable[Path],
+    patterns: list[str],
+    matcher: PatternSet,
+    max_results: int,
+    workers: int,
+    stop: threading.Event | None,
+) -> Iterator[GrepBatch]:
+    """扫描候选文件并按批产出结果（见 `_iter_search_batches`）。"""
+    total = 0
+    scanned = 0
     matched_files: set[str] = set()
+    pattern_counts = dict.fromkeys(patterns, 0)
+    pending: list[str] = []
+    last_emit = time.monotonic()
+
+    def count_scanned(n: int) -> None:
+        nonlocal scanned
+        scanned += n
+
+    candidates = iter(candidates)
+    head: list[Path] = []
+    if workers > 1:
+        # 先取前 PARALLEL_MIN_FILES 个：不够多就没必要启动进程池
+        head = list(islice(candidates, PARALLEL_MIN_FILES))
+    if len(head) >= PARALLEL_MIN_FILES:
+        file_hits = scan_in_parallel(
+            _scan_file,
+            (str(path) for path in chain(head, candidates)),
+            (matcher,),
+            max_results=max_results,
+            workers=workers,
+            on_progress=count_scanned,
+        )
+    else:
+        # 顺序扫描保持惰性遍历：凑够 max_results 后不再继续 walk
+        def _sequential():
+            for path in chain(head, candidates):
+                hits = _scan_file(str(path), matcher, max_results - total)
+                count_scanned(1)
+                yield str(path), hits
 
-    for file_path in _iter_candidate_files(
-        root_path,
-        include_globs=include_globs_list,
-        exclude_dir_names=exclude_dir_set,
-        exclude_file_globs=exclude_file_globs_tuple,
-        max_file_size_kb=max_file_size_kb,
-    ):
-        try:
-            with file_path.open("r", encoding="utf-8", errors="replace") as fh:
-                for line_no, line in enumerate(fh, start=1):
-                    # 一行可能同时匹配多个 pattern：按 (line, pattern) 维度输出多条结果
-                    for raw_pattern, compiled in compiled_patterns:
-                        if not compiled.search(line):
-                            continue
-                        results.append(
-                            f"{file_path}:{line_no}: [{raw_pattern}] {line.rstrip('\r\n')}"
-                        )
-                        matched_files.add(str(file_path))
-                        if len(results) >= max_results:
-                            summary = (
-                                f"Found {len(results)} matches (limit reached) in "
-                                f"{len(matched_files)} files under {root_path}."
-                            )
-                            return summary + "\n" + "\n".join(results)
-        except OSError:
-            continue
+        file_hits = _sequential()
+
+    try:
+        for file_path, hits in file_hits:
+            if hits:
+                matched_files.add(file_path)
+                for line_no, raw_pattern, line in hits[: max_results - total]:
+                    pending.append(GrepMatch(file_path, line_no, raw_pattern, line))
+                    pattern_counts[raw_pattern] += 1
+                    total += 1
+            if total >= max_results:
+                yield GrepBatch(
+                    pending,
+                    scanned,
+                    total,
+                    len(matched_files),
+                    done=True,
+                    limit_reached=True,
+                    pattern_counts=dict(pattern_counts),
+                )
+                return
+            if stop is not None and stop.is_set():
+                return
+            now = time.monotonic()
+            if len(pending) >= _STREAM_BATCH_SIZE or now - last_emit >= _STREAM_INTERVAL_SECONDS:
+                yield GrepBatch(
+                    pending, scanned, total, len(matched_files), pattern_counts=dict(pattern_counts)
+                )
+                pending = []
+                last_emit = now
+    finally:
+        # 关闭生成器，让并行扫描取消尚未开始的分片
+        file_hits.close()
+
+    yield GrepBatch(
+        pending, scanned, total, len(matched_files), done=True, pattern_counts=pattern_counts
+    )
 
+
+def _group_matches(results: list[GrepMatch], show_pattern: bool) -> list[str]:
+    """按文件分组：文件路径独占一行，其下每处匹配一行（多个 pattern 时标注命中的 pattern）。"""
+    lines: list[str] = []
+    current_path = None
+    for match in results:
+        if match.path != current_path:
+            current_path = match.path
+            lines.append(current_path)
+        tag = f"[{match.pattern}] " if show_pattern else ""
+        lines.append(f"  {match.line_no}: {tag}{match.line}")
+    return lines
+
+
+def _format_search_result(
+    root_path: str,
+    results: list[GrepMatch],
+    matched_files: int,
+    limit_reached: bool,
+    pattern_counts: dict[str, int] | None = None,
+) -> str:
     if not results:
         return f"No matches found under {root_path}."
+    if limit_reached:
+        summary = (
+            f"Found {len(results)} matches (limit reached) in "
+            f"{matched_files} files under {root_path}."
+        )
+    else:
+        summary = f"Found {len(results)} matches in {matched_files} files under {root_path}."
+    if pattern_counts and len(pattern_counts) > 1:
+        # 多个 pattern 时注明各自命中多少行（包括 0），方便判断哪些 pattern 无效。
+        summary += "\nMatches per pattern: " + ", ".join(
+            f"`{pattern}`: {count}" for pattern, count in pattern_counts.items()
+        )
+    # 输出受 grep 的输出预算约束：超出时省略中间部分，省略标记里带 fetch_more 句柄。
+    lines = _group_matches(results, show_pattern=bool(pattern_counts and len(pattern_counts) > 1))
+    return summary + "\n" + fit_lines(lines, "grep", reserve_tokens=estimate_tokens(summary))
+
+
+def _search_sync(
+    patterns: list[str],
+    root_dir: str,
+    include_globs: list[str] | None,
+    exclude_dirs: list[str] | None,
+    exclude_globs: list[str] | None,
+    case_sensitive: bool,
+    max_results: int,
+    max_file_size_kb: int,
+    use_index: bool = False,
+    workers: int = 1,
+    respect_ignore_files: bool = True,
+) -> str:
+    """同步搜索实现：消费全部批次并拼成一个字符串（供脚本/基准测试使用）。"""
+    results: list[GrepMatch] = []
+    last: GrepBatch | None = None
+    for batch in _iter_search_batches(
+        patterns,
+        root_dir,
+        include_globs,
+        exclude_dirs,
+        exclude_globs,
+        case_sensitive,
+        max_results,
+        max_file_size_kb,
+        use_index,
+        workers,
+        respect_ignore_files=respect_ignore_files,
+    ):
+        if batch.error:
+            return batch.error
+        results.extend(batch.matches)
+        last = batch
+    assert last is not None
+    return _format_search_result(
+        str(Path(root_dir)), results, last.matched_files, last.limit_reached, last.pattern_counts
+    )
+
+
+_DONE = object()
+_progress_listeners: list[Callable[[GrepBatch], None]] = []
+
 
-    summary = f"Found {len(results)} matches in {len(matched_files)} files under {root_path}."
-    return summary + "\n" + "\n".join(results)
+def add_search_progress_listener(listener: Callable[[GrepBatch], None]) -> None:
+    """注册 grep 进度回调（在事件循环线程中调用，例如 CLI 用它渲染扫描进度）。"""
+    if listener not in _progress_listeners:
+        _progress_listeners.append(listener)
+
+
+def remove_search_progress_listener(listener: Callable[[GrepBatch], None]) -> None:
+    if listener in _progress_listeners:
+        _progress_listeners.remove(listener)
+
+
+async def grep_stream(
+    patterns: list[str],
+    root_dir: str,
+    *,
+    include_globs: list[str] | None = None,
+    exclude_dirs: list[str] | None = None,
+    exclude_globs: list[str] | None = None,
+    case_sensitive: bool = True,
+    max_results: int = 200,
+    max_file_size_kb: int = 2048,
+    use_index: bool = False,
+    workers: int = 1,
+    respect_ignore_files: bool = True,
+) -> AsyncIterator[GrepBatch]:
+    """以异步生成器的形式流式产出 grep 结果批次。
+
+    扫描在后台线程中进行，批次一产生就交给调用方；调用方提前停止迭代（break / aclose）
+    时，后台扫描会在处理完当前文件后结束。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            for batch in _iter_search_batches(
+                patterns,
+                root_dir,
+                include_globs,
+                exclude_dirs,
+                exclude_globs,
+                case_sensitive,
+                max_results,
+                max_file_size_kb,
+                use_index,
+                workers,
+                stop,
+                respect_ignore_files,
+            ):
+                loop.call_soon_threadsafe(queue.put_nowait, batch)
+                if stop.is_set():
+                    break
+        except BaseException as exc:  # 交给消费方抛出
+            loop.call_soon_threadsafe(queue.put_nowait, exc)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        await producer
 
 
 @function_tool
+@scheduled(reads=["root_dir"])
+@cached_tool
 async def grep(
     patterns: str,
     root_dir: str | None = None,
@@ -236,6 +564,8 @@ async def grep(
     case_sensitive: bool = True,
     max_results: int = 200,
     max_file_size_kb: int = 2048,
+    use_index: bool = True,
+    respect_ignore_files: bool = True,
 ) -> str:
     """Search file contents under a directory using regular expressions (grep-like).
 
@@ -246,7 +576,18 @@ async def grep(
           inside the workspace root.
         - `include_globs` / `exclude_dirs` / `exclude_globs` are optional filters; provide
           multiple values separated by commas or newlines.
-        - The scan skips common generated/vendor directories and common binary file types.
+        - The scan skips common generated/vendor directories and common binary file types,
+          plus anything ignored by `.gitignore` / `.ignore` files (unless `respect_ignore_files`
+          is false).
+        - With `use_index`, a persistent trigram index (refreshed incrementally by mtime/size)
+          narrows the files to scan; results are identical to a full scan.
+        - Large trees are scanned by a process pool; results are always in the same
+          deterministic file/line order (files of a directory by name, then its
+          subdirectories by name).
+        - Plain-text patterns (e.g. identifiers) take a fast literal path; with several
+          patterns the summary reports how many lines each one matched.
+        - Output is capped by an output budget; if it is exceeded, the middle is replaced by a
+          marker with a `fetch_more` handle for the omitted lines.
 
     Args:
         patterns: One or more regex patterns (newline-separated).
@@ -257,10 +598,13 @@ async def grep(
         case_sensitive: Whether regex matching is case-sensitive.
         max_results: Max number of matching lines to return.
         max_file_size_kb: Max file size to scan (in KB).
+        use_index: Whether to narrow candidate files with the on-disk trigram index.
+        respect_ignore_files: Whether to skip paths ignored by `.gitignore` / `.ignore` files.
 
     Returns:
-        A summary line followed by matches in the format:
-        `/abs/path/to/file:line: [pattern] content`, or an error string.
+        A summary line followed by matches grouped per file: the absolute file path on its
+        own line, then `  line: content` for each match (`  line: [pattern] content` when
+        several patterns are given), or an error string.
     """
     patterns_list = _clean_split_str(patterns, split_commas=False)
     if not patterns_list:
@@ -288,16 +632,31 @@ async def grep(
     exclude_dirs_list = _clean_split_str(exclude_dirs, split_commas=True)
     exclude_globs_list = _clean_split_str(exclude_globs, split_commas=True)
 
-    return await asyncio.to_thread(
-        _search_sync,
+    # 扫描在线程里流式进行，事件循环不被阻塞；进度随批次推送给 CLI 等监听方。
+    results: list[GrepMatch] = []
+    last: GrepBatch | None = None
+    async for batch in grep_stream(
         patterns_list,
         str(root_path),
-        include_globs_list,
-        exclude_dirs_list,
-        exclude_globs_list,
-        case_sensitive,
-        max_results,
-        max_file_size_kb,
+        include_globs=include_globs_list,
+        exclude_dirs=exclude_dirs_list,
+        exclude_globs=exclude_globs_list,
+        case_sensitive=case_sensitive,
+        max_results=max_results,
+        max_file_size_kb=max_file_size_kb,
+        use_index=use_index,
+        workers=default_workers(),
+        respect_ignore_files=respect_ignore_files,
+    ):
+        if batch.error:
+            return batch.error
+        results.extend(batch.matches)
+        last = batch
+        for listener in list(_progress_listeners):
+            listener(batch)
+    assert last is not None
+    return _format_search_result(
+        str(root_path), results, last.matched_files, last.limit_reached, last.pattern_counts
     )
 
 
@@ -314,26 +673,76 @@ def _rel_posix(path: Path, root_path: Path) -> str:
     return rel.as_posix()
 
 
+def _glob_sync(
+    pattern: str,
+    root_path: Path,
+    max_results: int,
+    respect_ignore_files: bool = True,
+    sort_by: str = "path",
+) -> str:
+    """同步 glob 实现：遍历时剪枝排除/忽略的目录，按 sort_by 排序后截断到 max_results。"""
+    compiled = GlobPattern(pattern)
+    matches = iter_glob(
+        str(root_path),
+        compiled,
+        exclude_dir_names=_DEFAULT_EXCLUDE_DIRS,
+        respect_ignore_files=respect_ignore_files,
+    )
+    limit_reached = False
+    if sort_by == "mtime":
+        # 需要全部命中才能排序；mtime 走 workspace_cache（有监听时通常无需 stat）
+        timed: list[tuple[int, str]] = []
+        for match_path, _is_dir in matches:
+            meta = workspace_cache.get_meta(match_path)
+            if meta is not None:
+                timed.append((meta.mtime_ns, match_path))
+        timed.sort(key=lambda item: (-item[0], item[1]))
+        limit_reached = len(timed) > max_results
+        results = [match_path for _mtime, match_path in timed[:max_results]]
+    else:
+        # 遍历顺序本身是确定的（目录内按名称排序），凑够 max_results 即可停止遍历
+        results = [match_path for match_path, _is_dir in islice(matches, max_results + 1)]
+        limit_reached = len(results) > max_results
+        del results[max_results:]
+
+    if not results:
+        return f"No files matched under {root_path}."
+    if limit_reached:
+        summary = f"Found {len(results)} files (limit reached) under {root_path}."
+    else:
+        summary = f"Found {len(results)} files under {root_path}."
+    return summary + "\n" + fit_lines(results, "glob", reserve_tokens=estimate_tokens(summary))
+
+
 @function_tool
+@scheduled(reads=["path"])
+@cached_tool
 async def glob(
     pattern: str,
     path: str | None = None,
     max_results: int = 500,
+    respect_ignore_files: bool = True,
+    sort_by: str = "path",
 ) -> str:
     """Find files under a directory using a glob pattern (file paths only).
 
     Notes:
-        - `pattern` supports `*` / `?` / `**`.
+        - `pattern` supports `*` / `?` / `[...]` / `**`.
         - If `pattern` contains a path separator (`/`), it is treated as a path pattern
           relative to `path` (e.g. `src/**/*.jsx`).
         - If `pattern` does not contain a path separator, it is applied recursively as a
           filename/pattern match (e.g. `*.py`).
-        - Default exclude dirs (e.g. `.git`, `node_modules`) are skipped.
+        - Default exclude dirs (e.g. `.git`, `node_modules`) are skipped, and so are paths
+          ignored by `.gitignore` / `.ignore` files (unless `respect_ignore_files` is false).
+        - `sort_by="mtime"` lists the most recently modified paths first (handy for
+          "what changed lately"); the default `"path"` order is stable across calls.
 
     Args:
         pattern: Glob pattern, e.g. `**/*.ts` or `src/**/*.jsx`.
         path: Absolute directory to search under (defaults to current working directory).
         max_results: Max number of file paths to return.
+        respect_ignore_files: Whether to skip paths ignored by `.gitignore` / `.ignore` files.
+        sort_by: `"path"` (default) or `"mtime"` (newest first).
 
     Returns:
         A summary line followed by one absolute file path per line, or an error string.
@@ -342,6 +751,8 @@ async def glob(
         return "Error: pattern must be a non-empty string"
     if max_results <= 0:
         return "Error: max_results must be greater than 0"
+    if sort_by not in ("path", "mtime"):
+        return "Error: sort_by must be `path` or `mtime`"
 
     if path is None:
         path = str(Path.cwd().resolve())
@@ -354,46 +765,13 @@ async def glob(
             "Error: path must be inside the workspace root directory. "
             f"ROOT={Path.cwd().resolve()}, got={root_path}"
         )
-    if not root_path.exists():
+    root_meta = workspace_cache.get_meta(root_path)
+    if root_meta is None:
         return f"Error: path does not exist: {path}"
-    if not root_path.is_dir():
+    if not root_meta.is_dir:
         return f"Error: path is not a directory: {path}"
 
-    exclude_dir_set = set(_DEFAULT_EXCLUDE_DIRS)
-    results: list[str] = []
-
-    pattern_norm = pattern.strip().replace("\\", "/")
-    # 如果 pattern 不包含路径分隔符，使用递归匹配（更符合“按文件名查找”的直觉）。
-    # 如果包含路径分隔符，则按相对 root_path 的路径模式匹配（例如 src/**/*.jsx）。
-    if "/" in pattern_norm:
-        iterator = root_path.glob(pattern_norm)
-    else:
-        iterator = root_path.rglob(pattern_norm)
-
-    for file_path in iterator:
-        try:
-            is_dir = file_path.is_dir()
-            is_file = file_path.is_file()
-            if not is_dir and not is_file:
-                continue
-        except OSError:
-            continue
-
-        try:
-            rel_parts = file_path.relative_to(root_path).parts
-        except ValueError:
-            rel_parts = PurePath(file_path).parts
-
-        # 过滤默认排除目录（如 .git、node_modules）
-        if any(part in exclude_dir_set for part in rel_parts[:-1]):
-            continue
-
-        results.append(str(file_path))
-        if len(results) >= max_results:
-            summary = f"Found {len(results)} files (limit reached) under {root_path}."
-            return summary + "\n" + "\n".join(results)
-
-    if not results:
-        return f"No files matched under {root_path}."
-    summary = f"Found {len(results)} files under {root_path}."
-    return summary + "\n" + "\n".join(results)
+    # Offload the directory walk to a thread to avoid blocking the event loop.
+    return await asyncio.to_thread(
+        _glob_sync, pattern, root_path, max_results, respect_ignore_files, sort_by
+    )
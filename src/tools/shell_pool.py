@@ -0,0 +1,311 @@
+"""Pool of long-lived shell sessions for the `bash` tool.
+
+Spawning a fresh `/bin/sh` per call costs a fork/exec and loses all shell state. Here
+commands are multiplexed onto a few persistent `bash` processes instead:
+
+- each command is sent as one line, `cd <cwd>; eval '<command>' </dev/null`, followed
+  by `printf` of a per-session random sentinel on stdout (with the exit code and `$PWD`)
+  and on stderr; the readers split the streams at those sentinels, so output framing
+  does not depend on newlines or EOF (background jobs may keep the pipes open);
+- the working directory is shared by the pool: after every command the reported `$PWD`
+  becomes the starting directory of the next command, whichever session runs it;
+- idle sessions are reused most-recently-used first, so a sequence of calls lands on
+  the same shell and sees its exported variables / activated venvs; concurrent calls
+  get their own sessions (up to `max_sessions`, then they wait);
+- a session whose command times out, is cancelled, or exits the shell (`exit 3`) is
+  killed together with its process group and replaced on demand.
+
+Sessions belong to the event loop they were created on; `shutdown_shell_pool()`
+closes them (they also exit on their own once the parent goes away and stdin closes).
+Independent runs sharing a loop (the batch runner) each use `private_shell_pool()`, so
+they do not share a working directory or shell state.
+"""
+
+import asyncio
+import os
+import secrets
+import shutil
+import signal
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, NamedTuple
+
+
+_READ_CHUNK = 64 * 1024
+_DEFAULT_MAX_SESSIONS = 4
+
+
+class ShellResult(NamedTuple):
+    """Outcome of one command: exit code (`None` on timeout) and the shell's `$PWD` after it."""
+
+    returncode: int | None
+    cwd: str
+    timed_out: bool = False
+
+
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+class _SentinelSplitter:
+    """Forward a stream's bytes until the sentinel shows up, then return what follows it."""
+
+    def __init__(self, sentinel: bytes):
+        self._sentinel = sentinel
+        self._pending = b""
+
+    def feed(self, chunk: bytes, sink: Callable[[bytes], None]) -> bytes | None:
+        data = self._pending + chunk
+        index = data.find(self._sentinel)
+        if index >= 0:
+            if index:
+                sink(data[:index])
+            self._pending = b""
+            return data[index + len(self._sentinel):]
+        # Hold back only a tail that could be the start of a sentinel split across chunks.
+        keep = 0
+        for size in range(min(len(data), len(self._sentinel) - 1), 0, -1):
+            if data.endswith(self._sentinel[:size]):
+                keep = size
+                break
+        if len(data) > keep:
+            sink(data[: len(data) - keep])
+        self._pending = data[len(data) - keep:] if keep else b""
+        return None
+
+    def flush(self, sink: Callable[[bytes], None]) -> None:
+        if self._pending:
+            sink(self._pending)
+        self._pending = b""
+
+
+class ShellSession:
+    """One persistent `bash` process running commands one at a time."""
+
+    def __init__(self, process: asyncio.subprocess.Process, sentinel: str):
+        self._process = process
+        self._sentinel = sentinel.encode()
+        self.alive = True
+
+    @classmethod
+    async def start(cls, shell: str, cwd: str) -> "ShellSession":
+        process = await asyncio.create_subprocess_exec(
+            shell,
+            "--noprofile",
+            "--norc",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        return cls(process, f"__AGENT_SHELL_DONE_{secrets.token_hex(8)}__")
+
+    async def run(
+        self,
+        command: str,
+        cwd: str,
+        timeout: float,
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+    ) -> ShellResult:
+        sentinel = self._sentinel.decode()
+        script = (
+            f"cd -- {_quote(cwd)} 2>/dev/null; eval {_quote(command)} </dev/null; "
+            f"printf '%s %d %s\\n' '{sentinel}' \"$?\" \"$PWD\"; printf '%s' '{sentinel}' >&2\n"
+        )
+        self._process.stdin.write(script.encode())
+        try:
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            self.kill()
+            raise
+
+        reader = asyncio.gather(
+            self._read_stdout(on_stdout), self._read_stderr(on_stderr)
+        )
+        try:
+            (status, _) = await asyncio.wait_for(asyncio.shield(reader), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.kill()
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            await self._process.wait()
+            return ShellResult(None, cwd, timed_out=True)
+        except asyncio.CancelledError:
+            self.kill()
+            reader.cancel()
+            reader.add_done_callback(lambda future: future.cancelled() or future.exception())
+            raise
+
+        if status is None:
+            # The command ended the shell itself (`exit N`, `exec ...`).
+            self.alive = False
+            returncode = await self._process.wait()
+            return ShellResult(returncode, cwd)
+        returncode, _, new_cwd = status.partition(" ")
+        return ShellResult(int(returncode), new_cwd or cwd)
+
+    async def _read_stdout(self, sink: Callable[[bytes], None]) -> str | None:
+        splitter = _SentinelSplitter(self._sentinel)
+        while True:
+            chunk = await self._process.stdout.read(_READ_CHUNK)
+            if not chunk:
+                splitter.flush(sink)
+                return None
+            rest = splitter.feed(chunk, sink)
+            if rest is not None:
+                # `<sentinel> <exit code> <cwd>\n`: read up to the end of that line.
+                while b"\n" not in rest:
+                    more = await self._process.stdout.read(_READ_CHUNK)
+                    if not more:
+                        break
+                    rest += more
+                return rest.split(b"\n", 1)[0].decode("utf-8", errors="replace").strip()
+
+    async def _read_stderr(self, sink: Callable[[bytes], None]) -> None:
+        splitter = _SentinelSplitter(self._sentinel)
+        while True:
+            chunk = await self._process.stderr.read(_READ_CHUNK)
+            if not chunk:
+                splitter.flush(sink)
+                return
+            if splitter.feed(chunk, sink) is not None:
+                return
+
+    def kill(self) -> None:
+        """Kill the shell and everything it started (its own process group)."""
+        self.alive = False
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def close(self) -> None:
+        self.kill()
+        await self._process.wait()
+
+
+class ShellPool:
+    """Hands out idle sessions most-recently-used first and tracks the shared cwd."""
+
+    def __init__(self, shell: str, cwd: str, max_sessions: int = _DEFAULT_MAX_SESSIONS):
+        self.shell = shell
+        self.cwd = cwd
+        self.max_sessions = max_sessions
+        self._idle: list[ShellSession] = []
+        self._busy = 0
+        self._available = asyncio.Condition()
+        self.loop = asyncio.get_running_loop()
+
+    async def _acquire(self) -> ShellSession:
+        async with self._available:
+            while True:
+                while self._idle:
+                    session = self._idle.pop()
+                    if session.alive:
+                        self._busy += 1
+                        return session
+                if self._busy < self.max_sessions:
+                    self._busy += 1
+                    break
+                await self._available.wait()
+        try:
+            return await ShellSession.start(self.shell, self.cwd)
+        except BaseException:
+            async with self._available:
+                self._busy -= 1
+                self._available.notify()
+            raise
+
+    async def _release(self, session: ShellSession) -> None:
+        async with self._available:
+            self._busy -= 1
+            if session.alive:
+                self._idle.append(session)
+            self._available.notify()
+
+    async def run(
+        self,
+        command: str,
+        timeout: float,
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+    ) -> ShellResult:
+        session = await self._acquire()
+        try:
+            result = await session.run(command, self.cwd, timeout, on_stdout, on_stderr)
+        finally:
+            await self._release(session)
+        if not result.timed_out and os.path.isdir(result.cwd):
+            self.cwd = result.cwd
+        return result
+
+    async def close(self) -> None:
+        async with self._available:
+            sessions, self._idle = self._idle, []
+        for session in sessions:
+            await session.close()
+
+
+_pool: ShellPool | None = None
+_private_pool: ContextVar[ShellPool | None] = ContextVar("private_shell_pool", default=None)
+_enabled = True
+_max_sessions = _DEFAULT_MAX_SESSIONS
+
+
+def configure_shell_pool(*, enabled: bool | None = None, max_sessions: int | None = None) -> None:
+    """Turn the pool on/off (off: one fresh shell per command) or change its size."""
+    global _enabled, _max_sessions
+    if enabled is not None:
+        _enabled = enabled
+    if max_sessions is not None:
+        if max_sessions <= 0:
+            raise ValueError("max_sessions must be greater than 0")
+        _max_sessions = max_sessions
+        if _pool is not None:
+            _pool.max_sessions = max_sessions
+
+
+def get_shell_pool() -> ShellPool | None:
+    """The pool for the running event loop, or `None` if disabled/unsupported (no bash, no killpg)."""
+    global _pool
+    if not _enabled or not hasattr(os, "killpg"):
+        return None
+    private = _private_pool.get()
+    if private is not None:
+        return private
+    shell = shutil.which("bash")
+    if shell is None:
+        return None
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool.loop is not loop:
+        _pool = ShellPool(shell, os.getcwd(), _max_sessions)
+    return _pool
+
+
+async def shutdown_shell_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None and pool.loop is asyncio.get_running_loop():
+        await pool.close()
+
+
+@asynccontextmanager
+async def private_shell_pool() -> AsyncIterator[None]:
+    """Give the current task (and the tasks it starts) its own pool, starting in the cwd.
+
+    The pool is closed on exit. Without pool support this is a no-op (one fresh shell
+    per command is private anyway).
+    """
+    shell = shutil.which("bash")
+    if not _enabled or not hasattr(os, "killpg") or shell is None:
+        yield
+        return
+    pool = ShellPool(shell, os.getcwd(), _max_sessions)
+    token = _private_pool.set(pool)
+    try:
+        yield
+    finally:
+        _private_pool.reset(token)
+        await pool.close()
@@ -0,0 +1,245 @@
+"""Undo journal for the file-modifying tools.
+
+Before `write_file` / `edit_file` / `multi_edit` replace a file, its previous content
+is recorded, so a bad edit can be reverted without re-running model turns:
+
+- blobs are content-addressed (sha256 of the raw bytes), zlib-compressed and stored
+  once under `<workspace>/.agent_snapshots/blobs/`; rewriting a file back and forth
+  costs no extra space;
+- `journal.jsonl` is append-only: one record per write (`seq`, `turn`, `path`,
+  `blob` = previous content, `null` if the file did not exist) and one per revert
+  (`revert` = the seq it reverted; there is no redo, so the replaced content is not
+  kept); it is loaded once per process, so undo/restore only read the blobs they restore;
+- the CLI numbers user turns (`begin_turn`), so `restore_to_turn(N)` puts every file
+  touched since the start of turn N back to how it was;
+- disk usage is bounded: once blobs exceed `_MAX_STORE_BYTES` (or records exceed
+  `_MAX_RECORDS`), the oldest turns are dropped and unreferenced blobs deleted.
+
+Changes made through `bash` are not journaled (there is no way to know what a shell
+command touched).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from .atomic_io import atomic_write_bytes
+
+
+STORE_DIR_NAME = ".agent_snapshots"
+_JOURNAL_NAME = "journal.jsonl"
+_MAX_STORE_BYTES = 256 * 1024 * 1024
+_MAX_RECORDS = 20_000
+# Larger files are not snapshotted (their writes are journaled as not restorable).
+_MAX_SNAPSHOT_BYTES = 32 * 1024 * 1024
+_SKIPPED = "skipped"
+
+
+class _Journal:
+    def __init__(self, root: Path):
+        self.root = root
+        self.store = root / STORE_DIR_NAME
+        self.blob_dir = self.store / "blobs"
+        self.journal_path = self.store / _JOURNAL_NAME
+        self.lock = threading.Lock()
+        self.records: list[dict] = []
+        self.reverted: set[int] = set()
+        self.blob_sizes: dict[str, int] = {}
+        # Running sum of `blob_sizes`, checked on every write.
+        self.blob_bytes = 0
+        self.turn = 0
+        self.next_seq = 1
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with self.journal_path.open("r", encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            lines = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if "revert" in record:
+                self.reverted.add(record["revert"])
+            else:
+                self.records.append(record)
+                self.turn = max(self.turn, record.get("turn", 0))
+            self.next_seq = max(self.next_seq, record.get("seq", 0) + 1)
+        if self.blob_dir.is_dir():
+            for entry in self.blob_dir.glob("*/*"):
+                if len(entry.name) == 64:  # not a leftover temp file
+                    self.blob_sizes[entry.name] = entry.stat().st_size
+        self.blob_bytes = sum(self.blob_sizes.values())
+
+    def _append(self, record: dict) -> None:
+        self.store.mkdir(parents=True, exist_ok=True)
+        with self.journal_path.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.blob_sizes:
+            compressed = zlib.compress(data, 6)
+            path = self._blob_path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, compressed)
+            self.blob_sizes[digest] = len(compressed)
+            self.blob_bytes += len(compressed)
+        return digest
+
+    def get_blob(self, digest: str) -> bytes:
+        return zlib.decompress(self._blob_path(digest).read_bytes())
+
+    def snapshot(self, path: Path) -> str | None:
+        """Store the current content of `path`; `None` if it does not exist."""
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        if size > _MAX_SNAPSHOT_BYTES:
+            return _SKIPPED
+        return self.put_blob(path.read_bytes())
+
+    def record(self, path: Path, tool: str, previous: bytes | None = None) -> None:
+        path = Path(os.path.realpath(path))
+        with self.lock:
+            blob = self.put_blob(previous) if previous is not None else self.snapshot(path)
+            record = {
+                "seq": self.next_seq,
+                "turn": self.turn,
+                "time": round(time.time(), 3),
+                "tool": tool,
+                "path": str(path),
+                "blob": blob,
+            }
+            self.next_seq += 1
+            self._append(record)
+            self.records.append(record)
+            if (
+                self.blob_bytes > _MAX_STORE_BYTES
+                or len(self.records) > _MAX_RECORDS
+            ):
+                self._evict()
+
+    def _restore(self, record: dict) -> str:
+        path = Path(record["path"])
+        if record["blob"] == _SKIPPED:
+            return f"skipped {path} (file was too large to snapshot)"
+        if record["blob"] is None:
+            if path.exists():
+                path.unlink()
+            message = f"deleted {path} (it did not exist before)"
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, self.get_blob(record["blob"]))
+            message = f"restored {path}"
+        revert = {"seq": self.next_seq, "revert": record["seq"]}
+        self.next_seq += 1
+        self._append(revert)
+        self.reverted.add(record["seq"])
+        return message
+
+    def active(self) -> list[dict]:
+        return [record for record in self.records if record["seq"] not in self.reverted]
+
+    def revert(self, records: list[dict]) -> list[tuple[str, str]]:
+        """Revert `records` newest first; returns (path, message) per record."""
+        results = []
+        for record in sorted(records, key=lambda item: item["seq"], reverse=True):
+            results.append((record["path"], self._restore(record)))
+        return results
+
+    def _evict(self) -> None:
+        """Drop whole oldest turns until under the limits, then unreferenced blobs."""
+        total = self.blob_bytes
+        while self.records and (
+            total > _MAX_STORE_BYTES * 0.8 or len(self.records) > _MAX_RECORDS * 0.8
+        ):
+            oldest_turn = self.records[0]["turn"]
+            if oldest_turn == self.turn:
+                break  # never evict the current turn
+            while self.records and self.records[0]["turn"] == oldest_turn:
+                self.records.pop(0)
+            total = sum(
+                self.blob_sizes.get(digest, 0)
+                for digest in {record["blob"] for record in self.records}
+            )
+        referenced = {record["blob"] for record in self.records}
+        for digest in list(self.blob_sizes):
+            if digest not in referenced:
+                try:
+                    self._blob_path(digest).unlink()
+                except FileNotFoundError:
+                    pass
+                self.blob_bytes -= self.blob_sizes.pop(digest)
+        seqs = {record["seq"] for record in self.records}
+        self.reverted &= seqs
+        # Compact the journal to the surviving records.
+        lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in self.records]
+        lines += [json.dumps({"seq": 0, "revert": seq}) + "\n" for seq in sorted(self.reverted)]
+        atomic_write_bytes(self.journal_path, "".join(lines).encode("utf-8"))
+
+
+_journals: dict[str, _Journal] = {}
+_journals_lock = threading.Lock()
+
+
+def _journal() -> _Journal:
+    root = os.getcwd()
+    with _journals_lock:
+        journal = _journals.get(root)
+        if journal is None:
+            journal = _journals[root] = _Journal(Path(root).resolve())
+        return journal
+
+
+def begin_turn() -> int:
+    """Start a new user turn (called by the CLI for every user message); returns its number."""
+    journal = _journal()
+    with journal.lock:
+        journal.turn += 1
+        return journal.turn
+
+
+def record_write(path: str | os.PathLike, tool: str, previous: bytes | None = None) -> None:
+    """Journal the current content of `path` before `tool` overwrites it.
+
+    Callers that already hold the previous content pass it as `previous` (raw bytes) to
+    avoid re-reading the file.
+    """
+    _journal().record(Path(path), tool, previous)
+
+
+def undo(steps: int = 1) -> list[tuple[str, str]]:
+    """Revert the last `steps` journaled writes (that are not reverted yet)."""
+    journal = _journal()
+    with journal.lock:
+        return journal.revert(journal.active()[-steps:] if steps > 0 else [])
+
+
+def restore_to_turn(turn: int) -> list[tuple[str, str]]:
+    """Revert every journaled write made in turn `turn` or later."""
+    journal = _journal()
+    with journal.lock:
+        return journal.revert([record for record in journal.active() if record["turn"] >= turn])
+
+
+def history(limit: int = 20) -> list[dict]:
+    """The most recent journaled writes that can still be reverted, oldest first."""
+    journal = _journal()
+    with journal.lock:
+        return journal.active()[-limit:]
+
+
+def current_turn() -> int:
+    return _journal().turn
@@ -2,7 +2,8 @@ from agents import Agent, Runner, ModelSettings, function_tool
 import os
 from pathlib import Path
 
-from ..read_file_tool import read_file
+from ..output_budget import fetch_more
+from ..read_file_tool import read_file, read_files
 from ..search_tool import grep, glob
 
 
@@ -49,10 +50,11 @@ async def explore_agent(
 
     instructions = (
         "You are an explore/search sub-agent"
-        "**Important**: You only have tools: read_file, grep, glob. And you only use `read_file` / `grep` / `glob` for read-only analysis.\n"
+        "**Important**: You only have tools: read_file, read_files, grep, glob, fetch_more. And you only use `read_file` / `read_files` / `grep` / `glob` / `fetch_more` for read-only analysis.\n"
         "Your goal is to quickly locate relevant files and key code, then provide a clear, concise conclusion."
-        "If you need more context, use `grep` or `glob` to narrow the scope first, then `read_file` for deep reading."
-        "**Important** You Must Not use `bash`, Beacause you **Only** have tools: read_file, grep, glob. Must Not use other tools !!!"
+        "If you need more context, use `grep` or `glob` to narrow the scope first, then `read_file` for deep reading (or `read_files` to read several files in one call)."
+        "**Important** You Must Not use `bash`, Beacause you **Only** have tools: read_file, read_files, grep, glob, fetch_more. Must Not use other tools !!!"
+        "If a tool result was shortened to fit the output budget, its marker names a `fetch_more` handle; use `fetch_more` only when the omitted lines are really needed."
         "You can run tools in parallel to make it faster."
         "Your final output should include: key file paths, relevant functions/locations, and a brief conclusion/next-step suggestion."
     )
@@ -61,7 +63,7 @@ async def explore_agent(
         name="Explore SubAgent",
         model="mimo-v2-flash",
         instructions=instructions,
-        tools=[read_file, grep, glob],
+        tools=[read_file, read_files, grep, glob, fetch_more],
     )
 
     prompt = (
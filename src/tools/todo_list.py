@@ -1,17 +1,77 @@
+"""Persistent todo list tool.
+
+The store is an append-only JSON-lines log instead of a JSON array rewritten on every
+call:
+
+- each record is one change: an item written in full (`{"id", "content", "status"}`),
+  `{"remove": [ids]}` or `{"clear": true}`; a call appends only the records it changes;
+- the replayed state is cached per store (a dict keyed by id, so lookups are O(1)) along
+  with the log offset; a call reads only what other writers appended since;
+- calls hold an exclusive lock on a sidecar `<store>.lock` file (`fcntl.flock`; where
+  `fcntl` is unavailable only in-process callers are serialized), so concurrent tool
+  calls and other processes cannot lose each other's updates;
+- once the log holds many more records than live items it is compacted: rewritten
+  atomically with one record per item (other processes notice the new inode and reload);
+- a legacy JSON-array store (the old `.agent_todo.json`, or an explicit `file_path`
+  holding an array) is migrated into the log format on first use.
+
+`private_todo_store(path)` moves the default store of the current task elsewhere (the
+batch runner gives each concurrent run its own list).
+"""
+
 from agents import function_tool
 import asyncio
 import json
 import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Iterator
 
-_DEFAULT_STORE_NAME = ".agent_todo.json"
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .atomic_io import atomic_write_bytes, get_durability
+from .result_cache import register_internal_files
+from .tool_scheduler import scheduled
+
+_DEFAULT_STORE_NAME = ".agent_todo.jsonl"
+_LEGACY_STORE_NAME = ".agent_todo.json"
+# Even a read-only `list` opens the lock file for writing; none of this is workspace
+# content, so it must not invalidate cached grep/glob/read results.
+register_internal_files(
+    _DEFAULT_STORE_NAME, _DEFAULT_STORE_NAME + ".lock", _LEGACY_STORE_NAME
+)
 _ALLOWED_STATUS = {"pending", "in_progress", "done"}
+# Compact when the log holds more than this many records per live item (and at least
+# `_COMPACT_MIN_RECORDS` records).
+_COMPACT_RATIO = 4
+_COMPACT_MIN_RECORDS = 256
+
+_private_store: ContextVar[Path | None] = ContextVar("private_todo_store", default=None)
+
+
+@contextmanager
+def private_todo_store(path: str | os.PathLike) -> Iterator[None]:
+    """Use `path` as the default store of the current task (and the tasks it starts)."""
+    token = _private_store.set(Path(path).resolve())
+    try:
+        yield
+    finally:
+        _private_store.reset(token)
+
+
+def _default_store_path() -> Path:
+    return _private_store.get() or Path.cwd().resolve() / _DEFAULT_STORE_NAME
 
 
 def _resolve_store_path(file_path: str | None) -> tuple[Path | None, str | None]:
     root = Path.cwd().resolve()
     if file_path is None:
-        return root / _DEFAULT_STORE_NAME, None
+        return _default_store_path(), None
     if not os.path.isabs(file_path):
         return None, "Error: file_path must be an absolute path"
     path = Path(file_path).resolve()
@@ -23,51 +83,189 @@ def _resolve_store_path(file_path: str | None) -> tuple[Path | None, str | None]
     return path, None
 
 
-def _load_items(path: Path) -> tuple[list[dict], str | None]:
-    if not path.exists():
-        return [], None
-    if not path.is_file():
-        return [], f"Error: path is not a file: {path}"
-    try:
-        raw = path.read_text(encoding="utf-8")
-    except OSError as exc:
-        return [], f"Error reading file {path}: {exc}"
+def _clean_item(item: object) -> dict | None:
+    if not isinstance(item, dict):
+        return None
+    item_id = item.get("id")
+    content = item.get("content")
+    status = item.get("status", "pending")
+    if not isinstance(item_id, int):
+        return None
+    if not isinstance(content, str) or not content.strip():
+        return None
+    if status not in _ALLOWED_STATUS:
+        status = "pending"
+    return {"id": item_id, "content": content, "status": status}
+
+
+def _parse_legacy(path: Path, raw: bytes) -> tuple[list[dict], str | None]:
+    """Items of a legacy JSON-array store."""
     try:
-        data = json.loads(raw)
-    except json.JSONDecodeError as exc:
+        data = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
         return [], f"Error: invalid JSON in {path}: {exc}"
     if not isinstance(data, list):
         return [], f"Error: todo store must be a list, got {type(data).__name__}"
-    cleaned: list[dict] = []
-    for item in data:
-        if not isinstance(item, dict):
-            continue
-        item_id = item.get("id")
-        content = item.get("content")
-        status = item.get("status", "pending")
-        if not isinstance(item_id, int):
-            continue
-        if not isinstance(content, str) or not content.strip():
-            continue
-        if status not in _ALLOWED_STATUS:
-            status = "pending"
-        cleaned.append({"id": item_id, "content": content, "status": status})
+    cleaned = [item for item in map(_clean_item, data) if item is not None]
     cleaned.sort(key=lambda x: x["id"])
     return cleaned, None
 
 
-def _save_items(path: Path, items: list[dict]) -> str | None:
-    try:
-        path.write_text(json.dumps(items, ensure_ascii=True, indent=2), encoding="utf-8")
-    except OSError as exc:
-        return f"Error writing file {path}: {exc}"
-    return None
+def _encode(records: list[dict]) -> bytes:
+    return "".join(json.dumps(record, ensure_ascii=True) + "\n" for record in records).encode()
+
+
+class _TodoStore:
+    """Replayed state of one log file; use under `locked()`."""
+
+    def __init__(self, path: Path, legacy_path: Path | None = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.thread_lock = threading.Lock()
+        # id -> item, in ascending id order.
+        self.items: dict[int, dict] = {}
+        self.records = 0
+        self.offset = 0
+        self.identity: tuple[int, int] | None = None
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with self.thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # releases the lock
+
+    def _reset(self) -> None:
+        self.items = {}
+        self.records = 0
+        self.offset = 0
+        self.identity = None
+
+    def _apply(self, record: dict) -> None:
+        self.records += 1
+        if "remove" in record:
+            for item_id in record["remove"]:
+                self.items.pop(item_id, None)
+            return
+        if record.get("clear"):
+            self.items.clear()
+            return
+        item = _clean_item(record)
+        if item is None:
+            return
+        item_id = item["id"]
+        in_order = item_id in self.items or not self.items or item_id > next(reversed(self.items))
+        self.items[item_id] = item
+        if not in_order:  # hand-edited log: keep the dict sorted by id
+            self.items = dict(sorted(self.items.items()))
+
+    def refresh(self) -> str | None:
+        """Catch up with records appended (or a compaction done) by other writers."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            if self.legacy_path is not None and self.legacy_path.is_file():
+                return self._migrate(self.legacy_path)
+            return None
+        if not self.path.is_file():
+            return f"Error: path is not a file: {self.path}"
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self.identity or stat.st_size < self.offset:
+            self._reset()
+            self.identity = identity
+        if stat.st_size == self.offset:
+            return None
+        try:
+            with self.path.open("rb") as fh:
+                fh.seek(self.offset)
+                data = fh.read()
+        except OSError as exc:
+            return f"Error reading file {self.path}: {exc}"
+
+        if self.offset == 0 and data.lstrip()[:1] == b"[":
+            return self._migrate(self.path, data)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                self._apply(record)
+        self.offset += end
+        if end < len(data):
+            # Torn last record (a writer died mid-append): rewrite without it so the
+            # next append starts on a fresh line.
+            self.compact()
+        return None
+
+    def _migrate(self, source: Path, raw: bytes | None = None) -> str | None:
+        try:
+            if raw is None:
+                raw = source.read_bytes()
+        except OSError as exc:
+            return f"Error reading file {source}: {exc}"
+        items, error = _parse_legacy(source, raw)
+        if error:
+            return error
+        self._reset()
+        self.items = {item["id"]: item for item in items}
+        self.compact()
+        if source != self.path:
+            source.unlink()
+        return None
+
+    def append(self, records: list[dict]) -> None:
+        """Append `records` to the log (raises OSError); the caller has refreshed."""
+        data = _encode(records)
+        with self.path.open("ab") as fh:
+            fh.write(data)
+            fh.flush()
+            if get_durability() != "none":
+                os.fsync(fh.fileno())
+            stat = os.fstat(fh.fileno())
+        for record in records:
+            self._apply(record)
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.offset = stat.st_size
+        if self.records > max(_COMPACT_MIN_RECORDS, _COMPACT_RATIO * len(self.items)):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the log atomically as one record per live item."""
+        data = _encode(list(self.items.values()))
+        atomic_write_bytes(self.path, data)
+        stat = os.stat(self.path)
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.offset = stat.st_size
+        self.records = len(self.items)
+
 
+_stores: dict[Path, _TodoStore] = {}
+_stores_lock = threading.Lock()
 
-def _next_id(items: list[dict]) -> int:
-    if not items:
+
+def _get_store(path: Path) -> _TodoStore:
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            legacy = path.with_name(_LEGACY_STORE_NAME) if path.name == _DEFAULT_STORE_NAME else None
+            store = _stores[path] = _TodoStore(path, legacy)
+        return store
+
+
+def _next_id(store: _TodoStore) -> int:
+    if not store.items:
         return 1
-    return max(item["id"] for item in items) + 1
+    return next(reversed(store.items)) + 1
 
 
 def _format_response(ok: bool, message: str, items: list[dict]) -> str:
@@ -88,9 +286,24 @@ def _todo_list_sync(
         return _format_response(False, error, [])
     assert path is not None
 
-    current_items, error = _load_items(path)
+    store = _get_store(path)
+    try:
+        with store.locked():
+            return _apply_action(store, action, items_json, ids)
+    except OSError as exc:
+        return _format_response(False, f"Error locking todo store {path}: {exc}", [])
+
+
+def _apply_action(
+    store: _TodoStore,
+    action: str,
+    items_json: str | None,
+    ids: list[int] | None,
+) -> str:
+    error = store.refresh()
     if error:
         return _format_response(False, error, [])
+    current_items = list(store.items.values())
 
     action = action.strip().lower() if isinstance(action, str) else ""
     if action not in {"list", "add", "update", "remove", "clear"}:
@@ -100,9 +313,10 @@ def _todo_list_sync(
         return _format_response(True, "OK", current_items)
 
     if action == "clear":
-        error = _save_items(path, [])
-        if error:
-            return _format_response(False, error, current_items)
+        try:
+            store.append([{"clear": True}])
+        except OSError as exc:
+            return _format_response(False, f"Error writing file {store.path}: {exc}", current_items)
         return _format_response(True, "Cleared", [])
 
     items: list[dict] | None = None
@@ -115,11 +329,11 @@ def _todo_list_sync(
             return _format_response(False, "Error: items_json must be a JSON array", current_items)
         items = parsed
 
+    records: list[dict] = []
     if action == "add":
         if not items:
             return _format_response(False, "Error: items must be a non-empty list", current_items)
-        next_id = _next_id(current_items)
-        added = 0
+        next_id = _next_id(store)
         for item in items:
             if not isinstance(item, dict):
                 continue
@@ -129,64 +343,66 @@ def _todo_list_sync(
                 continue
             if status not in _ALLOWED_STATUS:
                 status = "pending"
-            current_items.append(
-                {"id": next_id, "content": content.strip(), "status": status}
-            )
+            records.append({"id": next_id, "content": content.strip(), "status": status})
             next_id += 1
-            added += 1
-        if added == 0:
+        if not records:
             return _format_response(False, "Error: no valid items to add", current_items)
-        current_items.sort(key=lambda x: x["id"])
-        error = _save_items(path, current_items)
-        if error:
-            return _format_response(False, error, current_items)
-        return _format_response(True, f"Added {added} item(s)", current_items)
+        message = f"Added {len(records)} item(s)"
 
-    if action == "update":
+    elif action == "update":
         if not items:
             return _format_response(False, "Error: items must be a non-empty list", current_items)
-        by_id = {item["id"]: item for item in current_items}
+        changed: dict[int, dict] = {}
         updated = 0
         for patch in items:
             if not isinstance(patch, dict):
                 continue
             item_id = patch.get("id")
-            if not isinstance(item_id, int) or item_id not in by_id:
+            if not isinstance(item_id, int) or item_id not in store.items:
                 continue
+            item = dict(changed.get(item_id) or store.items[item_id])
             content = patch.get("content")
             status = patch.get("status")
             if isinstance(content, str) and content.strip():
-                by_id[item_id]["content"] = content.strip()
+                item["content"] = content.strip()
             if isinstance(status, str) and status in _ALLOWED_STATUS:
-                by_id[item_id]["status"] = status
+                item["status"] = status
+            changed[item_id] = item
             updated += 1
         if updated == 0:
             return _format_response(False, "Error: no valid items to update", current_items)
-        current_items = sorted(by_id.values(), key=lambda x: x["id"])
-        error = _save_items(path, current_items)
-        if error:
-            return _format_response(False, error, current_items)
-        return _format_response(True, f"Updated {updated} item(s)", current_items)
+        records = list(changed.values())
+        message = f"Updated {updated} item(s)"
 
-    if action == "remove":
+    elif action == "remove":
         if not ids:
             return _format_response(False, "Error: ids must be a non-empty list", current_items)
         remove_ids = {i for i in ids if isinstance(i, int)}
         if not remove_ids:
             return _format_response(False, "Error: ids must contain integers", current_items)
-        remaining = [item for item in current_items if item["id"] not in remove_ids]
-        removed = len(current_items) - len(remaining)
-        if removed == 0:
+        present = sorted(i for i in remove_ids if i in store.items)
+        if not present:
             return _format_response(False, "Error: no matching ids to remove", current_items)
-        error = _save_items(path, remaining)
-        if error:
-            return _format_response(False, error, current_items)
-        return _format_response(True, f"Removed {removed} item(s)", remaining)
+        records = [{"remove": present}]
+        message = f"Removed {len(present)} item(s)"
+
+    else:
+        return _format_response(False, "Error: unsupported action", current_items)
+
+    try:
+        store.append(records)
+    except OSError as exc:
+        return _format_response(False, f"Error writing file {store.path}: {exc}", current_items)
+    return _format_response(True, message, list(store.items.values()))
+
 
-    return _format_response(False, "Error: unsupported action", current_items)
+def _store_access(arguments: dict) -> list[tuple[str | None, bool]]:
+    file_path = arguments["file_path"]
+    return [(file_path or str(_default_store_path()), True)]
 
 
 @function_tool
+@scheduled(paths_from=_store_access)
 async def todo_list(
     action: str,
     items_json: str | None = None,
@@ -201,7 +417,7 @@ async def todo_list(
             - add: [{"content": str, "status": "pending|in_progress|done" (optional)}]
             - update: [{"id": int, "content": str (optional), "status": str (optional)}]
         ids: For `remove`, a list of integer ids.
-        file_path: Optional absolute path to the JSON store file.
+        file_path: Optional absolute path to the store file (JSON-lines log).
 
     Returns:
         JSON string: {"ok": bool, "message": str, "items": [..]}.
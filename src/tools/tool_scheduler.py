@@ -0,0 +1,195 @@
+"""Read/write conflict scheduling for concurrently executed tool calls.
+
+With `parallel_tool_calls=True` the SDK runs all tool calls of one model turn
+concurrently. Each file-touching tool declares which paths it reads and writes
+(`@scheduled(...)` between `@function_tool` and `@cached_tool`, so cache hits are
+ordered too) and acquires per-path reader/writer locks before it runs:
+
+- readers of a path share it; a writer excludes readers and writers of the same path;
+- paths are hierarchical: a lock on a directory (e.g. `grep`'s `root_dir`) conflicts
+  with locks on anything below it, and vice versa;
+- an `exclusive` call (e.g. `bash`, which may touch anything) excludes every other call;
+- requests are granted in arrival order among those that conflict, so conflicting calls
+  run in the order the model issued them, and a stream of readers cannot starve a
+  writer. Non-conflicting calls run concurrently.
+
+Tools that run other tools (the explore sub-agent) must not be scheduled themselves:
+a nested acquisition queued behind a waiting writer would deadlock.
+
+One lock table serves the event loop; independent runs sharing a loop (the batch
+runner) each take their own with `private_lock_table()`, so one run's `bash` does not
+hold up the others.
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, NamedTuple
+
+
+class Access(NamedTuple):
+    """One lock request: a normalized absolute path and whether it is written."""
+
+    path: str
+    write: bool
+
+
+def _normalize(path: str | None) -> str:
+    # `None` means the workspace root (the tools' default for optional directories).
+    if path is None or not str(path).strip():
+        path = os.getcwd()
+    path = os.path.realpath(os.path.join(os.getcwd(), str(path)))
+    return path.rstrip(os.sep) or os.sep
+
+
+def _overlaps(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    prefix = shorter if shorter.endswith(os.sep) else shorter + os.sep
+    return longer.startswith(prefix)
+
+
+class _Request:
+    __slots__ = ("accesses", "exclusive", "granted")
+
+    def __init__(self, accesses: tuple[Access, ...], exclusive: bool):
+        self.accesses = accesses
+        self.exclusive = exclusive
+        self.granted = False
+
+    def conflicts(self, other: "_Request") -> bool:
+        if self.exclusive or other.exclusive:
+            return True
+        return any(
+            (mine.write or theirs.write) and _overlaps(mine.path, theirs.path)
+            for mine in self.accesses
+            for theirs in other.accesses
+        )
+
+
+class PathLockTable:
+    """Per-path async reader/writer locks with FIFO ordering among conflicting requests."""
+
+    def __init__(self):
+        self._changed = asyncio.Condition()
+        # Granted and waiting requests, in arrival order.
+        self._queue: list[_Request] = []
+        self.loop = asyncio.get_running_loop()
+        self.stats = {"calls": 0, "waited": 0, "wait_seconds": 0.0, "max_running": 0}
+
+    def _can_run(self, request: _Request) -> bool:
+        for other in self._queue:
+            if other is request:
+                return True
+            if request.conflicts(other):
+                return False
+        return True
+
+    @asynccontextmanager
+    async def hold(
+        self, accesses: Iterable[Access], *, exclusive: bool = False
+    ) -> AsyncIterator[None]:
+        request = _Request(tuple(accesses), exclusive)
+        begin = time.monotonic()
+        async with self._changed:
+            self._queue.append(request)
+            self.stats["calls"] += 1
+            try:
+                if not self._can_run(request):
+                    self.stats["waited"] += 1
+                    await self._changed.wait_for(lambda: self._can_run(request))
+                    self.stats["wait_seconds"] += time.monotonic() - begin
+            except BaseException:
+                self._queue.remove(request)
+                self._changed.notify_all()
+                raise
+            request.granted = True
+            running = sum(1 for item in self._queue if item.granted)
+            self.stats["max_running"] = max(self.stats["max_running"], running)
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._queue.remove(request)
+                self._changed.notify_all()
+
+
+_table: PathLockTable | None = None
+_private_table: ContextVar[PathLockTable | None] = ContextVar("private_lock_table", default=None)
+
+
+@contextmanager
+def private_lock_table() -> Iterator[PathLockTable]:
+    """Schedule the tool calls of the current task (and the tasks it starts) separately.
+
+    Calls under different tables never wait for each other; call inside a running loop.
+    """
+    table = PathLockTable()
+    token = _private_table.set(table)
+    try:
+        yield table
+    finally:
+        _private_table.reset(token)
+
+
+def _get_table() -> PathLockTable:
+    global _table
+    private = _private_table.get()
+    if private is not None:
+        return private
+    loop = asyncio.get_running_loop()
+    if _table is None or _table.loop is not loop:
+        _table = PathLockTable()
+    return _table
+
+
+def scheduled(
+    *,
+    reads: Iterable[str] = (),
+    writes: Iterable[str] = (),
+    paths_from: Callable[[dict[str, Any]], Iterable[tuple[str | None, bool]]] | None = None,
+    exclusive: bool = False,
+) -> Callable[[Callable[..., Awaitable[str]]], Callable[..., Awaitable[str]]]:
+    """Declare the paths a tool reads/writes so concurrent calls are scheduled safely.
+
+    - reads / writes: names of arguments holding a path (`None` = workspace root);
+    - paths_from: for paths inside other arguments, maps the bound arguments to
+      `(path, is_write)` pairs;
+    - exclusive: the call conflicts with every other scheduled call.
+    """
+    reads, writes = tuple(reads), tuple(writes)
+
+    def decorate(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> str:
+            accesses: list[Access] = []
+            if not exclusive:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+                accesses.extend(Access(_normalize(arguments[name]), False) for name in reads)
+                accesses.extend(Access(_normalize(arguments[name]), True) for name in writes)
+                if paths_from is not None:
+                    accesses.extend(
+                        Access(_normalize(path), write) for path, write in paths_from(arguments)
+                    )
+            async with _get_table().hold(accesses, exclusive=exclusive):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def scheduler_stats() -> dict[str, float]:
+    """Counters of the current loop's lock table: calls, calls that waited, total wait time."""
+    if _table is None:
+        return {"calls": 0, "waited": 0, "wait_seconds": 0.0, "max_running": 0}
+    return dict(_table.stats)
@@ -0,0 +1,78 @@
+from agents import function_tool
+import asyncio
+import time
+
+from . import snapshot_journal
+from .result_cache import bump_generation
+from .tool_scheduler import scheduled
+from .workspace_cache import invalidate_all
+
+
+def format_history(records: list[dict]) -> str:
+    if not records:
+        return "No file changes recorded that can be undone."
+    lines = [f"Current turn: {snapshot_journal.current_turn()}. Recent file changes (oldest first):"]
+    for record in records:
+        stamp = time.strftime("%H:%M:%S", time.localtime(record["time"]))
+        created = " (created)" if record["blob"] is None else ""
+        lines.append(
+            f"  #{record['seq']} turn {record['turn']} {stamp} {record['tool']}: "
+            f"{record['path']}{created}"
+        )
+    return "\n".join(lines)
+
+
+def _format_reverted(results: list[tuple[str, str]]) -> str:
+    if not results:
+        return "Nothing to undo."
+    return f"Reverted {len(results)} change(s):\n" + "\n".join(
+        f"  {message}" for _path, message in results
+    )
+
+
+def run_undo_action(action: str, steps: int = 1, turn: int | None = None) -> str:
+    """Synchronous implementation shared by the `undo` tool and the CLI commands."""
+    if action == "history":
+        return format_history(snapshot_journal.history())
+    if action == "undo":
+        if steps <= 0:
+            return "Error: steps must be greater than 0"
+        results = snapshot_journal.undo(steps)
+    elif action == "restore_to_turn":
+        if turn is None or turn < 1:
+            return "Error: restore_to_turn needs `turn` >= 1"
+        results = snapshot_journal.restore_to_turn(turn)
+    else:
+        return "Error: action must be one of `history`, `undo`, `restore_to_turn`"
+    if results:
+        # Reverting can delete files and recreate their directories, so cached
+        # listings are stale too; reverts are rare, drop everything.
+        invalidate_all()
+        bump_generation()
+    return _format_reverted(results)
+
+
+@function_tool
+@scheduled(exclusive=True)
+async def undo(action: str = "history", steps: int = 1, turn: int | None = None) -> str:
+    """Inspect or revert file changes made by `write_file` / `edit_file` / `multi_edit`.
+
+    Notes:
+        - `history` lists recent changes that can still be reverted, with their turn numbers.
+        - `undo` reverts the last `steps` changes (newest first).
+        - `restore_to_turn` reverts every change made in `turn` or later, restoring the
+          files to how they were when that user turn started.
+        - Changes made with `bash` are not recorded and cannot be undone here.
+
+    Args:
+        action: One of `history`, `undo`, `restore_to_turn`.
+        steps: For `undo`, how many recorded changes to revert.
+        turn: For `restore_to_turn`, the first turn whose changes are reverted.
+
+    Returns:
+        The list of changes or of reverted files, or an error string.
+    """
+    try:
+        return await asyncio.to_thread(run_undo_action, action, steps, turn)
+    except OSError as exc:
+        return f"Error: undo failed: {exc}"
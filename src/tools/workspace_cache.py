@@ -0,0 +1,315 @@
+"""Process-wide cache of file metadata shared by the workspace tools.
+
+`grep`, `glob`, `read_file` (and the explore sub-agent, which reuses them) keep
+asking the same questions about the same files: does it exist, is it a regular
+file, how big is it, is it binary. This module answers them from an LRU cache:
+
+- `stat` results are trusted for `_TRUST_SECONDS`, then revalidated with a single
+  `os.stat`; derived facts (binary sniff, encoding guess, line count) survive a
+  revalidation as long as `(mtime_ns, size)` are unchanged.
+- `write_file` / `edit_file` invalidate the paths they touch, `bash` invalidates
+  everything since it can change anything.
+- While a filesystem watcher covers a root (see `fs_watcher`), entries under it are
+  trusted without revalidation and directory listings are cached too: the watcher
+  invalidates them as change notifications arrive.
+"""
+
+import codecs
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+BINARY_SNIFF_BYTES = 2048
+
+_MAX_ENTRIES = 50_000
+_TRUST_SECONDS = 2.0
+_LINE_COUNT_CHUNK = 1 << 20
+
+
+class FileMeta:
+    """Cached facts about one path. Derived fields are filled in lazily."""
+
+    __slots__ = (
+        "path",
+        "mode",
+        "size",
+        "mtime_ns",
+        "checked_at",
+        "_is_binary",
+        "_encoding",
+        "_line_count",
+    )
+
+    def __init__(self, path: str, st: os.stat_result, checked_at: float):
+        self.path = path
+        self.mode = st.st_mode
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.checked_at = checked_at
+        self._is_binary: bool | None = None
+        self._encoding: str | None = None
+        self._line_count: int | None = None
+
+    @property
+    def is_file(self) -> bool:
+        return stat.S_ISREG(self.mode)
+
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+
+    def same_version(self, st: os.stat_result) -> bool:
+        return self.mode == st.st_mode and self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, FileMeta]" = OrderedDict()
+# dir path -> (subdir names, names of subdirs that are symlinks, file names)
+_listings: "OrderedDict[str, tuple[list[str], frozenset[str], list[str]]]" = OrderedDict()
+_trusted_root: str | None = None
+_untrusted_dir_names: frozenset[str] = frozenset()
+# Bumped on every invalidation, so a listing computed concurrently is not stored stale.
+_generation = 0
+_stats = {"hits": 0, "misses": 0, "revalidations": 0, "invalidations": 0}
+
+
+def _key(path: str | Path) -> str:
+    return os.path.abspath(path)
+
+
+def _is_trusted(key: str) -> bool:
+    root = _trusted_root
+    if root is None:
+        return False
+    if key == root:
+        return True
+    if not key.startswith(root + os.sep):
+        return False
+    parts = key[len(root) + 1 :].split(os.sep)
+    return not _untrusted_dir_names.intersection(parts[:-1])
+
+
+def set_trusted_root(root: str | Path | None, *, skip_dir_names: frozenset[str] = frozenset()) -> None:
+    """Trust cached entries under `root` until explicitly invalidated (None turns it off).
+
+    Paths inside directories named in `skip_dir_names` (which the watcher does not
+    watch) keep the normal revalidation behaviour.
+    """
+    global _trusted_root, _untrusted_dir_names
+    with _lock:
+        _trusted_root = _key(root) if root is not None else None
+        _untrusted_dir_names = frozenset(skip_dir_names)
+        _listings.clear()
+
+
+def get_meta(path: str | Path) -> FileMeta | None:
+    """Return cached metadata for `path`, or None if it does not exist."""
+    key = _key(path)
+    now = time.monotonic()
+    with _lock:
+        meta = _entries.get(key)
+        if meta is not None and (now - meta.checked_at < _TRUST_SECONDS or _is_trusted(key)):
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return meta
+
+    try:
+        st = os.stat(key)
+    except OSError:
+        with _lock:
+            _entries.pop(key, None)
+            _stats["misses"] += 1
+        return None
+
+    with _lock:
+        if meta is not None and meta.same_version(st):
+            # Unchanged on disk: keep the derived facts, refresh the trust window.
+            meta.checked_at = now
+            _stats["revalidations"] += 1
+        else:
+            meta = FileMeta(key, st, now)
+            _stats["misses"] += 1
+        _entries[key] = meta
+        _entries.move_to_end(key)
+        while len(_entries) > _MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return meta
+
+
+def _sniff(meta: FileMeta) -> None:
+    try:
+        with open(meta.path, "rb") as fh:
+            chunk = fh.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        meta._is_binary = True
+        meta._encoding = None
+        return
+    meta._is_binary = b"\x00" in chunk
+    if meta._is_binary:
+        meta._encoding = None
+    elif chunk.startswith(codecs.BOM_UTF8):
+        meta._encoding = "utf-8-sig"
+    elif chunk.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        meta._encoding = "utf-16"
+    else:
+        try:
+            # A multi-byte sequence may be cut at the end of the chunk, hence final=False.
+            codecs.getincrementaldecoder("utf-8")().decode(chunk, final=False)
+            meta._encoding = "utf-8"
+        except UnicodeDecodeError:
+            meta._encoding = "latin-1"
+
+
+def is_probably_binary(path: str | Path) -> bool:
+    """NUL-byte heuristic on the first `BINARY_SNIFF_BYTES`; unreadable paths count as binary."""
+    meta = get_meta(path)
+    if meta is None:
+        return True
+    if meta._is_binary is None:
+        _sniff(meta)
+    return bool(meta._is_binary)
+
+
+def guess_encoding(path: str | Path) -> str | None:
+    """Best-effort encoding guess (`utf-8`, `utf-8-sig`, `utf-16`, `latin-1`), None for binary."""
+    meta = get_meta(path)
+    if meta is None:
+        return None
+    if meta._is_binary is None:
+        _sniff(meta)
+    return meta._encoding
+
+
+def line_count(path: str | Path) -> int | None:
+    """Number of lines in a regular file (a trailing partial line counts as one)."""
+    meta = get_meta(path)
+    if meta is None or not meta.is_file:
+        return None
+    if meta._line_count is None:
+        count = 0
+        last = b""
+        try:
+            with open(meta.path, "rb") as fh:
+                while chunk := fh.read(_LINE_COUNT_CHUNK):
+                    count += chunk.count(b"\n")
+                    last = chunk
+        except OSError:
+            return None
+        if last and not last.endswith(b"\n"):
+            count += 1
+        meta._line_count = count
+    return meta._line_count
+
+
+def list_dir(path: str | Path) -> tuple[list[str], frozenset[str], list[str]] | None:
+    """Return `(dirnames, symlinked_dirnames, filenames)` of a directory, or None if unreadable.
+
+    Listings are only cached under the trusted root, where a watcher keeps them fresh.
+    """
+    key = _key(path)
+    trusted = _is_trusted(key)
+    if trusted:
+        with _lock:
+            listing = _listings.get(key)
+            if listing is not None:
+                _listings.move_to_end(key)
+                return listing
+    generation = _generation
+    dirnames: list[str] = []
+    symlinks: set[str] = set()
+    filenames: list[str] = []
+    try:
+        with os.scandir(key) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirnames.append(entry.name)
+                    if entry.is_symlink():
+                        symlinks.add(entry.name)
+                else:
+                    filenames.append(entry.name)
+    except OSError:
+        return None
+    listing = (dirnames, frozenset(symlinks), filenames)
+    if trusted:
+        with _lock:
+            if generation != _generation:
+                return listing
+            _listings[key] = listing
+            while len(_listings) > _MAX_ENTRIES:
+                _listings.popitem(last=False)
+    return listing
+
+
+def walk(top: str | Path):
+    """Drop-in for `os.walk(top)` (top-down, no symlink following) backed by `list_dir`.
+
+    Like `os.walk`, callers may prune `dirnames` in place to skip subtrees.
+    """
+    stack = [os.fspath(top)]
+    while stack:
+        dirpath = stack.pop()
+        listing = list_dir(dirpath)
+        if listing is None:
+            continue
+        subdirs, symlinks, files = listing
+        dirnames = list(subdirs)
+        yield dirpath, dirnames, list(files)
+        for name in reversed(dirnames):
+            if name not in symlinks:
+                stack.append(os.path.join(dirpath, name))
+
+
+def invalidate(path: str | Path) -> None:
+    """Drop the entry for `path` (call after writing to it)."""
+    global _generation
+    key = _key(path)
+    with _lock:
+        _generation += 1
+        if _entries.pop(key, None) is not None:
+            _stats["invalidations"] += 1
+        _listings.pop(key, None)
+
+
+def invalidate_listing(path: str | Path) -> None:
+    """Drop the cached listing of directory `path` (an entry was created, removed or renamed)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _listings.pop(_key(path), None)
+
+
+def invalidate_tree(path: str | Path) -> None:
+    """Drop `path` and everything cached below it (a directory was removed or renamed)."""
+    global _generation
+    key = _key(path)
+    prefix = key + os.sep
+    with _lock:
+        _generation += 1
+        for cache in (_entries, _listings):
+            stale = [k for k in cache if k == key or k.startswith(prefix)]
+            for k in stale:
+                del cache[k]
+        _stats["invalidations"] += 1
+
+
+def invalidate_all() -> None:
+    """Drop every entry (call after operations with unknown effects, e.g. shell commands)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _stats["invalidations"] += len(_entries)
+        _entries.clear()
+        _listings.clear()
+
+
+def cache_stats() -> dict[str, int]:
+    with _lock:
+        return {**_stats, "entries": len(_entries), "listings": len(_listings)}
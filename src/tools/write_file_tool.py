@@ -3,10 +3,18 @@ import asyncio
 import os
 from pathlib import Path
 
+from .atomic_io import atomic_write_text
+from .result_cache import bump_generation
+from .snapshot_journal import record_write
+from .tool_scheduler import scheduled
+from .workspace_cache import invalidate, invalidate_listing, invalidate_tree
+
 
 def _write_file(file_path: str, content: str) -> str:
     """Write content to a file, creating parent directories if needed.
 
+    The file is replaced atomically (see `atomic_io`): readers never see a partial write.
+
     Args:
         file_path: Absolute path to the file to write.
         content: File content to write (overwrites existing file).
@@ -20,18 +28,31 @@ def _write_file(file_path: str, content: str) -> str:
     if parent.exists() and not parent.is_dir():
         return f"Error: parent path is not a directory: {parent}"
     if not parent.exists():
+        created = parent
+        while not created.parent.exists():
+            created = created.parent
         try:
             parent.mkdir(parents=True, exist_ok=True)
         except OSError as exc:
             return f"Error creating parent directory {parent}: {exc}"
+        finally:
+            # The new directories are missing from cached listings, which a running
+            # watcher would only drop once it delivers the event.
+            invalidate_tree(created)
+            invalidate_listing(created.parent)
     if path.exists() and path.is_dir():
         return f"Error: path is a directory: {file_path}"
 
     try:
-        with path.open("w", encoding="utf-8") as fh:
-            fh.write(content)
+        # Keep the previous content so the write can be undone.
+        record_write(path, "write_file")
+        atomic_write_text(path, content)
     except OSError as exc:
         return f"Error writing file {file_path}: {exc}"
+    finally:
+        invalidate(path)
+        invalidate_listing(parent)
+        bump_generation()
 
     return f"write to `{file_path}` successfully."
 
@@ -39,6 +60,7 @@ def _write_file(file_path: str, content: str) -> str:
 
 
 @function_tool
+@scheduled(writes=["file_path"])
 async def write_file(file_path: str, content: str) -> str:
     """Write a file by overwriting its entire contents.
 